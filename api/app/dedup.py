@@ -0,0 +1,509 @@
+"""Out-of-core deduplication of semicolon-separated CSV exports.
+
+The engine reads a CSV in chunks and fingerprints every row (or a subset
+of its columns) with a 128-bit digest. Digests live in a compact in-memory
+set until it outgrows the memory limit; after that they are spilled to
+hash partitions on disk, and every partition is deduplicated separately.
+A second pass writes the first occurrence of every row to the sink, as
+CSV or Parquet (see ``app.output_format``).
+
+The output and the duplicate count are the same as those of
+``pd.read_csv`` + ``drop_duplicates`` over the whole file.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass, field
+from typing import IO, Callable, ContextManager
+
+import numpy as np
+import pandas as pd
+
+from app.output_format import OutputFormat
+from app.telemetry import StageTimings
+
+# формат выгрузок: ";" и служебная строка перед заголовком
+CSV_READ_OPTIONS = {"sep": ";", "skiprows": 1}
+
+MEMORY_BUDGET = int(os.getenv("STREAM_MEMORY_BUDGET_MB", "256")) * 1024 * 1024
+
+# два независимых 64-битных хеша дают 128-битный отпечаток строки
+_HASH_KEYS = ("sprint-health-hi", "sprint-health-lo")
+# hash_array не использует hash_key для чисел: ключ подмешивается в биты значения
+_HASH_SEEDS = {
+    key: np.uint64(int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "little")) for key in _HASH_KEYS
+}
+_NA_HASH = np.iinfo(np.uint64).max
+# целые больше 2**53 нельзя без потерь хешировать как float64
+_EXACT_FLOAT_LIMIT = 2**53
+
+# во сколько раз DataFrame тяжелее исходного текста CSV
+_FRAME_OVERHEAD = 8
+_SAMPLE_SIZE = 1 << 20
+_MIN_CHUNK_ROWS = 1_000
+_MAX_CHUNK_ROWS = 1_000_000
+
+_PARTITION_BITS = 6
+_RECORD = np.dtype([("hi", "<u8"), ("lo", "<u8"), ("row", "<i8")])
+
+Opener = Callable[[], ContextManager[IO[bytes]]]
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class DedupResult:
+    rows_written: int
+    duplicates: int
+    chunk_rows: int
+    spilled: bool
+    # parse/dedup/write этого файла; из воркера возвращаются вместе с результатом
+    timings: StageTimings = field(default_factory=StageTimings)
+
+
+def chunk_rows_for(open_source: Opener, budget: int) -> int:
+    """Chunk size in rows that keeps one parsed chunk within the budget."""
+    with open_source() as source:
+        sample = source.read(_SAMPLE_SIZE)
+    lines = sample.count(b"\n") or 1
+    row_bytes = max(len(sample) / lines, 1.0)
+    rows = int(budget / (row_bytes * _FRAME_OVERHEAD))
+    return max(_MIN_CHUNK_ROWS, min(rows, _MAX_CHUNK_ROWS))
+
+
+def _is_plain_numeric(dtype) -> bool:
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def _common_dtype(left, right):
+    """Dtype pandas would infer for a column whose chunks parsed as left and right."""
+    if left == right:
+        return left
+    if _is_plain_numeric(left) and _is_plain_numeric(right):
+        return np.promote_types(left, right)
+    for dtype in (left, right):
+        if pd.api.types.is_string_dtype(dtype):
+            return dtype
+    return np.dtype(object)
+
+
+def _hash_numbers(values: np.ndarray, hash_key: str) -> np.ndarray:
+    """Keyed hash of numbers or booleans.
+
+    pd.util.hash_array ignores ``hash_key`` for them, so without the seed
+    both halves of the fingerprint would be the same 64-bit hash.
+    """
+    if values.dtype.kind == "f":
+        bits = values.astype(np.float64, copy=False).view(np.uint64)
+    elif values.dtype.kind == "u":
+        bits = values.astype(np.uint64, copy=False)
+    else:
+        bits = values.astype(np.int64, copy=False).view(np.uint64)
+    return pd.util.hash_array(bits ^ _HASH_SEEDS[hash_key])
+
+
+def _hash_objects(values: np.ndarray, hash_key: str) -> np.ndarray:
+    """Keyed hash of an object column that may mix value types.
+
+    hash_array hashes everything that is not a string as its str(), so 1 and
+    "1" would collide although drop_duplicates keeps them apart. Numbers are
+    hashed by value (1 and 1.0 are equal for pandas too), other objects by
+    type and text, and both are mixed once more so they never meet strings.
+    """
+    if pd.api.types.infer_dtype(values, skipna=True) == "string":
+        return pd.util.hash_array(values, hash_key=hash_key)
+    is_text = np.fromiter((isinstance(value, str) for value in values), bool, len(values))
+    is_number = np.fromiter(
+        (
+            isinstance(value, (int, float, np.integer, np.floating)) and abs(value) < _EXACT_FLOAT_LIMIT
+            for value in values
+        ),
+        bool,
+        len(values),
+    )
+    other = ~(is_text | is_number)
+    hashed = np.empty(len(values), dtype=np.uint64)
+    hashed[is_text] = pd.util.hash_array(values[is_text], hash_key=hash_key)
+    hashed[is_number] = _hash_numbers(values[is_number].astype(np.float64) + 0.0, hash_key)
+    hashed[other] = pd.util.hash_array(
+        np.array([f"{type(value).__name__}:{value}" for value in values[other]], dtype=object), hash_key=hash_key
+    )
+    hashed[~is_text] = _combine_hashes([hashed[~is_text]], int((~is_text).sum()))
+    return hashed
+
+
+def _column_hash(series: pd.Series, hash_key: str, strict: bool) -> tuple[np.ndarray, str]:
+    """Hash of every value of the column and the kind of values it held.
+
+    Outside of strict mode integers are hashed as float64, so a column that
+    parsed as int64 in one chunk and as float64 (because of gaps) in another
+    hashes equal values equally. Missing values always hash to the same
+    constant whatever the dtype of the chunk.
+    """
+    missing = series.isna().to_numpy()
+    if missing.all():
+        return np.full(len(series), _NA_HASH, dtype=np.uint64), "missing"
+
+    dtype = series.dtype
+    if _is_plain_numeric(dtype):
+        values = series.to_numpy()
+        kind = "number"
+        if pd.api.types.is_integer_dtype(dtype) and not strict:
+            large = (values >= _EXACT_FLOAT_LIMIT) | (values <= -_EXACT_FLOAT_LIMIT)
+            if large.any():
+                kind = "large_int"
+            else:
+                values = values.astype(np.float64)
+        if values.dtype.kind == "f":
+            # -0.0 и 0.0 равны для pandas, но различаются побитово
+            values = values + 0.0
+        hashed = _hash_numbers(values, hash_key)
+    elif pd.api.types.is_bool_dtype(dtype):
+        kind = "bool"
+        hashed = _hash_numbers(series.to_numpy(dtype=bool, na_value=False), hash_key)
+    else:
+        kind = "text"
+        hashed = _hash_objects(series.to_numpy(dtype=object), hash_key)
+
+    hashed[missing] = _NA_HASH
+    return hashed, kind
+
+
+def _combine_hashes(hashes: list[np.ndarray], rows: int) -> np.ndarray:
+    """Order-dependent combination of column hashes (tuple hash)."""
+    result = np.full(rows, 0x345678, dtype=np.uint64)
+    multiplier = np.uint64(1000003)
+    for position, hashed in enumerate(hashes):
+        result = (result ^ hashed) * multiplier
+        multiplier += np.uint64(82520 + 2 * (len(hashes) - position))
+    return result + np.uint64(97531)
+
+
+def row_digests(
+    df: pd.DataFrame, columns: list[str], strict: bool = True
+) -> tuple[np.ndarray, np.ndarray, dict[str, str]]:
+    """128-bit fingerprint of every row over ``columns`` as two uint64 arrays.
+
+    Also returns the kind of values seen in every column of this chunk.
+    """
+    digests = []
+    kinds = {}
+    for hash_key in _HASH_KEYS:
+        hashes = []
+        for column in columns:
+            hashed, kinds[column] = _column_hash(df[column], hash_key, strict)
+            hashes.append(hashed)
+        digests.append(_combine_hashes(hashes, len(df)))
+    return digests[0], digests[1], kinds
+
+
+def _digests_consistent(dtypes: dict, kinds: dict[str, set], columns: list[str]) -> bool:
+    """Whether digests of the optimistic pass equal those of whole-file dtypes."""
+    for column in columns:
+        seen = kinds[column] - {"missing"}
+        if not seen:
+            continue
+        resolved = dtypes[column]
+        if _is_plain_numeric(resolved):
+            consistent = seen == {"number"} or (
+                seen == {"large_int"} and pd.api.types.is_integer_dtype(resolved)
+            )
+        elif pd.api.types.is_bool_dtype(resolved):
+            consistent = seen == {"bool"}
+        else:
+            consistent = seen == {"text"}
+        if not consistent:
+            return False
+    return True
+
+
+class DigestSet:
+    """Set of 128-bit row digests stored as sorted numpy runs.
+
+    Each entry costs 16 bytes. Runs are merged geometrically, so inserting
+    n digests costs O(n log^2 n) and lookups are binary searches.
+    """
+
+    def __init__(self) -> None:
+        self._runs: list[tuple[np.ndarray, np.ndarray]] = []
+
+    def __len__(self) -> int:
+        return sum(len(hi) for hi, _ in self._runs)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(hi.nbytes + lo.nbytes for hi, lo in self._runs)
+
+    def runs(self) -> list[tuple[np.ndarray, np.ndarray]]:
+        return list(self._runs)
+
+    def add(self, hi: np.ndarray, lo: np.ndarray) -> np.ndarray:
+        """Insert digests and return a mask of the ones not seen before.
+
+        Within the batch only the first occurrence of a digest counts as new.
+        """
+        order = np.lexsort((lo, hi))
+        hi_sorted, lo_sorted = hi[order], lo[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (hi_sorted[1:] != hi_sorted[:-1]) | (lo_sorted[1:] != lo_sorted[:-1])
+
+        is_new = np.zeros(len(order), dtype=bool)
+        is_new[order[first]] = True
+        candidates = np.flatnonzero(is_new)
+        for run_hi, run_lo in self._runs:
+            if not len(candidates):
+                break
+            seen = self._contains(run_hi, run_lo, hi[candidates], lo[candidates])
+            is_new[candidates[seen]] = False
+            candidates = candidates[~seen]
+
+        keep = first & is_new[order]
+        if keep.any():
+            self._runs.append((hi_sorted[keep], lo_sorted[keep]))
+            self._compact()
+        return is_new
+
+    @staticmethod
+    def _contains(run_hi, run_lo, hi, lo) -> np.ndarray:
+        left = np.searchsorted(run_hi, hi, side="left")
+        right = np.searchsorted(run_hi, hi, side="right")
+        found = np.zeros(len(hi), dtype=bool)
+        hits = np.flatnonzero(right > left)
+        found[hits] = run_lo[left[hits]] == lo[hits]
+        # совпадение старших 64 бит у разных строк - редкость, проверяем вручную
+        for i in hits[(right[hits] - left[hits] > 1) & ~found[hits]]:
+            found[i] = bool((run_lo[left[i]:right[i]] == lo[i]).any())
+        return found
+
+    def _compact(self) -> None:
+        runs = self._runs
+        while len(runs) > 1 and len(runs[-2][0]) <= 2 * len(runs[-1][0]):
+            (hi_b, lo_b), (hi_a, lo_a) = runs.pop(), runs.pop()
+            hi, lo = np.concatenate((hi_a, hi_b)), np.concatenate((lo_a, lo_b))
+            order = np.lexsort((lo, hi))
+            runs.append((hi[order], lo[order]))
+
+
+class FirstOccurrences:
+    """Decides which rows are the first occurrence of their digest.
+
+    Rows are fed chunk by chunk. While the digests fit into
+    ``memory_limit`` the decision is made immediately against a DigestSet.
+    Past the limit the set and all further ``(digest, row)`` records are
+    spilled to hash partitions in ``spill_dir`` and decided per partition
+    in ``chunk_masks``.
+    """
+
+    def __init__(self, memory_limit: int, spill_dir: str | None) -> None:
+        self.memory_limit = memory_limit
+        self.spill_dir = spill_dir
+        self.rows = 0
+        self._seen = DigestSet()
+        self._chunk_sizes: list[int] = []
+        self._packed_masks: list[np.ndarray] = []
+        self._work_dir: str | None = None
+        self._partitions: list[IO[bytes]] = []
+
+    @property
+    def spilled(self) -> bool:
+        return self._work_dir is not None
+
+    def add(self, hi: np.ndarray, lo: np.ndarray) -> None:
+        rows = len(hi)
+        self._chunk_sizes.append(rows)
+        if self.spilled:
+            self._spill_records(hi, lo, np.arange(self.rows, self.rows + rows))
+        else:
+            self._packed_masks.append(np.packbits(self._seen.add(hi, lo)))
+            if self._seen.nbytes > self.memory_limit:
+                self._spill()
+        self.rows += rows
+
+    def _spill(self) -> None:
+        self._work_dir = tempfile.mkdtemp(prefix="dedup_", dir=self.spill_dir)
+        self._partitions = [
+            open(os.path.join(self._work_dir, f"{index}.bin"), "wb")
+            for index in range(1 << _PARTITION_BITS)
+        ]
+        # уже принятые строки попадают в разделы с номером -1: "встречалась раньше"
+        for hi, lo in self._seen.runs():
+            self._spill_records(hi, lo, np.full(len(hi), -1, dtype=np.int64))
+        self._seen = DigestSet()
+        log.info(
+            "Digest set over the memory limit, spilling to disk",
+            extra={"memory_limit": self.memory_limit, "spill_dir": self._work_dir},
+        )
+
+    def _spill_records(self, hi: np.ndarray, lo: np.ndarray, rows: np.ndarray) -> None:
+        records = np.empty(len(hi), dtype=_RECORD)
+        records["hi"], records["lo"], records["row"] = hi, lo, rows
+        partition = (hi >> np.uint64(64 - _PARTITION_BITS)).astype(np.intp)
+        order = np.argsort(partition, kind="stable")
+        bounds = np.searchsorted(partition[order], np.arange((1 << _PARTITION_BITS) + 1))
+        for index, target in enumerate(self._partitions):
+            if bounds[index] < bounds[index + 1]:
+                target.write(records[order[bounds[index]:bounds[index + 1]]].tobytes())
+
+    def _spilled_mask(self) -> np.ndarray:
+        for target in self._partitions:
+            target.close()
+        keep = np.memmap(
+            os.path.join(self._work_dir, "keep.bin"), dtype=bool, mode="w+", shape=(self.rows,)
+        )
+        offset = 0
+        for rows, packed in zip(self._chunk_sizes, self._packed_masks):
+            keep[offset:offset + rows] = np.unpackbits(packed, count=rows).astype(bool)
+            offset += rows
+
+        for index in range(1 << _PARTITION_BITS):
+            records = np.fromfile(os.path.join(self._work_dir, f"{index}.bin"), dtype=_RECORD)
+            if not len(records):
+                continue
+            # при равных отпечатках первой идёт самая ранняя строка
+            records = records[np.lexsort((records["row"], records["lo"], records["hi"]))]
+            first = np.ones(len(records), dtype=bool)
+            first[1:] = (records["hi"][1:] != records["hi"][:-1]) | (
+                records["lo"][1:] != records["lo"][:-1]
+            )
+            rows = records["row"][first]
+            keep[rows[rows >= 0]] = True
+        return keep
+
+    def chunk_masks(self):
+        """Yields the keep mask of every chunk in the order they were added."""
+        if not self.spilled:
+            for rows, packed in zip(self._chunk_sizes, self._packed_masks):
+                yield np.unpackbits(packed, count=rows).astype(bool)
+            return
+
+        keep = self._spilled_mask()
+        offset = 0
+        for rows in self._chunk_sizes:
+            yield np.asarray(keep[offset:offset + rows])
+            offset += rows
+
+    def close(self) -> None:
+        for target in self._partitions:
+            target.close()
+        if self._work_dir is not None:
+            shutil.rmtree(self._work_dir, ignore_errors=True)
+
+
+def _timed_chunks(chunks, timings: StageTimings, count_rows: bool = True):
+    """Chunks of a read_csv iterator, the parsing time going to the "parse" stage.
+
+    The file is parsed more than once; only one of the passes counts rows.
+    """
+    chunks = iter(chunks)
+    while True:
+        with timings.measure("parse") as parse:
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        if count_rows:
+            parse.rows += len(chunk)
+        yield chunk
+
+
+def _digest_pass(
+    open_source: Opener,
+    chunk_rows: int,
+    subset: list[str] | None,
+    memory_limit: int,
+    spill_dir: str | None,
+    timings: StageTimings,
+    dtypes: dict | None = None,
+) -> tuple[dict, list[str], dict[str, set], FirstOccurrences]:
+    """Reads the file once, resolving whole-file dtypes and first occurrences.
+
+    With ``dtypes`` given the file is parsed with them and hashed strictly.
+    """
+    strict = dtypes is not None
+    resolved = dict(dtypes) if strict else None
+    key_columns: list[str] = []
+    kinds: dict[str, set] = {}
+    tracker = FirstOccurrences(memory_limit, spill_dir)
+    try:
+        with open_source() as source:
+            # строки считаются только в первом проходе; строгий повтор их не добавляет
+            for chunk in _timed_chunks(
+                pd.read_csv(source, chunksize=chunk_rows, dtype=dtypes, **CSV_READ_OPTIONS), timings, not strict
+            ):
+                if resolved is None:
+                    resolved = dict(chunk.dtypes)
+                elif not strict:
+                    for column, dtype in chunk.dtypes.items():
+                        resolved[column] = _common_dtype(resolved[column], dtype)
+                if not key_columns:
+                    key_columns = list(chunk.columns)
+                    if subset and set(subset) <= set(chunk.columns):
+                        key_columns = list(subset)
+                    elif subset:
+                        log.warning(
+                            "Key columns not found, deduplicating on full rows", extra={"subset": subset}
+                        )
+                    kinds = {column: set() for column in key_columns}
+
+                with timings.measure("dedup") as dedup:
+                    hi, lo, chunk_kinds = row_digests(chunk, key_columns, strict)
+                    for column, kind in chunk_kinds.items():
+                        kinds[column].add(kind)
+                    tracker.add(hi, lo)
+                    if not strict:
+                        dedup.rows += len(chunk)
+    except BaseException:
+        tracker.close()
+        raise
+    return resolved, key_columns, kinds, tracker
+
+
+def dedup_csv(
+    open_source: Opener,
+    open_sink: Opener,
+    memory_budget: int = MEMORY_BUDGET,
+    subset: list[str] | None = None,
+    spill_dir: str | None = None,
+    output: OutputFormat = OutputFormat(),
+) -> DedupResult | None:
+    """Writes the first occurrence of every row of the source CSV to the sink.
+
+    ``subset`` restricts the comparison to these columns (when the file has
+    all of them), like ``drop_duplicates(subset=...)``. Half of the memory
+    budget goes to parsed chunks and half to the digest set; beyond that
+    digests are spilled to ``spill_dir``. ``output`` is the format written
+    to the sink (CSV by default). Returns None for a file without
+    data rows, in which case the sink is never opened.
+    """
+    chunk_rows = chunk_rows_for(open_source, memory_budget // 2)
+    memory_limit = memory_budget // 2
+    timings = StageTimings()
+
+    dtypes, key_columns, kinds, tracker = _digest_pass(
+        open_source, chunk_rows, subset, memory_limit, spill_dir, timings
+    )
+    try:
+        if not tracker.rows:
+            return None
+        if not _digests_consistent(dtypes, kinds, key_columns):
+            # в колонке смешались типы - хешируем заново с итоговыми dtype
+            tracker.close()
+            _, _, _, tracker = _digest_pass(
+                open_source, chunk_rows, subset, memory_limit, spill_dir, timings, dtypes
+            )
+
+        written = 0
+        with open_source() as source, open_sink() as raw, output.writer(raw) as sink:
+            chunks = pd.read_csv(source, chunksize=chunk_rows, dtype=dtypes, **CSV_READ_OPTIONS)
+            for chunk, keep in zip(_timed_chunks(chunks, timings, count_rows=False), tracker.chunk_masks()):
+                with timings.measure("write") as write:
+                    unique = chunk[keep]
+                    sink.write(unique)
+                    write.rows += len(unique)
+                written += len(unique)
+        timings["dedup"].duplicates += tracker.rows - written
+        return DedupResult(written, tracker.rows - written, chunk_rows, tracker.spilled, timings)
+    finally:
+        tracker.close()
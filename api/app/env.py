@@ -0,0 +1,24 @@
+"""Loading of the .env file."""
+
+import os
+
+
+def load_env_file(start: str) -> str | None:
+    """Loads the nearest .env from ``start`` upwards, as load_dotenv() finds it.
+
+    python-dotenv is only imported when there is a file to load: on a
+    serverless deployment the settings come from the environment and the
+    cold start does not pay for it. Returns the loaded path.
+    """
+    directory = os.path.abspath(start)
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+
+            load_dotenv(path)
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
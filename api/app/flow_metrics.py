@@ -0,0 +1,167 @@
+"""Time in status, lead time and cycle time from History.
+
+History is sorted once by (entity_id, history_date); every entity is then
+a contiguous segment and all durations are differences between
+neighbouring rows of the same segment, so no per-entity groupby or merge
+is needed.
+
+A status change "A -> B" at time t closes the interval spent in A, which
+started at the previous status change of the entity or, for the first
+one, at the first History record of the entity.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from app.frames import to_datetime
+
+STATUS_CATEGORIES = {
+    "К выполнению": ["Создано", "Готово к разработке", "Анализ", "В ожидании", "Отложен"],
+    "В работе": ["В работе", "Тестирование", "Разработка", "Подтверждение", "Подтверждение исправления", "СТ", "Исправление"],
+    "Сделано": ["Закрыто", "Выполнено", "СТ Завершено", "Отклонен исполнителем", "Локализация"],
+}
+STATUS_PROPERTY = "Статус"
+PERCENTILES = (50, 75, 85, 95)
+
+_NS_PER_SECOND = 10**9
+
+
+@dataclass
+class StatusTimeline:
+    """Status changes sorted by (entity, time), segmented by entity.
+
+    ``entity_ids``/``first_event`` are per entity, the other arrays per
+    status change; ``entity`` is the index of the change's entity.
+    """
+
+    entity_ids: np.ndarray
+    first_event: np.ndarray
+    entity: np.ndarray
+    times: np.ndarray
+    old_status: np.ndarray
+    new_status: np.ndarray
+    statuses: np.ndarray
+
+    @property
+    def previous_change(self) -> np.ndarray:
+        """Start of the interval each change closes."""
+        previous = np.empty_like(self.times)
+        previous[1:] = self.times[:-1]
+        first = np.ones(len(self.entity), dtype=bool)
+        first[1:] = self.entity[1:] != self.entity[:-1]
+        previous[first] = self.first_event[self.entity[first]]
+        return previous
+
+
+def status_timeline(history: pd.DataFrame) -> StatusTimeline:
+    """Sorts the History rows with an entity and a date once and keeps the status changes."""
+    entity_ids = pd.to_numeric(history["entity_id"], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    times = to_datetime(history["history_date"]).to_numpy(dtype="datetime64[ns]")
+    valid = ~np.isnan(entity_ids) & ~np.isnat(times)
+    entity_ids = entity_ids[valid].astype(np.int64)
+    times = times[valid].astype(np.int64)
+
+    order = np.lexsort((times, entity_ids))
+    entity_ids, times = entity_ids[order], times[order]
+    boundary = np.r_[True, entity_ids[1:] != entity_ids[:-1]]
+    starts = np.flatnonzero(boundary)
+    segment = np.cumsum(boundary) - 1
+
+    is_status = (history["history_property_name"] == STATUS_PROPERTY).to_numpy()[valid][order]
+    # различных переходов немного: строки разбираются по уникальным значениям
+    change_codes, transitions = pd.factorize(history["history_change"])
+    change_codes = change_codes[valid][order][is_status]
+    sides = (
+        pd.Series(transitions, dtype="string").fillna("")
+        .str.split(" -> ", n=1, expand=True).reindex(columns=[0, 1])
+    )
+    status_codes, statuses = pd.factorize(
+        pd.concat([sides[0], sides[1]], ignore_index=True).str.strip().fillna("")
+    )
+    old_codes = status_codes[:len(transitions)]
+    new_codes = status_codes[len(transitions):]
+    # пустой history_change - не переход
+    rows = np.flatnonzero(is_status)[change_codes >= 0]
+    change_codes = change_codes[change_codes >= 0]
+    return StatusTimeline(
+        entity_ids=entity_ids[starts],
+        first_event=times[starts],
+        entity=segment[rows],
+        times=times[rows],
+        old_status=old_codes[change_codes],
+        new_status=new_codes[change_codes],
+        statuses=np.asarray(statuses, dtype=object),
+    )
+
+
+def time_in_status(timeline: StatusTimeline, as_of: pd.Timestamp | None = None) -> pd.DataFrame:
+    """Seconds every entity spent in every status (entity_id, status, category, seconds).
+
+    The current status of an entity is counted up to ``as_of`` when given.
+    """
+    entity = timeline.entity
+    status = timeline.old_status
+    durations = timeline.times - timeline.previous_change
+    if as_of is not None and len(entity):
+        last = np.r_[entity[1:] != entity[:-1], True]
+        entity = np.concatenate([entity, entity[last]])
+        status = np.concatenate([status, timeline.new_status[last]])
+        durations = np.concatenate([durations, pd.Timestamp(as_of).value - timeline.times[last]])
+
+    key = entity * len(timeline.statuses) + status
+    keys, inverse = np.unique(key, return_inverse=True)
+    seconds = np.bincount(inverse, weights=durations) / _NS_PER_SECOND
+    names = timeline.statuses[keys % len(timeline.statuses)] if len(keys) else np.empty(0, dtype=object)
+    category = {name: category for category, names in STATUS_CATEGORIES.items() for name in names}
+    return pd.DataFrame({
+        "entity_id": timeline.entity_ids[keys // max(len(timeline.statuses), 1)],
+        "status": names,
+        "category": pd.Series(names, dtype=object).map(category).to_numpy(),
+        "seconds": seconds,
+    })
+
+
+def _first_per_entity(timeline: StatusTimeline, mask: np.ndarray) -> np.ndarray:
+    """Time of the first change matching ``mask`` for every entity, NaT (min int) if none."""
+    first = np.full(len(timeline.entity_ids), np.iinfo(np.int64).min, dtype=np.int64)
+    entities, index = np.unique(timeline.entity[mask], return_index=True)
+    first[entities] = timeline.times[mask][index]
+    return first
+
+
+def lead_cycle_times(timeline: StatusTimeline) -> pd.DataFrame:
+    """Lead time (first record -> first "Сделано" status) and cycle time
+    (first "В работе" status -> first "Сделано" status) per entity, in seconds."""
+    category_of = pd.Series(timeline.statuses).map(
+        {name: category for category, names in STATUS_CATEGORIES.items() for name in names}
+    ).to_numpy()
+    new_category = category_of[timeline.new_status] if len(category_of) else np.empty(0, dtype=object)
+    done = _first_per_entity(timeline, new_category == "Сделано")
+    started = _first_per_entity(timeline, new_category == "В работе")
+
+    missing = np.iinfo(np.int64).min
+    lead = np.where(done != missing, (done - timeline.first_event) / _NS_PER_SECOND, np.nan)
+    cycle = np.where(
+        (done != missing) & (started != missing) & (started <= done),
+        (done - started) / _NS_PER_SECOND,
+        np.nan,
+    )
+    return pd.DataFrame({
+        "entity_id": timeline.entity_ids,
+        "lead_seconds": lead,
+        "cycle_seconds": cycle,
+    })
+
+
+def distribution(seconds: pd.Series, unit_seconds: float = 3600) -> dict:
+    """Count, mean and percentiles of the known durations, in hours by default."""
+    values = seconds.dropna().to_numpy() / unit_seconds
+    if not len(values):
+        return {"count": 0, "mean": None, **{f"p{q}": None for q in PERCENTILES}}
+    return {
+        "count": len(values),
+        "mean": round(float(values.mean()), 1),
+        **{f"p{q}": round(float(p), 1) for q, p in zip(PERCENTILES, np.percentile(values, PERCENTILES))},
+    }
@@ -0,0 +1,94 @@
+"""Concurrent download -> process -> upload of a storage folder."""
+
+import asyncio
+import logging
+import os
+import posixpath
+import shutil
+import uuid
+from typing import Callable
+
+from app.storage import StorageBackend
+from app.telemetry import StageTimings
+
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "4"))
+
+log = logging.getLogger(__name__)
+
+
+async def process_storage_folder(
+    storage: StorageBackend,
+    bucket_name: str,
+    folder_path: str,
+    process_file: Callable[..., str | None],
+    work_dir: str,
+    concurrency: int = SYNC_CONCURRENCY,
+    timings: StageTimings | None = None,
+) -> list[str]:
+    """Processes every CSV of the folder and uploads the results.
+
+    Up to ``concurrency`` files are in flight at once, so downloads,
+    processing (in a worker thread) and uploads of different files overlap.
+    Returns the URLs of the uploaded files in listing order.
+    ``process_file(path, timings=...)`` gets the timings of its own file.
+    Downloads are the "save" stage of ``timings`` and uploads the "upload"
+    stage; with several files in flight their times overlap. The first
+    failure cancels the other files and is raised as is; the temporary
+    folder is removed only after every processing thread has finished.
+    """
+    timings = timings if timings is not None else StageTimings()
+    temp_dir = os.path.join(work_dir, f"temp_{uuid.uuid4().hex}")
+    os.makedirs(temp_dir, exist_ok=True)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    # у каждого файла свои счётчики: обработка идёт в потоках, общий объект они бы делили без блокировки
+    file_timings: list[StageTimings] = []
+    # поток не отменить: его ждём перед удалением временной папки, даже если задача отменена
+    threads: list[asyncio.Future] = []
+
+    async def sync_file(file_name: str) -> str | None:
+        timings = StageTimings()
+        file_timings.append(timings)
+        async with semaphore:
+            local_file_path = os.path.join(temp_dir, file_name)
+            with timings.measure("save") as save:
+                await storage.download(
+                    bucket_name, posixpath.join(folder_path, file_name), local_file_path
+                )
+                save.bytes_out += os.path.getsize(local_file_path)
+            log.debug("Downloaded file", extra={"file_name": file_name, "path": local_file_path})
+
+            thread = asyncio.ensure_future(asyncio.to_thread(process_file, local_file_path, timings=timings))
+            threads.append(thread)
+            processed_file_path = await asyncio.shield(thread)
+            if not processed_file_path:
+                return None
+
+            remote_file_name = (
+                f"processed/{uuid.uuid4().hex}/{os.path.basename(processed_file_path)}"
+            )
+            with timings.measure("upload") as upload:
+                url = await storage.upload(bucket_name, processed_file_path, remote_file_name)
+                upload.bytes_in += os.path.getsize(processed_file_path)
+            log.info("Processed file uploaded to storage", extra={"file_name": file_name, "url": url})
+            return url
+
+    try:
+        file_names = [
+            name
+            for name in await storage.list_files(bucket_name, folder_path)
+            if name.endswith(".csv")
+        ]
+        try:
+            async with asyncio.TaskGroup() as group:
+                tasks = [group.create_task(sync_file(name)) for name in file_names]
+        except ExceptionGroup as e:
+            # остальные файлы уже отменены; наружу - первая ошибка, как раньше
+            raise e.exceptions[0]
+        return [url for url in (task.result() for task in tasks) if url]
+    finally:
+        await asyncio.gather(*threads, return_exceptions=True)
+        for stages in file_timings:
+            timings.merge(stages)
+        # cleaning up
+        shutil.rmtree(temp_dir, ignore_errors=True)
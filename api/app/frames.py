@@ -0,0 +1,111 @@
+"""Compact in-memory representation of the Tasks/History/Sprints tables.
+
+Low-cardinality text columns are held as categoricals, ids and version
+numbers in the narrowest (nullable) integer type, estimation/spent
+seconds as float64 and dates as datetime64. ``rank`` (long lexorank
+strings) is dropped unless asked for, in which case it is interned as a
+categorical.
+"""
+
+import numpy as np
+import pandas as pd
+
+CATEGORY_COLUMNS = [
+    # tasks
+    "area", "type", "status", "state", "priority", "assignee", "owner",
+    "created_by", "updated_by", "workgroup", "resolution",
+    # history, sprints
+    "history_property_name", "history_change_type", "sprint_status",
+]
+DATE_COLUMNS = [
+    "create_date", "update_date", "due_date", "history_date",
+    "sprint_start_date", "sprint_end_date",
+]
+# ключи и номера: в арифметике не участвуют, поэтому сужаются
+KEY_COLUMNS = ["entity_id", "parent_ticket_id", "history_version", "sprint_id"]
+# секунды складываются и вычитаются: в int8/int16 такие суммы переполнились бы
+MEASURE_COLUMNS = ["estimation", "spent"]
+
+
+def to_datetime(column: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column
+    parsed = pd.to_datetime(column, format="ISO8601", errors="coerce")
+    # в выгрузке истории встречаются даты вида 20/7/24
+    rest = parsed.isna() & column.notna()
+    if rest.any():
+        parsed[rest] = pd.to_datetime(column[rest], format="mixed", dayfirst=True, errors="coerce")
+    return parsed
+
+
+def downcast(column: pd.Series) -> pd.Series:
+    """Narrowest integer type for integer-valued numbers.
+
+    Only for key columns: arithmetic on an int8/int16 column wraps around.
+    """
+    values = pd.to_numeric(column, errors="coerce")
+    present = values.dropna()
+    if present.empty or not np.array_equal(present, np.round(present)):
+        return values
+    for dtype in ("Int8", "Int16", "Int32", "Int64"):
+        info = np.iinfo(dtype.lower())
+        if info.min <= present.min() and present.max() <= info.max:
+            if values.hasnans:
+                return values.astype(dtype)
+            return values.astype(dtype.lower())
+    return values
+
+
+def compact(df: pd.DataFrame, keep_rank: bool = False) -> pd.DataFrame:
+    """Typed copy of a Tasks/History/Sprints frame or of a join of them."""
+    df = df.drop(columns=[c for c in df.columns if c.startswith("Unnamed:") or c == "Столбец1"])
+    if "rank" in df.columns:
+        df = df.assign(rank=df["rank"].astype("category")) if keep_rank else df.drop(columns="rank")
+    for column in KEY_COLUMNS:
+        if column in df.columns:
+            df[column] = downcast(df[column])
+    for column in MEASURE_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype("float64")
+    for column in DATE_COLUMNS:
+        if column in df.columns:
+            df[column] = to_datetime(df[column])
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    return df
+
+
+def memory_report(frames: dict[str, pd.DataFrame]) -> dict[str, dict]:
+    """Rows and resident bytes (deep) of every table, per column and total."""
+    report = {}
+    for name, df in frames.items():
+        usage = df.memory_usage(deep=True, index=True)
+        report[name] = {
+            "rows": len(df),
+            "bytes": int(usage.sum()),
+            "columns": {column: int(size) for column, size in usage.items()},
+        }
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from app.sprint_metrics import DATASET_FILES, read_table
+
+    parser = argparse.ArgumentParser(description="Memory of a dataset before and after compaction")
+    parser.add_argument("dataset_dir")
+    parser.add_argument("--keep-rank", action="store_true")
+    args = parser.parse_args()
+    raw = {
+        name.removesuffix(".csv").lower(): read_table(f"{args.dataset_dir}/{name}")
+        for name in DATASET_FILES
+    }
+    typed = {table: compact(df, keep_rank=args.keep_rank) for table, df in raw.items()}
+    report = {
+        table: {"raw_bytes": before["bytes"], **after}
+        for (table, before), after in zip(memory_report(raw).items(), memory_report(typed).values())
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
@@ -0,0 +1,184 @@
+"""HTTP caching of the JSON responses of the analytics routes.
+
+A response is identified by its route, the version of the data it is
+computed from and the query (parameters or JSON body). The identity is
+also the ETag, so a client revalidating with If-None-Match gets 304
+before the payload is computed or even looked up. The version must
+change only with the data (see ``dataset_version`` and
+``agile_store.database_version``), otherwise clients lose their 304s.
+Serialized bodies, and their gzip variant for large payloads, are kept in
+an in-process LRU bounded by bytes; bodies of a route's older data
+version are dropped as soon as a newer one is stored.
+
+The POST analytics routes are read-only queries, so they revalidate the
+same way. JSON is encoded with orjson when it is installed (numpy scalars
+and arrays included) and with the json module otherwise.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_MB", "64")) * 1024 * 1024
+# тела меньше этого размера не сжимаются: gzip не окупается
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+# меняется вместе с форматом тел, чтобы клиенты не держали старые ETag
+CACHE_FORMAT = 1
+
+log = logging.getLogger(__name__)
+
+
+def _default(value: Any) -> Any:
+    """numpy/pandas values the encoders do not know (numpy itself is not imported here)."""
+    if type(value).__name__ in ("NAType", "NaTType"):
+        return None
+    if hasattr(value, "item") and hasattr(value, "dtype"):
+        # скаляр numpy: int64, float32, bool_, ...
+        return value.item()
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(payload: Any) -> bytes:
+    """Compact UTF-8 JSON; non-string keys become strings, NaN becomes null (with orjson)."""
+    if orjson is not None:
+        return orjson.dumps(
+            payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def canonical_query(query: Any) -> str:
+    """Equal queries (whatever the key order of a JSON body) give equal strings."""
+    return json.dumps(query, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def accepts_gzip(request: Request) -> bool:
+    return any(
+        token.split(";")[0].strip() in ("gzip", "*")
+        for token in request.headers.get("accept-encoding", "").split(",")
+    )
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of If-None-Match with the ETag."""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in header.split(","))
+
+
+@dataclass
+class CachedBody:
+    body: bytes
+    gzipped: bytes | None
+    route: str = ""
+    version: str = ""
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.body) + len(self.gzipped or b"")
+
+
+def encode(payload: Any) -> CachedBody:
+    body = dumps(payload)
+    gzipped = gzip.compress(body, GZIP_LEVEL, mtime=0) if len(body) >= GZIP_MIN_BYTES else None
+    return CachedBody(body, gzipped)
+
+
+class ResponseCache:
+    """LRU of serialized response bodies keyed by ETag; ``max_bytes`` 0 keeps nothing."""
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries: OrderedDict[str, CachedBody] = OrderedDict()
+        # последняя версия данных каждого маршрута
+        self._versions: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def etag(route: str, version: str, query: Any) -> str:
+        digest = hashlib.sha256(f"{CACHE_FORMAT}:{route}:{version}:{canonical_query(query)}".encode())
+        # слабый: gzip и несжатое тело - одно и то же представление
+        return f'W/"{digest.hexdigest()[:32]}"'
+
+    def get(self, etag: str) -> CachedBody | None:
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+            return entry
+
+    def put(self, etag: str, entry: CachedBody) -> None:
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if self._versions.get(entry.route, entry.version) != entry.version:
+                # данные маршрута обновились: старые тела больше никто не получит
+                for stale in [key for key, cached in self._entries.items() if cached.route == entry.route]:
+                    self.nbytes -= self._entries.pop(stale).nbytes
+            self._versions[entry.route] = entry.version
+            previous = self._entries.pop(etag, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes
+            self._entries[etag] = entry
+            self.nbytes += entry.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    async def respond(
+        self,
+        request: Request,
+        route: str,
+        version: str,
+        query: Any,
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Response:
+        """304, a cached body or the freshly computed payload of the query.
+
+        ``compute`` runs only on a miss; an exception from it (e.g. 404)
+        is passed through and nothing is cached.
+        """
+        etag = self.etag(route, version, query)
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        entry = self.get(etag)
+        headers["X-Cache"] = "HIT" if entry is not None else "MISS"
+        if entry is None:
+            payload = await compute()
+            entry = await run_in_threadpool(encode, payload)
+            entry.route, entry.version = route, version
+            self.put(etag, entry)
+
+        if entry.gzipped is not None and accepts_gzip(request):
+            headers["Content-Encoding"] = "gzip"
+            return Response(entry.gzipped, media_type="application/json", headers=headers)
+        return Response(entry.body, media_type="application/json", headers=headers)
@@ -0,0 +1,333 @@
+"""Persistent queue of background archive processing jobs.
+
+Every job is a row of a SQLite table, so its status survives restarts;
+the uploaded and processed archives live in ``<work_dir>/<job_id>/``.
+A bounded pool of worker threads runs the jobs in submission order and
+``create`` refuses new jobs once ``max_pending`` are waiting or running,
+which the API reports as 429.
+
+A job goes uploading -> queued -> running -> done | failed. Several
+processes (workers of one server, or the old and new one of a rolling
+restart) can share the table: every unfinished job is owned by the
+process that created or claimed it, which renews a lease on its jobs in
+the background. ``recover`` - on startup and with every renewal - takes
+over only the jobs whose owner's lease has expired: it requeues the
+queued and running ones and fails the ones whose upload was cut short.
+Every run writes its result to a file of its own, which replaces
+``output.zip`` in the same transaction that checks the run still owns
+the job, so a run whose job was taken over never touches the result.
+"""
+
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# сколько задач может ждать или выполняться одновременно
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "16"))
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_HOURS", "24")) * 3600
+# задачи процесса, не продлевавшего аренду столько секунд, забирают другие процессы
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+PENDING_STATUSES = ("uploading", "queued", "running")
+INPUT_FILE = "input.zip"
+OUTPUT_FILE = "output.zip"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    filename TEXT,
+    params TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT,
+    owner TEXT,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+log = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    job_id: str
+    status: str
+    filename: str | None
+    params: dict
+    progress: float
+    created_at: float
+    started_at: float | None
+    finished_at: float | None
+    result: dict | None
+    error: str | None
+    # процесс, который загружает или выполняет задачу, и его последняя отметка
+    owner: str | None
+    heartbeat_at: float | None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        values = dict(row)
+        values["params"] = json.loads(values["params"])
+        values["result"] = json.loads(values["result"]) if values["result"] else None
+        return cls(**values)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+# обработчик получает задачу, путь для результата этой попытки и функцию для отчёта
+# о прогрессе (0..1), возвращает result
+Handler = Callable[[Job, str, Callable[[float], None]], dict]
+
+
+def add_lease_columns(connection: sqlite3.Connection) -> None:
+    """Tables created before leases get the owner and heartbeat_at columns."""
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(jobs)")}
+    for column, column_type in (("owner", "TEXT"), ("heartbeat_at", "REAL")):
+        if column not in columns:
+            connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+
+
+class JobQueue:
+    def __init__(
+        self,
+        db_path: str,
+        work_dir: str,
+        handler: Handler,
+        workers: int = JOB_WORKERS,
+        max_pending: int = JOB_QUEUE_LIMIT,
+        result_ttl: float = JOB_RESULT_TTL_SECONDS,
+        lease: float = JOB_LEASE_SECONDS,
+    ) -> None:
+        self.db_path = db_path
+        self.work_dir = work_dir
+        self.handler = handler
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.lease = lease
+        # pid повторяется между перезапусками контейнера, поэтому ещё и случайная часть
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # потоки создаются при первой задаче
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        os.makedirs(work_dir, exist_ok=True)
+        with closing(self._connect()) as connection, connection:
+            connection.executescript(SCHEMA)
+            add_lease_columns(connection)
+        self._heartbeat = threading.Thread(target=self._renew_leases, name="job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def _update(self, job_id: str, **values) -> None:
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        with closing(self._connect()) as connection, connection:
+            connection.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*values.values(), job_id))
+
+    def _update_owned(self, job_id: str, **values) -> bool:
+        """Updates a job only while this process owns it; False once another one took it over."""
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        with closing(self._connect()) as connection, connection:
+            return connection.execute(
+                f"UPDATE jobs SET {assignments} WHERE job_id = ? AND owner = ?",
+                (*values.values(), job_id, self.owner),
+            ).rowcount == 1
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.work_dir, job_id)
+
+    def input_path(self, job_id: str) -> str:
+        return os.path.join(self.job_dir(job_id), INPUT_FILE)
+
+    def output_path(self, job_id: str) -> str:
+        return os.path.join(self.job_dir(job_id), OUTPUT_FILE)
+
+    def get(self, job_id: str) -> Job | None:
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row is not None else None
+
+    def pending(self) -> int:
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE status IN ({', '.join('?' * len(PENDING_STATUSES))})",
+                PENDING_STATUSES,
+            ).fetchone()[0]
+
+    def create(self, filename: str | None, params: dict) -> Job:
+        """Registers a job whose input is being uploaded; raises QueueFull over the limit."""
+        self.purge()
+        with self._lock:
+            if self.pending() >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} jobs are already pending")
+            job_id = uuid.uuid4().hex
+            with closing(self._connect()) as connection, connection:
+                connection.execute(
+                    "INSERT INTO jobs (job_id, status, filename, params, created_at, owner, heartbeat_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, "uploading", filename, json.dumps(params), time.time(), self.owner, time.time()),
+                )
+        os.makedirs(self.job_dir(job_id), exist_ok=True)
+        return self.get(job_id)
+
+    def enqueue(self, job_id: str) -> None:
+        """Hands an uploaded job to the workers."""
+        self._update(job_id, status="queued")
+        self._executor.submit(self._run, job_id)
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._update(job_id, status="failed", error=error, finished_at=time.time())
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def _claim(self, job_id: str) -> bool:
+        """Marks a queued job running under this process; False if it is not queued anymore."""
+        now = time.time()
+        with closing(self._connect()) as connection, connection:
+            claimed = connection.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, heartbeat_at = ?, started_at = ?, progress = 0 "
+                "WHERE job_id = ? AND status = 'queued'",
+                (self.owner, now, now, job_id),
+            ).rowcount
+        return claimed == 1
+
+    def _finish_owned(self, job_id: str, attempt_path: str, **values) -> bool:
+        """Publishes the attempt's output and updates the job, both only while this process owns it."""
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        with closing(self._connect()) as connection, connection:
+            # IMMEDIATE: захват задачи другим процессом ждёт конца транзакции
+            connection.execute("BEGIN IMMEDIATE")
+            owned = connection.execute(
+                "SELECT 1 FROM jobs WHERE job_id = ? AND owner = ?", (job_id, self.owner)
+            ).fetchone()
+            if owned is None:
+                return False
+            if os.path.exists(attempt_path):
+                os.replace(attempt_path, self.output_path(job_id))
+            connection.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*values.values(), job_id))
+        return True
+
+    def _run(self, job_id: str) -> None:
+        if not self._claim(job_id):
+            return
+        job = self.get(job_id)
+        # у каждой попытки свой файл: прежний владелец не перезапишет результат нового
+        attempt_path = os.path.join(self.job_dir(job_id), f"attempt_{uuid.uuid4().hex}_{OUTPUT_FILE}")
+        try:
+            try:
+                result = self.handler(
+                    job, attempt_path, lambda progress: self._update_owned(job_id, progress=round(progress, 4))
+                )
+            except Exception as e:
+                log.exception("Job failed", extra={"job_id": job_id})
+                finished = self._update_owned(job_id, status="failed", error=str(e), finished_at=time.time())
+                result = None
+            else:
+                finished = self._finish_owned(
+                    job_id, attempt_path,
+                    status="done", progress=1.0, result=json.dumps(result), finished_at=time.time(),
+                )
+        finally:
+            # после сбоя или перехвата задачи файл попытки не нужен
+            if os.path.exists(attempt_path):
+                os.remove(attempt_path)
+        if not finished:
+            # аренда истекла и задачу забрал другой процесс: её статус и вход теперь его
+            log.warning("Job was taken over by another process", extra={"job_id": job_id})
+            return
+        # вход больше не нужен ни при каком исходе
+        if os.path.exists(self.input_path(job_id)):
+            os.remove(self.input_path(job_id))
+        if result is not None:
+            log.info("Job done", extra={"job_id": job_id, "seconds": round(time.time() - job.created_at, 3)})
+
+    def heartbeat(self) -> None:
+        """Renews the lease on every unfinished job of this process."""
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                f"UPDATE jobs SET heartbeat_at = ? WHERE owner = ? "
+                f"AND status IN ({', '.join('?' * len(PENDING_STATUSES))})",
+                (time.time(), self.owner, *PENDING_STATUSES),
+            )
+
+    def _renew_leases(self) -> None:
+        # продлеваем аренду втрое чаще её срока и забираем задачи умерших процессов
+        while not self._stopped.wait(self.lease / 3):
+            try:
+                self.heartbeat()
+                self.recover()
+            except sqlite3.Error:
+                log.exception("Job lease renewal failed")
+
+    def recover(self) -> None:
+        """Takes over the unfinished jobs of processes whose lease has expired."""
+        now = time.time()
+        expired = "status IN ({}) AND owner IS NOT ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)".format(
+            ", ".join("?" * len(PENDING_STATUSES))
+        )
+        arguments = (*PENDING_STATUSES, self.owner, now - self.lease)
+        with closing(self._connect()) as connection, connection:
+            # IMMEDIATE: два процесса не заберут одну и ту же задачу
+            connection.execute("BEGIN IMMEDIATE")
+            orphaned = connection.execute(
+                f"SELECT job_id, status FROM jobs WHERE {expired} ORDER BY created_at", arguments
+            ).fetchall()
+            connection.execute(
+                f"UPDATE jobs SET status = 'failed', error = 'Upload interrupted', finished_at = ? "
+                f"WHERE {expired} AND status = 'uploading'",
+                (now, *arguments),
+            )
+            connection.execute(
+                f"UPDATE jobs SET status = 'queued', progress = 0, owner = ?, heartbeat_at = ? "
+                f"WHERE {expired} AND status IN ('queued', 'running')",
+                (self.owner, now, *arguments),
+            )
+        job_ids = [job_id for job_id, status in orphaned if status != "uploading"]
+        for job_id, status in orphaned:
+            if status == "uploading":
+                shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        for job_id in job_ids:
+            self._executor.submit(self._run, job_id)
+        if orphaned:
+            log.info("Took over unfinished jobs", extra={"requeued": len(job_ids), "failed": len(orphaned) - len(job_ids)})
+
+    def purge(self) -> None:
+        """Forgets finished jobs and their results older than the TTL."""
+        deadline = time.time() - self.result_ttl
+        with closing(self._connect()) as connection, connection:
+            job_ids = [
+                row[0] for row in connection.execute(
+                    "SELECT job_id FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (deadline,)
+                )
+            ]
+            connection.executemany("DELETE FROM jobs WHERE job_id = ?", ((job_id,) for job_id in job_ids))
+        for job_id in job_ids:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
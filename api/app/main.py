@@ -1,209 +1,300 @@
+import json
+import logging
 import os
+import time
 import zipfile
-import pandas as pd
 import shutil
-import hashlib
-import time
 import uuid
+from contextlib import asynccontextmanager
+from functools import cache, partial
+from typing import TYPE_CHECKING, Callable
 
-from fastapi import FastAPI, Query, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Query, Request, UploadFile, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
 from starlette.background import BackgroundTask
-from supabase import create_client
-from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+
+from app.env import load_env_file
+
+# загрузка .env - до импорта модулей, которые читают настройки из окружения
+load_env_file(os.path.dirname(__file__))
 
-# загрузка .env
-load_dotenv()
+# pandas и обработка архивов импортируются при первом запросе, который их использует:
+# холодный старт (vercel.json) и /sprint-data с готовыми метриками их не ждут
+from app.folder_sync import process_storage_folder  # noqa: E402
+from app.http_cache import ResponseCache  # noqa: E402
+from app.jobs import Job, JobQueue, QueueFull  # noqa: E402
+from app.metrics_store import DATASET_FILES, SprintMetricsStore, dataset_version  # noqa: E402
+from app.output_format import OutputFormat, archive_sizes, parse_output_format  # noqa: E402
+from app.result_cache import ResultCache, copy_and_hash  # noqa: E402
+from app.storage import StorageBackend, create_storage  # noqa: E402
+from app.telemetry import REGISTRY, REQUEST_SECONDS, StageTimings, configure_logging, publish  # noqa: E402
 
-app = FastAPI()
+if TYPE_CHECKING:
+    from app.zip_pipeline import Progress
+
+# уровень и формат логов - LOG_LEVEL, LOG_FORMAT (json | text)
+configure_logging()
+log = logging.getLogger("app.main")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # очередь задач и отпечатки набора готовятся при запуске, а не при импорте
+    await start_jobs()
+    await read_dataset_version()
+    try:
+        yield
+    finally:
+        await stop_jobs()
+
+
+app = FastAPI(lifespan=lifespan)
 
 DATA_DIR = "./data"
 os.makedirs(DATA_DIR, exist_ok=True)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE")
-if SUPABASE_KEY is None or SUPABASE_URL is None:
-    raise RuntimeError("Environment variables for Supabase was not found")
-
-supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
 BUCKET_NAME = "sprint-data"
 
+# кэш результатов по sha256 загруженного архива, 0 - выключен
+result_cache = ResultCache(
+    os.path.join(DATA_DIR, "cache"),
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_MB", "1024")) * 1024 * 1024,
+    ttl_seconds=float(os.getenv("RESULT_CACHE_TTL_HOURS", "24")) * 3600,
+)
+
+# Tasks.csv, History.csv, Sprints.csv для /sprint-data; метрики считаются
+# один раз на версию набора и хранятся в data/metrics
+SPRINT_DATASET_DIR = os.getenv("SPRINT_DATASET_DIR", os.path.join(DATA_DIR, "dataset"))
+sprint_metrics = SprintMetricsStore(os.path.join(DATA_DIR, "metrics"))
+# готовые JSON-ответы по (версия набора, параметры) и ETag для 304
+response_cache = ResponseCache()
+
+# "extract" - распаковка во временную папку и pandas целиком,
+# "stream" - построчная обработка прямо из архива с ограниченной памятью
+ZIP_PROCESSING_MODES = ("extract", "stream")
+ZIP_PROCESSING_MODE = os.getenv("ZIP_PROCESSING_MODE", "stream")
+
+# формат обработанных файлов: csv (deflate 0-9) | parquet (zstd 1-22), уровень по умолчанию - 6 / 3
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "csv")
+OUTPUT_COMPRESSION_LEVEL = int(os.getenv("OUTPUT_COMPRESSION_LEVEL")) if os.getenv("OUTPUT_COMPRESSION_LEVEL") else None
+
+# через сколько секунд клиенту стоит повторить запрос при 429 / незавершённой задаче
+JOB_RETRY_AFTER = os.getenv("JOB_RETRY_AFTER_SECONDS", "5")
+
+@cache
+def get_storage() -> StorageBackend:
+    """Supabase or a local folder (STORAGE_BACKEND=local), created on first use.
+
+    Missing Supabase settings fail only the routes that need storage.
+    """
+    return create_storage()
+
+
 def generate_unique_prefix():
-    """Creates a unique prefix based on current time"""
-    current_time = str(time.time()).encode()
-    return hashlib.md5(current_time).hexdigest()[:8]
+    """Creates a unique prefix for temporary files of one request"""
+    return uuid.uuid4().hex
+
+
+def cleanup_files(*paths: str):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+            log.debug("Removed file", extra={"path": path})
+
+
+def zip_file_response(
+    path: str,
+    upload_name: str,
+    duplicates: dict,
+    cache_hit: bool,
+    background: BackgroundTask | None = None,
+    sizes: dict | None = None,
+) -> FileResponse:
+    headers = {
+        "X-Cache": "HIT" if cache_hit else "MISS",
+        "X-Duplicate-Counts": json.dumps(duplicates),
+    }
+    if sizes is not None:
+        # исходный размер каждого файла против сжатого в архиве
+        headers["X-Archive-Sizes"] = json.dumps(sizes)
+    return FileResponse(
+        path,
+        filename=f"processed_{upload_name}",
+        headers=headers,
+        background=background,
+    )
 
 
-def process_csv_file(file_path: str) -> str | None:
+def resolve_output(output_format: str, compression_level: int | None) -> OutputFormat:
     try:
-        df = pd.read_csv(file_path, sep=";", skiprows=1)
-        print(f"Loaded DataFrame for {file_path}, shape: {df.shape}")
+        return parse_output_format(output_format, compression_level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        if df.empty:
-            print(f"File {file_path} is empty after processing. Skipping.")
-            return None
 
-        # считаем дубликаты
-        duplicate_count = int(df.duplicated().sum())
-        print(f"Duplicates found in {file_path}: {duplicate_count}")
+def process_csv_file(
+    file_path: str,
+    subset: list[str] | None = None,
+    timings: StageTimings | None = None,
+    output: OutputFormat = OutputFormat(),
+) -> str | None:
+    from app.dedup import dedup_csv
 
-        # удаляем полные дубликаты
-        df = df.drop_duplicates()
+    try:
+        # сохраняем обработанный .csv с разделителем "," (или .parquet)
+        processed_file_path = file_path.replace(".csv", f"_processed{output.extension}")
+        result = dedup_csv(
+            partial(open, file_path, "rb"),
+            partial(open, processed_file_path, "wb"),
+            subset=subset,
+            spill_dir=os.path.dirname(file_path),
+            output=output,
+        )
 
-        # сохраняем обработанный .csv с разделителем ","
-        processed_file_path = file_path.replace(".csv", "_processed.csv")
-        df.to_csv(processed_file_path, index=False, sep=",")
-        print(f"Processed file saved: {processed_file_path}")
+        if result is None:
+            log.warning("File is empty after processing, skipping", extra={"path": file_path})
+            return None
+
+        result.timings["parse"].bytes_in += os.path.getsize(file_path)
+        result.timings["write"].bytes_out += os.path.getsize(processed_file_path)
+        if timings is not None:
+            timings.merge(result.timings)
+        log.info(
+            "Processed file saved",
+            extra={"path": processed_file_path, "duplicates": result.duplicates, "rows_written": result.rows_written},
+        )
 
         return processed_file_path
-    except Exception as e:
-        print(f"Error processing file {file_path}: {e}")
+    except Exception:
+        log.exception("Error processing file", extra={"path": file_path})
         return None
 
 
-def process_csv_files_in_zip(input_zip_path: str, output_zip_path: str) -> dict:
+def process_csv_files_in_zip(
+    input_zip_path: str,
+    output_zip_path: str,
+    mode: str = ZIP_PROCESSING_MODE,
+    subset: list[str] | None = None,
+    timings: StageTimings | None = None,
+    progress: "Progress | None" = None,
+    output: OutputFormat = OutputFormat(),
+) -> dict:
+    import pandas as pd
+
+    from app.zip_pipeline import process_zip_streaming, with_progress
+
+    if timings is None:
+        timings = StageTimings()
+    if mode == "stream":
+        try:
+            return process_zip_streaming(
+                input_zip_path, output_zip_path, subset=subset, timings=timings, progress=progress, output=output
+            )
+        except zipfile.BadZipFile:
+            raise RuntimeError("The uploaded file is not a valid ZIP archive.")
+        except Exception as e:
+            log.exception("Unexpected error during ZIP processing")
+            raise RuntimeError(f"Unexpected error during ZIP processing: {e}")
+
     temp_dir = os.path.join(DATA_DIR, f"temp_{uuid.uuid4().hex}")
     duplicate_counts = {}
     try:
         os.makedirs(temp_dir, exist_ok=True)
-        print(f"Temporary directory created: {temp_dir}")
 
         # распаковка
-        with zipfile.ZipFile(input_zip_path, "r") as zip_ref:
+        with timings.measure("unzip") as unzip, zipfile.ZipFile(input_zip_path, "r") as zip_ref:
             zip_ref.extractall(temp_dir)
-            print(f"Files in ZIP archive: {zip_ref.namelist()}")
-            print(f"Unzipped to: {temp_dir}")
-
+            unzip.bytes_in += sum(info.compress_size for info in zip_ref.infolist())
+            unzip.bytes_out += sum(info.file_size for info in zip_ref.infolist())
+            log.debug("Unzipped", extra={"members": zip_ref.namelist(), "temp_dir": temp_dir})
+
+        csv_files = [
+            (root, file_name)
+            for root, _, files in os.walk(temp_dir)
+            for file_name in files
+            if file_name.endswith(".csv")
+        ]
         output_files = []
-        for root, _, files in os.walk(temp_dir):
-            for file_name in files:
-                print(f"Found file: {file_name}")
-                if file_name.endswith(".csv"):
-                    file_path = os.path.join(root, file_name)
-                    try:
-                        df = pd.read_csv(file_path, sep=";", skiprows=1)
-                        print(f"Loaded DataFrame for {file_name}, shape: {df.shape}")
-
-                        if df.empty:
-                            print(
-                                f"File {file_name} is empty after processing. Skipping."
-                            )
-                            continue
-
-                        # считаем дубликаты
-                        duplicate_count = int(df.duplicated().sum())
-                        duplicate_counts[file_name] = duplicate_count
-
-                        # удаляем полные дубликаты
-                        df = df.drop_duplicates()
-
-                        # сохраняем обработанный .csv с разделителем ";"
-                        processed_file_name = f"processed_{file_name}"
-                        output_file_path = os.path.join(root, processed_file_name)
+        for root, file_name in with_progress(csv_files, progress):
+            file_path = os.path.join(root, file_name)
+            try:
+                with timings.measure("parse") as parse:
+                    df = pd.read_csv(file_path, sep=";", skiprows=1)
+                    parse.rows += len(df)
+                    parse.bytes_in += os.path.getsize(file_path)
+
+                if df.empty:
+                    log.warning("File is empty after processing, skipping", extra={"file_name": file_name})
+                    continue
+
+                with timings.measure("dedup") as dedup:
+                    # дубликаты по ключевым колонкам, если они есть в файле
+                    keys = subset if subset and set(subset) <= set(df.columns) else None
+
+                    # считаем дубликаты
+                    duplicate_count = int(df.duplicated(subset=keys).sum())
+                    duplicate_counts[file_name] = duplicate_count
+
+                    # удаляем дубликаты
+                    df = df.drop_duplicates(subset=keys)
+                    dedup.rows += len(df) + duplicate_count
+                    dedup.duplicates += duplicate_count
+
+                # сохраняем обработанный .csv с разделителем "," или .parquet со сжатием zstd
+                processed_file_name = f"processed_{output.member_name(file_name)}"
+                output_file_path = os.path.join(root, processed_file_name)
+                with timings.measure("write") as write:
+                    if output.name == "parquet":
+                        df.to_parquet(
+                            output_file_path, index=False, compression="zstd",
+                            compression_level=output.compression_level,
+                        )
+                    else:
                         df.to_csv(output_file_path, index=False, sep=",")
-                        output_files.append(output_file_path)
-                        print(f"Processed file saved: {output_file_path}")
-                    
-                    except Exception as e:
-                        print(f"Error processing file {file_name}: {e}")
-                        continue
+                    write.rows += len(df)
+                    write.bytes_out += os.path.getsize(output_file_path)
+                output_files.append(output_file_path)
+                log.info(
+                    "Processed file saved",
+                    extra={"file_name": file_name, "rows_written": len(df), "duplicates": duplicate_count},
+                )
+
+            except Exception:
+                log.exception("Error processing file", extra={"file_name": file_name})
+                continue
 
         # проверяем что обработанные файлы .csv существуют
         if not output_files:
-            print("No valid CSV files found for processing.")
+            log.error("No valid CSV files found for processing")
             raise RuntimeError(
                 "No valid CSV files found for processing in the ZIP archive."
             )
 
         # запаковываем для отправки
-        with zipfile.ZipFile(output_zip_path, "w") as zipf:
+        with timings.measure("zip") as packed, zipfile.ZipFile(
+            output_zip_path, "w", compression=output.zip_compression, compresslevel=output.compression_level
+        ) as zipf:
             for file in output_files:
                 arch_name = os.path.relpath(file, temp_dir)
                 zipf.write(file, arch_name)
-                print(f"Added '{file}' to ZIP as '{arch_name}'")
+                packed.bytes_in += os.path.getsize(file)
+        timings["zip"].bytes_out += os.path.getsize(output_zip_path)
 
         return duplicate_counts
 
     except zipfile.BadZipFile:
         raise RuntimeError("The uploaded file is not a valid ZIP archive.")
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        log.exception("Unexpected error during ZIP processing")
         raise RuntimeError(f"Unexpected error during ZIP processing: {e}")
     finally:
         # удаляем временные файлы
         if os.path.exists(temp_dir):
             shutil.rmtree(temp_dir, ignore_errors=True)
-            print(f"Cleaned up temporary directory: {temp_dir}")
 
 
-def download_from_supabase(
-    remote_file_path: str,
-    local_path: str,
-    bucket_name: str
-):
-    response = supabase_client.storage.from_(
-        bucket_name
-    ).download(remote_file_path)
-    
-    with open(local_path, "wb") as f:
-        f.write(response)
-
-    print("Supabase file saved at:", local_path)
-    print(f"Downloaded ZIP saved to: {local_path}")
-
-
-def upload_to_supabase(local_path: str, remote_file_name: str, bucket_name: str):
-    with open(local_path, "rb") as f:
-        upload_response = supabase_client.storage.from_(bucket_name).upload(
-            remote_file_name, f
-        )
-    
-    if upload_response.get("error") is not None:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to upload processed file to Supabase Storage: {upload_response['error']}",
-        )
-    
-    supabase_file_url = (
-        f"{SUPABASE_URL}/storage/v1/object/public/{bucket_name}/{remote_file_name}"
-    )
-    print(f"Processed file uploaded to Supabase Storage: {supabase_file_url}")
-    return supabase_file_url
-
-
-def download_and_process_folder_from_supabase(
-    bucket_name: str,
-    folder_path: str
-) -> list:
-    temp_dir = os.path.join(DATA_DIR, f"temp_{uuid.uuid4().hex}")
-    os.makedirs(temp_dir, exist_ok=True)
-    print(f"Temporary directory created for download: {temp_dir}")
-
-    files = supabase_client.storage.from_(bucket_name).list(folder_path)
-    uploaded_files_urls = []
-
-    for item in files:
-        if not item["name"].endswith("/") and item["name"].endswith(".csv"):
-            file_path = os.path.join(folder_path, item["name"])
-            local_file_path = os.path.join(temp_dir, item["name"])
-            local_file_dir = os.path.dirname(local_file_path)
-            os.makedirs(local_file_dir, exist_ok=True)
-            download_from_supabase(file_path, local_file_path, bucket_name)
-
-            # Process the downloaded CSV file
-            processed_file_path = process_csv_file(local_file_path)
-            if processed_file_path:
-                remote_file_name = f"processed/{uuid.uuid4().hex}/{os.path.basename(processed_file_path)}"
-                uploaded_files_urls.append(upload_to_supabase(processed_file_path, remote_file_name, bucket_name))
-
-    # cleaning up
-    shutil.rmtree(temp_dir, ignore_errors=True)
-    print(f"Cleaned up temporary directory for download: {temp_dir}")
-
-    return uploaded_files_urls
-
-@app.post("/process-zip-file/")
-async def process_zip_file(file: UploadFile):
+def validate_upload(file: UploadFile, mode: str) -> None:
     if file.filename is None:
         raise HTTPException(
             status_code=400,
@@ -216,21 +307,58 @@ async def process_zip_file(file: UploadFile):
             detail="Uploaded file must be a ZIP file"
         )
 
+    if mode not in ZIP_PROCESSING_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown processing mode: {mode}"
+        )
+
+
+@app.post("/process-zip-file/")
+async def process_zip_file(
+    file: UploadFile,
+    mode: str = Query(ZIP_PROCESSING_MODE),
+    keys: list[str] | None = Query(None),
+    output_format: str = Query(OUTPUT_FORMAT),
+    compression_level: int | None = Query(OUTPUT_COMPRESSION_LEVEL),
+):
+    validate_upload(file, mode)
+    output = resolve_output(output_format, compression_level)
+
     unique_prefix = generate_unique_prefix()
     input_zip_path = os.path.join(DATA_DIR, f"{unique_prefix}_input.zip")
     output_zip_path = os.path.join(DATA_DIR, f"{unique_prefix}_output.zip")
+    keep_output = False
+    timings = StageTimings()
 
     try:
-        # сохраняем
-        with open(input_zip_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        print(f"Uploaded ZIP saved to: {input_zip_path}")
+        # сохраняем, попутно считая sha256 содержимого
+        with timings.measure("save") as save, open(input_zip_path, "wb") as buffer:
+            content_sha256 = await run_in_threadpool(copy_and_hash, file.file, buffer)
+            save.bytes_out += buffer.tell()
+        log.info("Uploaded ZIP saved", extra={"path": input_zip_path, "sha256": content_sha256})
+
+        # повторная загрузка того же архива отдаётся из кэша;
+        # mode в ключ не входит: extract и stream дают одинаковый архив
+        cache_key = ResultCache.key(
+            content_sha256, keys=keys, output_format=output.name, compression_level=output.compression_level
+        )
+        cached = result_cache.get(cache_key) if result_cache.enabled else None
+        if cached is not None:
+            publish(timings, "ZIP served from cache", route="/process-zip-file/", mode=mode, cache_hit=True)
+            sizes = await run_in_threadpool(archive_sizes, input_zip_path, cached.path)
+            return zip_file_response(
+                cached.path, file.filename, cached.duplicates, cache_hit=True, sizes=sizes
+            )
 
         # обрабатываем zip
         try:
-            duplicated = process_csv_files_in_zip(input_zip_path, output_zip_path)
+            # тяжёлая обработка не должна блокировать event loop
+            duplicated = await run_in_threadpool(
+                process_csv_files_in_zip, input_zip_path, output_zip_path, mode, keys, timings, output=output
+            )
         except Exception as e:
-            print(f"Error during processing: {e}")
+            log.error("Error during processing", extra={"error": str(e)})
             raise HTTPException(
                 status_code=500,
                 detail=f"Error processing file: {str(e)}"
@@ -238,71 +366,252 @@ async def process_zip_file(file: UploadFile):
 
         # проверяем что был создан обработанный файл
         if not os.path.exists(output_zip_path):
-            print(f"Output ZIP file was not created: {output_zip_path}")
+            log.error("Output ZIP file was not created", extra={"path": output_zip_path})
             raise HTTPException(
                 status_code=500,
                 detail=f"Output ZIP file was not created: {output_zip_path}",
             )
 
-        print(f"Duplicates removed: {duplicated}")
-        print(f"Returning output ZIP file: {output_zip_path}")
-        return FileResponse(
+        sizes = await run_in_threadpool(archive_sizes, input_zip_path, output_zip_path)
+        publish(
+            timings, "ZIP processed", route="/process-zip-file/", mode=mode, cache_hit=False, duplicates=duplicated,
+            output_format=output.name, raw_bytes=sizes["raw_bytes"], compressed_bytes=sizes["compressed_bytes"],
+        )
+        if result_cache.enabled:
+            # если put упадёт, output_zip_path удаляется в finally
+            entry = await run_in_threadpool(
+                result_cache.put, cache_key, output_zip_path, duplicated
+            )
+            # результат больше всего кэша остаётся на месте и удаляется после отправки
+            if entry is not None:
+                return zip_file_response(entry.path, file.filename, duplicated, cache_hit=False, sizes=sizes)
+
+        keep_output = True
+        return zip_file_response(
             output_zip_path,
-            filename=f"processed_{file.filename}",
-            background=BackgroundTask(
-                lambda: cleanup_files(input_zip_path, output_zip_path)
-            ),
+            file.filename,
+            duplicated,
+            cache_hit=False,
+            background=BackgroundTask(cleanup_files, output_zip_path),
+            sizes=sizes,
         )
     finally:
-        # Clean up input and output files after response is sent
-        def cleanup_files(input_zip, output_zip):
-            if os.path.exists(input_zip):
-                os.remove(input_zip)
-                print(f"Removed input file: {input_zip}")
-            if os.path.exists(output_zip):
-                os.remove(output_zip)
-                print(f"Removed output file: {output_zip}")
+        if keep_output:
+            cleanup_files(input_zip_path)
+        else:
+            cleanup_files(input_zip_path, output_zip_path)
+
+
+def run_zip_job(job: Job, output_path: str, report: Callable[[float], None]) -> dict:
+    queue = get_job_queue()
+    timings = StageTimings()
+    # задачи из очереди прошлых версий - без параметров формата
+    output = OutputFormat(job.params.get("output_format", "csv"), job.params.get("compression_level"))
+    duplicated = process_csv_files_in_zip(
+        queue.input_path(job.job_id),
+        output_path,
+        job.params["mode"],
+        job.params["keys"],
+        timings,
+        lambda done, total: report(done / total),
+        output,
+    )
+    sizes = archive_sizes(queue.input_path(job.job_id), output_path)
+    publish(
+        timings, "ZIP processed", route="/jobs/process-zip-file/", mode=job.params["mode"], job_id=job.job_id,
+        output_format=output.name, raw_bytes=sizes["raw_bytes"], compressed_bytes=sizes["compressed_bytes"],
+    )
+    return {"duplicates": duplicated, "sizes": sizes}
+
+
+# фоновая обработка больших архивов: таблица задач в data/jobs.db;
+# очередь (и её поток продления аренды) создаётся при запуске приложения, а не при импорте
+job_queue: JobQueue | None = None
+
+
+def get_job_queue() -> JobQueue:
+    if job_queue is None:
+        raise RuntimeError("Job queue is not started")
+    return job_queue
+
+
+async def start_jobs():
+    global job_queue
+    job_queue = await run_in_threadpool(
+        JobQueue,
+        os.getenv("JOB_DB_PATH", os.path.join(DATA_DIR, "jobs.db")),
+        os.path.join(DATA_DIR, "jobs"),
+        run_zip_job,
+    )
+    await run_in_threadpool(job_queue.recover)
+
+
+async def read_dataset_version():
+    # отпечатки файлов берутся из .digests.json, первый запрос не хэширует набор
+    await run_in_threadpool(dataset_version, [os.path.join(SPRINT_DATASET_DIR, name) for name in DATASET_FILES])
+
+
+async def stop_jobs():
+    global job_queue
+    if job_queue is not None:
+        job_queue.shutdown()
+        job_queue = None
+
+
+def job_status(job: Job) -> dict:
+    status = job.to_dict()
+    # владелец и аренда - внутреннее дело очереди
+    del status["owner"], status["heartbeat_at"]
+    status["status_url"] = f"/jobs/{job.job_id}"
+    if job.status == "done":
+        status["result_url"] = f"/jobs/{job.job_id}/result"
+    return status
+
+
+@app.post("/jobs/process-zip-file/", status_code=202)
+async def submit_zip_job(
+    file: UploadFile,
+    mode: str = Query(ZIP_PROCESSING_MODE),
+    keys: list[str] | None = Query(None),
+    output_format: str = Query(OUTPUT_FORMAT),
+    compression_level: int | None = Query(OUTPUT_COMPRESSION_LEVEL),
+):
+    """Same processing as /process-zip-file/, answered with a job id right after the upload."""
+    validate_upload(file, mode)
+    output = resolve_output(output_format, compression_level)
+    params = {"mode": mode, "keys": keys, "output_format": output.name, "compression_level": output.compression_level}
+    job_queue = get_job_queue()
+    try:
+        job = await run_in_threadpool(job_queue.create, file.filename, params)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": JOB_RETRY_AFTER})
+
+    try:
+        with open(job_queue.input_path(job.job_id), "wb") as buffer:
+            await run_in_threadpool(copy_and_hash, file.file, buffer)
+    except Exception as e:
+        await run_in_threadpool(job_queue.fail, job.job_id, f"Upload failed: {e}")
+        raise
+    await run_in_threadpool(job_queue.enqueue, job.job_id)
+    return job_status(await run_in_threadpool(job_queue.get, job.job_id))
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job_queue = get_job_queue()
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job_status(job)
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job_queue = get_job_queue()
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    if job.status == "failed":
+        raise HTTPException(status_code=409, detail=f"Job failed: {job.error}")
+    if job.status != "done":
+        raise HTTPException(
+            status_code=409, detail=f"Job is {job.status}", headers={"Retry-After": JOB_RETRY_AFTER}
+        )
+    return zip_file_response(
+        job_queue.output_path(job_id), job.filename, job.result["duplicates"], cache_hit=False,
+        sizes=job.result.get("sizes"),
+    )
 
 
 @app.post("/process-zip-supabase/")
 async def process_zip_supabase(
     folder_path: str = Query(...),
-    bucket_name: str = Query(...)
+    bucket_name: str = Query(...),
+    keys: list[str] | None = Query(None),
+    output_format: str = Query(OUTPUT_FORMAT),
+    compression_level: int | None = Query(OUTPUT_COMPRESSION_LEVEL),
 ):
+    output = resolve_output(output_format, compression_level)
+    try:
+        storage = get_storage()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    timings = StageTimings()
     try:
         # Download and process folder from Supabase Storage
-        uploaded_files_urls = download_and_process_folder_from_supabase(
+        uploaded_files_urls = await process_storage_folder(
+            storage,
             bucket_name,
-            folder_path
+            folder_path,
+            partial(process_csv_file, subset=keys, output=output),
+            DATA_DIR,
+            timings=timings,
+        )
+    except Exception as e:
+        log.exception("Error during folder sync", extra={"bucket": bucket_name, "folder": folder_path})
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to process folder from storage: {str(e)}"
         )
 
-        return {"file_urls": uploaded_files_urls}
-    finally:
-        pass
+    publish(timings, "Folder processed", route="/process-zip-supabase/", files=len(uploaded_files_urls))
+    return {"file_urls": uploaded_files_urls}
+
+
+def load_sprint_dataset():
+    # только при расчёте метрик: готовые читаются с диска без pandas
+    from app.sprint_metrics import load_dataset
+
+    return load_dataset(SPRINT_DATASET_DIR)
 
 
 @app.get("/sprint-data")
-async def get_sprint_data():
-    return {
-        "sprint": "Спринт 2024.3.6.NPP Shared Sprint",
-        "total_estimate": 146,
-        "real_estimate": 100,
-        "tasks_count": 58,
-        "done_tasks_count": 39,
-        "removed_tasks_count": 5,
-        "backlogged_tasks_count": 4,
-        "total_backlog": 39,
-        "total_removed": 26,
-        "change_by_days": {
-            "day1": [47, 0],
-            "day2": [8, 3],
-            "day3": [12, 1],
-            "day4": [3, 5],
-            "day5": [2, 4],
-            "day6": [0, 0],
-            "day7": [0, 0]
-        }
-    }
+async def get_sprint_data(request: Request, sprint: str | None = Query(None)):
+    # содержимое файлов хешируется только после их изменения, но и это не в event loop
+    version = await run_in_threadpool(
+        dataset_version, [os.path.join(SPRINT_DATASET_DIR, name) for name in DATASET_FILES]
+    )
+
+    async def compute():
+        metrics = sprint_metrics.cached(version)
+        if metrics is None:
+            try:
+                metrics = await run_in_threadpool(sprint_metrics.get, version, load_sprint_dataset)
+            except FileNotFoundError as e:
+                raise HTTPException(status_code=404, detail=f"Dataset not found: {e.filename}")
+
+        # без параметра - последний спринт выгрузки
+        sprint_name = sprint if sprint is not None else next(reversed(metrics), None)
+        if sprint_name not in metrics:
+            raise HTTPException(status_code=404, detail=f"Sprint not found: {sprint}")
+        return metrics[sprint_name]
+
+    return await response_cache.respond(request, "/sprint-data", version, {"sprint": sprint}, compute)
+
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # шаблон пути, а не сам путь: число рядов гистограммы не растёт от параметров
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 
 # curl -X POST "http://127.0.0.1:8000/process-zip-supabase/" -H "Content-Type: application/json" -d '{"folder_path": "f124eb6b-b478-43ae-b084-00e73af53c7c/upload_01/", "bucket_name": "sprint-data"}'
@@ -0,0 +1,77 @@
+"""Sprint -> task membership parsed from the Sprints.entity_ids column.
+
+The column holds one "{id,id,...}" set literal per sprint. It is parsed
+in one pass into CSR form: ``task_ids[offsets[i]:offsets[i + 1]]`` are the
+tasks of sprint ``i`` in their original order.
+"""
+
+import re
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Iterable
+
+import numpy as np
+
+_ENTITY_IDS = re.compile(r"\{\s*(?:(\d+(?:\s*,\s*\d+)*)\s*,?)?\s*\}")
+
+
+@dataclass(frozen=True)
+class SprintMembership:
+    offsets: np.ndarray
+    task_ids: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def tasks(self, sprint: int) -> np.ndarray:
+        return self.task_ids[self.offsets[sprint]:self.offsets[sprint + 1]]
+
+    @cached_property
+    def sprint_of_entry(self) -> np.ndarray:
+        """Sprint index of every element of task_ids."""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+
+    @cached_property
+    def _pair_keys(self) -> np.ndarray:
+        """Sorted (sprint, task) pairs packed into one sortable key per entry."""
+        keys = np.empty(len(self.task_ids), dtype=[("sprint", np.int64), ("task", np.int64)])
+        keys["sprint"], keys["task"] = self.sprint_of_entry, self.task_ids
+        return np.sort(keys)
+
+    def contains(self, sprint: int, task_ids) -> np.ndarray | bool:
+        """Whether the task(s) belong to the sprint; vectorized over task_ids."""
+        probe = np.empty(np.size(task_ids), dtype=self._pair_keys.dtype)
+        probe["sprint"], probe["task"] = sprint, np.ravel(task_ids)
+        positions = np.searchsorted(self._pair_keys, probe)
+        found = np.zeros(len(probe), dtype=bool)
+        inside = positions < len(self._pair_keys)
+        found[inside] = self._pair_keys[positions[inside]] == probe[inside]
+        return found if np.ndim(task_ids) else bool(found[0])
+
+
+def parse_entity_ids(cells: Iterable[str | None]) -> SprintMembership:
+    """CSR membership of the "{id,id,...}" cells; empty or missing cells are empty sprints.
+
+    Only digits, commas and whitespace are accepted inside the braces, so an
+    uploaded file can never execute anything (unlike ``eval``).
+    """
+    inner = []
+    counts = []
+    for row, cell in enumerate(cells):
+        if cell is None or (isinstance(cell, float) and cell != cell) or not str(cell).strip():
+            counts.append(0)
+            continue
+        match = _ENTITY_IDS.fullmatch(str(cell).strip())
+        if match is None:
+            raise ValueError(f"Malformed entity_ids in sprint row {row}: {str(cell)[:40]!r}")
+        ids = match.group(1)
+        counts.append(ids.count(",") + 1 if ids else 0)
+        if ids:
+            inner.append(ids)
+
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    task_ids = np.fromstring(",".join(inner), dtype=np.int64, sep=",") if inner else np.empty(0, np.int64)
+    if len(task_ids) != offsets[-1]:
+        raise ValueError("entity_ids could not be parsed")
+    return SprintMembership(offsets, task_ids)
@@ -0,0 +1,177 @@
+"""Materialized sprint metrics keyed by dataset version.
+
+Kept apart from ``app.sprint_metrics`` so that serving already computed
+metrics does not import pandas; the computation is imported on a miss.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from typing import Callable
+
+DATASET_FILES = ("Tasks.csv", "History.csv", "Sprints.csv")
+# меняется вместе с составом метрик, чтобы не отдавать старые файлы
+METRICS_FORMAT = 3
+
+log = logging.getLogger(__name__)
+
+
+# (путь, размер, mtime, inode) -> sha256 содержимого
+_file_digests: dict[tuple, str] = {}
+_digests_lock = threading.Lock()
+_HASH_CHUNK = 1 << 20
+# те же отпечатки на диске рядом с данными: имя файла -> [размер, mtime, inode, sha256]
+DIGESTS_FILE = ".digests.json"
+
+
+def _stored_digests(folder: str) -> dict[str, list]:
+    try:
+        with open(os.path.join(folder, DIGESTS_FILE), encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return stored if isinstance(stored, dict) else {}
+
+
+def _store_digest(path: str, key: tuple, digest: str) -> None:
+    folder, name = os.path.split(path)
+    stored = _stored_digests(folder)
+    stored[name] = [*key[1:], digest]
+    staging_path = os.path.join(folder, f"tmp_{uuid.uuid4().hex}{DIGESTS_FILE}")
+    try:
+        with open(staging_path, "w", encoding="utf-8") as f:
+            json.dump(stored, f)
+        os.replace(staging_path, os.path.join(folder, DIGESTS_FILE))
+    except OSError:
+        # каталог только на чтение: отпечаток остаётся в памяти процесса
+        log.warning("Could not persist file digest", extra={"path": path})
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+
+
+def _file_digest(path: str, stat: os.stat_result) -> str:
+    key = (path, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    digest = _file_digests.get(key)
+    if digest is not None:
+        return digest
+    with _digests_lock:
+        stored = _stored_digests(os.path.dirname(path)).get(os.path.basename(path))
+        if isinstance(stored, list) and tuple(stored[:3]) == key[1:]:
+            digest = stored[3]
+        else:
+            hasher = hashlib.sha256()
+            with open(path, "rb") as f:
+                while chunk := f.read(_HASH_CHUNK):
+                    hasher.update(chunk)
+            digest = hasher.hexdigest()
+            _store_digest(path, key, digest)
+        # прежние версии того же файла больше не нужны
+        for stale in [entry for entry in _file_digests if entry[0] == path]:
+            _file_digests.pop(stale, None)
+        _file_digests[key] = digest
+    return digest
+
+
+def dataset_version(paths: list[str]) -> str:
+    """Fingerprint of the contents of the source files.
+
+    A file is hashed again only when its size, mtime or inode changes, so
+    usually a call costs one stat per file; touching or re-copying a file
+    with the same content keeps the version. The digests are also kept in
+    ``.digests.json`` next to the files, so a restarted process does not
+    hash an unchanged dataset again.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            digest.update(f"{os.path.basename(path)}:missing;".encode())
+            continue
+        digest.update(f"{os.path.basename(path)}:{_file_digest(os.path.abspath(path), stat)};".encode())
+    return digest.hexdigest()
+
+
+class SprintMetricsStore:
+    """Metrics materialized as <root>/<version>.json and kept in memory.
+
+    Only the most recent version is held in memory; files of older
+    versions are removed once a new version is materialized.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self._version: str | None = None
+        self._metrics: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, version: str) -> str:
+        return os.path.join(self.root, f"{version}.v{METRICS_FORMAT}.json")
+
+    def cached(self, version: str) -> dict[str, dict] | None:
+        """Metrics of the version if they are already in memory."""
+        return self._metrics if self._version == version else None
+
+    def get(self, version: str, load: Callable[[], tuple]) -> dict[str, dict]:
+        """Metrics of the dataset version, computed from ``load()`` on a miss."""
+        if (metrics := self.cached(version)) is not None:
+            return metrics
+        with self._lock:
+            if (metrics := self.cached(version)) is not None:
+                return metrics
+            try:
+                with open(self._path(version), encoding="utf-8") as f:
+                    metrics = json.load(f)
+            except (OSError, ValueError):
+                # pandas нужен только для расчёта
+                from app.sprint_metrics import compute_sprint_metrics
+
+                metrics = self._materialize(version, compute_sprint_metrics(*load()))
+            self._version, self._metrics = version, metrics
+            return metrics
+
+    def _latest(self) -> dict[str, dict] | None:
+        """Metrics of the last materialized version, whatever it is."""
+        if self._version is not None:
+            return self._metrics
+        files = [
+            entry.path for entry in os.scandir(self.root)
+            if entry.name.endswith(f".v{METRICS_FORMAT}.json") and not entry.name.startswith("tmp_")
+        ]
+        if not files:
+            return None
+        try:
+            with open(max(files, key=os.path.getmtime), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def update(self, version: str, changed: dict[str, dict], sprint_names: list[str]) -> dict[str, dict] | None:
+        """Materializes ``version`` from the latest metrics with the ``changed`` sprints replaced.
+
+        ``sprint_names`` is the full sprint list of the new version. Returns
+        None when some unchanged sprint has no previous metrics to reuse.
+        """
+        with self._lock:
+            base = self._latest() or {}
+            metrics = {name: changed.get(name, base.get(name)) for name in sprint_names}
+            if any(entry is None for entry in metrics.values()):
+                return None
+            self._version, self._metrics = version, self._materialize(version, metrics)
+            return metrics
+
+    def _materialize(self, version: str, metrics: dict[str, dict]) -> dict[str, dict]:
+        staging_path = os.path.join(self.root, f"tmp_{uuid.uuid4().hex}.json")
+        with open(staging_path, "w", encoding="utf-8") as f:
+            json.dump(metrics, f, ensure_ascii=False)
+        os.replace(staging_path, self._path(version))
+        for entry in os.scandir(self.root):
+            stale = entry.name.endswith(".json") and not entry.name.startswith("tmp_")
+            if stale and entry.path != self._path(version):
+                os.remove(entry.path)
+        log.info("Materialized sprint metrics", extra={"sprints": len(metrics), "dataset_version": version[:12]})
+        return metrics
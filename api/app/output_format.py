@@ -0,0 +1,184 @@
+"""Format and compression of the processed files in the output archive.
+
+``csv`` members are deflated at the chosen level: by the archive on the
+serial path, in the workers of the parallel pipeline (``RawDeflateSink``).
+``parquet`` members keep the parsed dtypes and are compressed with zstd
+inside the file, so they are stored in the archive as is. pyarrow is only
+needed (and imported) for parquet.
+"""
+
+import io
+import os
+import posixpath
+import zipfile
+import zlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+OUTPUT_FORMATS = ("csv", "parquet")
+# уровень по умолчанию: deflate 0-9, zstd 1-22
+DEFAULT_LEVELS = {"csv": 6, "parquet": 3}
+LEVEL_RANGES = {"csv": range(0, 10), "parquet": range(1, 23)}
+
+CSV_WRITE_OPTIONS = {"sep": ",", "index": False}
+
+
+@dataclass(frozen=True)
+class OutputFormat:
+    name: str = "csv"
+    level: int | None = None
+
+    @property
+    def compression_level(self) -> int:
+        return DEFAULT_LEVELS[self.name] if self.level is None else self.level
+
+    @property
+    def extension(self) -> str:
+        return f".{self.name}"
+
+    @property
+    def zip_compression(self) -> int:
+        """Compression of the member in the archive; parquet is compressed already."""
+        return zipfile.ZIP_DEFLATED if self.name == "csv" else zipfile.ZIP_STORED
+
+    def member_name(self, name: str) -> str:
+        return os.path.splitext(name)[0] + self.extension
+
+    def writer(self, sink: io.RawIOBase) -> "ChunkWriter":
+        return ParquetChunkWriter(sink, self.compression_level) if self.name == "parquet" else CsvChunkWriter(sink)
+
+
+def parse_output_format(name: str, level: int | None = None) -> OutputFormat:
+    """Validated output format; raises ValueError for an unknown format, a bad level or missing pyarrow."""
+    if name not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {name}")
+    if level is not None and level not in LEVEL_RANGES[name]:
+        bounds = LEVEL_RANGES[name]
+        raise ValueError(f"Compression level of {name} must be in {bounds.start}..{bounds.stop - 1}")
+    if name == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet output requires pyarrow")
+    return OutputFormat(name, level)
+
+
+class ChunkWriter(ABC):
+    """Writes the chunks of one processed file; used as a context manager."""
+
+    @abstractmethod
+    def write(self, chunk: "pd.DataFrame") -> None:
+        ...
+
+    @abstractmethod
+    def close(self) -> None:
+        ...
+
+    def __enter__(self) -> "ChunkWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class RawDeflateSink(io.RawIOBase):
+    """File holding the raw deflate stream of everything written to it.
+
+    The data is exactly what a ZIP_DEFLATED entry stores, so a member
+    compressed in a worker is copied into the archive without recompressing;
+    ``crc`` and ``size`` are the CRC-32 and length of the uncompressed data.
+    """
+
+    def __init__(self, path: str, level: int) -> None:
+        self._file = open(path, "wb")
+        # wbits -15: без заголовка zlib, как внутри ZIP
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        self.crc = 0
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        self._file.write(self._compressor.compress(data))
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._file.write(self._compressor.flush())
+            self._file.close()
+        super().close()
+
+
+class CsvChunkWriter(ChunkWriter):
+    def __init__(self, sink: io.RawIOBase) -> None:
+        self._text = io.TextIOWrapper(sink, encoding="utf-8", newline="")
+        self._header = True
+
+    def write(self, chunk: "pd.DataFrame") -> None:
+        chunk.to_csv(self._text, header=self._header, **CSV_WRITE_OPTIONS)
+        self._header = False
+
+    def close(self) -> None:
+        self._text.close()
+
+
+class ParquetChunkWriter(ChunkWriter):
+    """One row group per chunk; the schema is fixed by the first chunk."""
+
+    def __init__(self, sink: io.RawIOBase, level: int) -> None:
+        self._sink = sink
+        self._level = level
+        self._schema = None
+        self._writer = None
+
+    def write(self, chunk: "pd.DataFrame") -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+            # пустая в первом блоке текстовая колонка - всё равно текст
+            for index, column in enumerate(schema):
+                if pa.types.is_null(column.type):
+                    schema = schema.set(index, column.with_type(pa.string()))
+            self._schema = schema
+            self._writer = pq.ParquetWriter(
+                self._sink, schema, compression="zstd", compression_level=self._level
+            )
+        self._writer.write_table(pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False))
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._sink.close()
+
+
+def archive_sizes(input_zip_path: str, output_zip_path: str) -> dict:
+    """Raw (source CSV) versus compressed (in the output archive) size of every processed member.
+
+    dir/processed_<name>.<ext> is matched to dir/<name>.csv of the input
+    archive, so equal file names in different folders do not collide.
+    """
+    with zipfile.ZipFile(input_zip_path) as source, zipfile.ZipFile(output_zip_path) as output:
+        raw = {info.filename: info.file_size for info in source.infolist()}
+        members = {}
+        for info in output.infolist():
+            directory, file_name = posixpath.split(info.filename)
+            stem = os.path.splitext(file_name)[0].removeprefix("processed_")
+            source_name = posixpath.join(directory, f"{stem}.csv")
+            members[info.filename] = {
+                "raw_bytes": raw.get(source_name, info.file_size),
+                "compressed_bytes": info.compress_size,
+            }
+    return {
+        "members": members,
+        "raw_bytes": sum(member["raw_bytes"] for member in members.values()),
+        "compressed_bytes": sum(member["compressed_bytes"] for member in members.values()),
+    }
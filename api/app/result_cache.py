@@ -0,0 +1,144 @@
+"""Content-addressed on-disk cache of processed archives.
+
+Entries are keyed by the SHA-256 of the uploaded bytes plus the parameters
+that change the output, and evicted least-recently-used first once the cache grows
+over its size limit or an entry outlives its TTL.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from dataclasses import dataclass
+from typing import IO
+
+log = logging.getLogger(__name__)
+
+_COPY_CHUNK = 1 << 20
+_RESULT_FILE = "result.zip"
+_META_FILE = "meta.json"
+
+
+def copy_and_hash(source: IO[bytes], target: IO[bytes]) -> str:
+    """Copies the stream in chunks and returns the SHA-256 of its content."""
+    digest = hashlib.sha256()
+    while chunk := source.read(_COPY_CHUNK):
+        digest.update(chunk)
+        target.write(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    path: str
+    duplicates: dict
+
+
+class ResultCache:
+    def __init__(self, root: str, max_bytes: int, ttl_seconds: float) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(content_sha256: str, **params) -> str:
+        """Cache key of an upload processed with the given parameters."""
+        payload = json.dumps(params, sort_keys=True)
+        return hashlib.sha256(f"{content_sha256}:{payload}".encode()).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key: str) -> CacheEntry | None:
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, _META_FILE)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - meta["created"] > self.ttl_seconds:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+        # mtime meta.json - время последнего обращения для LRU
+        os.utime(meta_path)
+        return CacheEntry(os.path.join(entry_dir, _RESULT_FILE), meta["duplicates"])
+
+    def put(self, key: str, result_path: str, duplicates: dict) -> CacheEntry | None:
+        """Moves the result file into the cache and evicts old entries.
+
+        A result larger than the whole cache is not cached: None is returned
+        and the file stays where it is.
+        """
+        size = os.path.getsize(result_path)
+        if size > self.max_bytes:
+            log.info("Result is larger than the cache, not cached", extra={"size": size, "max_bytes": self.max_bytes})
+            return None
+        staging_dir = os.path.join(self.root, f"tmp_{uuid.uuid4().hex}")
+        os.makedirs(staging_dir)
+        try:
+            shutil.move(result_path, os.path.join(staging_dir, _RESULT_FILE))
+            with open(os.path.join(staging_dir, _META_FILE), "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "created": time.time(),
+                        "size": size,
+                        "duplicates": duplicates,
+                    },
+                    f,
+                )
+        except BaseException:
+            # недописанная запись не должна остаться в кэше
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        entry_dir = self._entry_dir(key)
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        try:
+            os.rename(staging_dir, entry_dir)
+        except OSError:
+            # такую же загрузку уже обработал параллельный запрос
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+        # только что добавленную запись вытеснять нельзя: её путь сейчас отдаётся клиенту
+        self.evict(keep=entry_dir)
+        return CacheEntry(os.path.join(entry_dir, _RESULT_FILE), duplicates)
+
+    def _entries(self) -> list[tuple[float, float, int, str]]:
+        """(last access, created, size, dir) of every complete entry."""
+        entries = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or shard.name.startswith("tmp_"):
+                continue
+            for entry in os.scandir(shard.path):
+                meta_path = os.path.join(entry.path, _META_FILE)
+                try:
+                    with open(meta_path, encoding="utf-8") as f:
+                        meta = json.load(f)
+                    accessed = os.path.getmtime(meta_path)
+                except (OSError, ValueError):
+                    continue
+                entries.append((accessed, meta["created"], meta["size"], entry.path))
+        return entries
+
+    def evict(self, keep: str | None = None) -> None:
+        """Removes expired entries and the least recently used ones over the size limit, except ``keep``."""
+        now = time.time()
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size, _ in entries)
+        for accessed, created, size, path in entries:
+            if path == keep or (total <= self.max_bytes and now - created <= self.ttl_seconds):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            log.info("Evicted cached result", extra={"path": path})
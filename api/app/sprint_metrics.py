@@ -0,0 +1,209 @@
+"""Sprint metrics for every sprint of a dataset in one vectorized pass.
+
+The metrics depend only on the Tasks/History/Sprints tables, so they are
+materialized once per dataset version (a fingerprint of the source files)
+and every request afterwards is a dictionary lookup.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from app.flow_metrics import STATUS_CATEGORIES, distribution, lead_cycle_times, status_timeline, time_in_status
+from app.frames import compact, to_datetime
+from app.membership import parse_entity_ids
+# хранилище метрик не зависит от pandas и живёт отдельно; имена остаются доступны отсюда
+from app.metrics_store import DATASET_FILES, METRICS_FORMAT, SprintMetricsStore, dataset_version  # noqa: F401
+
+BACKLOG_STATUS = "Отложен"
+# задача закрыта, но не выполнена
+REMOVED_RESOLUTIONS = ["Отменен инициатором", "Отклонено", "Дубликат"]
+SPRINT_PROPERTY = "Спринт"
+
+_DAY = pd.Timedelta(days=1)
+_SECONDS_PER_HOUR = 3600
+
+Frames = tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]
+
+
+def read_table(path: str) -> pd.DataFrame:
+    """Reads a hackathon export or a processed CSV.
+
+    Raw exports are ';'-separated with a title line before the header,
+    processed files (see /process-zip-file/) are plain ','-separated CSVs.
+    """
+    with open(path, encoding="utf-8") as f:
+        first_line = f.readline()
+    skiprows = 0 if "entity_id" in first_line or "sprint_name" in first_line else 1
+    with open(path, encoding="utf-8") as f:
+        for _ in range(skiprows):
+            f.readline()
+        header = f.readline()
+    return pd.read_csv(path, sep=";" if ";" in header else ",", skiprows=skiprows, encoding="utf-8")
+
+
+def sprint_membership(sprints: pd.DataFrame) -> pd.DataFrame:
+    """(sprint_name, entity_id) pairs from the "{id,id,...}" column."""
+    membership = parse_entity_ids(sprints["entity_ids"])
+    return pd.DataFrame({
+        "sprint_name": sprints["sprint_name"].to_numpy()[membership.sprint_of_entry],
+        "entity_id": membership.task_ids,
+    }).drop_duplicates()
+
+
+def load_dataset(dataset_dir: str) -> Frames:
+    tasks, history, sprints = (compact(read_table(os.path.join(dataset_dir, name))) for name in DATASET_FILES)
+    return tasks, history, sprints, sprint_membership(sprints)
+
+
+def _hours(seconds: pd.Series) -> pd.Series:
+    return (seconds / _SECONDS_PER_HOUR).round().astype("int64")
+
+
+def scope_changes(history: pd.DataFrame) -> pd.DataFrame:
+    """(entity_id, history_date, sprint_name, added) for every sprint field change.
+
+    A change "A, B -> B, C" removes the task from A and adds it to C.
+    """
+    changes = history.loc[
+        history["history_property_name"] == SPRINT_PROPERTY,
+        ["entity_id", "history_date", "history_change"],
+    ].dropna(subset=["entity_id"])
+    changes = changes.reset_index(drop=True)
+    sides = (
+        changes["history_change"].astype("string").fillna("")
+        .str.split(" -> ", n=1, expand=True).reindex(columns=[0, 1])
+    )
+
+    def names(side: pd.Series) -> pd.DataFrame:
+        exploded = side.astype("string").fillna("").str.split(",").explode().str.strip()
+        return pd.DataFrame({"change": exploded.index, "sprint_name": exploded.values}).query("sprint_name != ''")
+
+    before, after = names(sides[0]), names(sides[1])
+    diff = before.merge(after, on=["change", "sprint_name"], how="outer", indicator=True)
+    diff = diff[diff["_merge"] != "both"]
+    return pd.DataFrame({
+        "entity_id": changes["entity_id"].to_numpy()[diff["change"].to_numpy()],
+        "history_date": changes["history_date"].to_numpy()[diff["change"].to_numpy()],
+        "sprint_name": diff["sprint_name"].to_numpy(),
+        "added": (diff["_merge"] == "right_only").to_numpy(),
+    })
+
+
+def compute_sprint_metrics(
+    tasks: pd.DataFrame,
+    history: pd.DataFrame,
+    sprints: pd.DataFrame,
+    membership: pd.DataFrame,
+) -> dict[str, dict]:
+    """Metrics of every sprint, keyed by sprint name.
+
+    Task counters are grouped over the (sprint, task) membership in one
+    groupby; change_by_days counts tasks added to / removed from the
+    sprint scope on each day of the sprint ("dayN": [added, removed]);
+    lead_time/cycle_time are distributions over the sprint's tasks and
+    time_in_status the hours its tasks spent in each status category, the
+    current status counted up to the last History record of the dataset.
+    """
+    tasks = tasks.dropna(subset=["entity_id"]).drop_duplicates(subset="entity_id")
+    tasks = tasks.astype({"entity_id": "int64"})
+    removed = tasks["resolution"].isin(REMOVED_RESOLUTIONS)
+    backlogged = tasks["status"] == BACKLOG_STATUS
+    estimation = tasks["estimation"].fillna(0)
+    flags = pd.DataFrame({
+        "entity_id": tasks["entity_id"],
+        "estimation": estimation,
+        "spent": tasks["spent"].fillna(0),
+        "done": tasks["status"].isin(STATUS_CATEGORIES["Сделано"]) & ~removed,
+        "removed": removed,
+        "backlogged": backlogged,
+        "removed_estimation": estimation.where(removed, 0),
+        "backlog_estimation": estimation.where(backlogged, 0),
+    })
+
+    totals = (
+        membership[["sprint_name", "entity_id"]]
+        .merge(flags, on="entity_id", how="inner")
+        .groupby("sprint_name")
+        .agg(
+            tasks_count=("entity_id", "size"),
+            total_estimate=("estimation", "sum"),
+            real_estimate=("spent", "sum"),
+            done_tasks_count=("done", "sum"),
+            removed_tasks_count=("removed", "sum"),
+            backlogged_tasks_count=("backlogged", "sum"),
+            total_backlog=("backlog_estimation", "sum"),
+            total_removed=("removed_estimation", "sum"),
+        )
+    )
+    for column in ["total_estimate", "real_estimate", "total_backlog", "total_removed"]:
+        totals[column] = _hours(totals[column])
+
+    windows = pd.DataFrame({
+        "sprint_name": sprints["sprint_name"],
+        "start": to_datetime(sprints["sprint_start_date"]),
+        "end": to_datetime(sprints["sprint_end_date"]),
+    }).dropna().drop_duplicates(subset="sprint_name")
+    windows["days"] = np.ceil((windows["end"] - windows["start"]) / _DAY).astype("int64")
+
+    changes = scope_changes(history)
+    changes["history_date"] = to_datetime(changes["history_date"])
+    changes = changes.merge(windows, on="sprint_name", how="inner")
+    changes["day"] = ((changes["history_date"] - changes["start"]) // _DAY).astype("Int64")
+    changes = changes[(changes["day"] >= 0) & (changes["day"] < changes["days"])]
+    per_day = (
+        changes.groupby(["sprint_name", "day", "added"])["entity_id"].nunique()
+        .unstack("added", fill_value=0)
+        .reindex(columns=[True, False], fill_value=0)
+    )
+
+    counters = totals.astype("int64").to_dict("index")
+    empty = dict.fromkeys(totals.columns, 0)
+    days_by_sprint = dict(zip(windows["sprint_name"], windows["days"]))
+    metrics = {}
+    for sprint_name in sprints["sprint_name"].drop_duplicates():
+        metrics[sprint_name] = {
+            "sprint": sprint_name,
+            **{column: int(value) for column, value in counters.get(sprint_name, empty).items()},
+            "change_by_days": {f"day{day + 1}": [0, 0] for day in range(days_by_sprint.get(sprint_name, 0))},
+        }
+    for (sprint_name, day), (added, dropped) in zip(per_day.index, per_day.to_numpy().tolist()):
+        metrics[sprint_name]["change_by_days"][f"day{day + 1}"] = [added, dropped]
+
+    # распределения времени выполнения задач спринта, часы
+    timeline = status_timeline(history)
+    flow = membership[["sprint_name", "entity_id"]].merge(
+        lead_cycle_times(timeline), on="entity_id", how="inner"
+    )
+    flow_by_sprint = dict(tuple(flow.groupby("sprint_name")))
+    no_flow = flow.iloc[:0]
+    for sprint_name, entry in metrics.items():
+        sprint_flow = flow_by_sprint.get(sprint_name, no_flow)
+        entry["lead_time"] = distribution(sprint_flow["lead_seconds"])
+        entry["cycle_time"] = distribution(sprint_flow["cycle_seconds"])
+
+    # часы задач спринта по категориям статусов
+    as_of = to_datetime(history["history_date"]).max()
+    in_status = membership[["sprint_name", "entity_id"]].merge(
+        time_in_status(timeline, None if pd.isna(as_of) else as_of), on="entity_id", how="inner"
+    )
+    category_hours = _hours(in_status.groupby(["sprint_name", "category"])["seconds"].sum()).to_dict()
+    for sprint_name, entry in metrics.items():
+        entry["time_in_status"] = {
+            category: category_hours.get((sprint_name, category), 0) for category in STATUS_CATEGORIES
+        }
+    return metrics
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompute sprint metrics of a dataset")
+    parser.add_argument("dataset_dir")
+    parser.add_argument("--out", default="./data/metrics")
+    args = parser.parse_args()
+    paths = [os.path.join(args.dataset_dir, name) for name in DATASET_FILES]
+    store = SprintMetricsStore(args.out)
+    print(json.dumps(store.get(dataset_version(paths), lambda: load_dataset(args.dataset_dir)), ensure_ascii=False, indent=2))
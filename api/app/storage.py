@@ -0,0 +1,131 @@
+"""Storage backends for the Supabase folder sync.
+
+Both backends share one async interface, so the sync pipeline can run
+against a live Supabase bucket or against a local directory (useful for
+offline runs and benchmarks).
+"""
+
+import asyncio
+import os
+import shutil
+from pathlib import Path
+from typing import Protocol
+
+
+class StorageBackend(Protocol):
+    async def list_files(self, bucket_name: str, folder_path: str) -> list[str]:
+        """Names of the files (not folders) directly inside the folder."""
+        ...
+
+    async def download(self, bucket_name: str, remote_path: str, local_path: str) -> None:
+        ...
+
+    async def upload(self, bucket_name: str, local_path: str, remote_path: str) -> str:
+        """Uploads the file and returns its public URL."""
+        ...
+
+
+class SupabaseStorage:
+    """Supabase Storage over a single async client.
+
+    The client (and its HTTP connection pool) is created on first use and
+    reused by every transfer.
+    """
+
+    def __init__(self, url: str, key: str) -> None:
+        self.url = url
+        self._key = key
+        self._client = None
+        self._lock = asyncio.Lock()
+
+    async def _bucket(self, bucket_name: str):
+        if self._client is None:
+            async with self._lock:
+                if self._client is None:
+                    from supabase import acreate_client
+
+                    self._client = await acreate_client(self.url, self._key)
+        return self._client.storage.from_(bucket_name)
+
+    async def list_files(self, bucket_name: str, folder_path: str) -> list[str]:
+        bucket = await self._bucket(bucket_name)
+        items = await bucket.list(folder_path)
+        # у папок в ответе Supabase нет id
+        return [
+            item["name"]
+            for item in items
+            if item.get("id") is not None and not item["name"].endswith("/")
+        ]
+
+    async def download(self, bucket_name: str, remote_path: str, local_path: str) -> None:
+        bucket = await self._bucket(bucket_name)
+        content = await bucket.download(remote_path)
+        await asyncio.to_thread(Path(local_path).write_bytes, content)
+
+    async def upload(self, bucket_name: str, local_path: str, remote_path: str) -> str:
+        bucket = await self._bucket(bucket_name)
+        with open(local_path, "rb") as f:
+            await bucket.upload(remote_path, f)
+        return f"{self.url}/storage/v1/object/public/{bucket_name}/{remote_path}"
+
+
+class LocalStorage:
+    """Buckets are subdirectories of ``root``.
+
+    ``latency`` adds an artificial delay to every transfer to imitate a
+    remote store when measuring pipeline throughput.
+    """
+
+    def __init__(self, root: str, latency: float = 0.0) -> None:
+        self.root = os.path.abspath(root)
+        self.latency = latency
+
+    def _path(self, bucket_name: str, remote_path: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, bucket_name, remote_path))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ValueError(f"Path escapes storage root: {remote_path}")
+        return path
+
+    async def _delay(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def list_files(self, bucket_name: str, folder_path: str) -> list[str]:
+        folder = self._path(bucket_name, folder_path)
+        await self._delay()
+        if not os.path.isdir(folder):
+            return []
+        return sorted(
+            entry.name for entry in os.scandir(folder) if entry.is_file()
+        )
+
+    async def download(self, bucket_name: str, remote_path: str, local_path: str) -> None:
+        await self._delay()
+        await asyncio.to_thread(
+            shutil.copyfile, self._path(bucket_name, remote_path), local_path
+        )
+
+    async def upload(self, bucket_name: str, local_path: str, remote_path: str) -> str:
+        target = self._path(bucket_name, remote_path)
+        await self._delay()
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        await asyncio.to_thread(shutil.copyfile, local_path, target)
+        return Path(target).as_uri()
+
+
+def create_storage() -> StorageBackend:
+    """Backend selected by STORAGE_BACKEND: "supabase" (default) or "local"."""
+    backend = os.getenv("STORAGE_BACKEND", "supabase")
+    if backend == "local":
+        return LocalStorage(
+            os.getenv("LOCAL_STORAGE_DIR", "./storage"),
+            latency=float(os.getenv("LOCAL_STORAGE_LATENCY_MS", "0")) / 1000,
+        )
+    if backend != "supabase":
+        raise RuntimeError(f"Unknown storage backend: {backend}")
+
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE")
+    if key is None or url is None:
+        raise RuntimeError("Environment variables for Supabase was not found")
+    return SupabaseStorage(url, key)
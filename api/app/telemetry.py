@@ -0,0 +1,235 @@
+"""Structured logging, pipeline stage timings and Prometheus metrics.
+
+Every processing step of an upload (save, unzip, parse, dedup, write,
+zip, upload) is accumulated in a ``StageTimings``: wall time, rows, bytes
+in/out and duplicates. Timings are plain data, so process pool workers
+return them with their results and the parent merges them. ``publish``
+turns finished timings into counters/histograms of ``REGISTRY`` and one
+structured log record; ``REGISTRY.render()`` is the text served on
+/metrics.
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+STAGES = ("save", "unzip", "parse", "dedup", "write", "zip", "upload")
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" - одна запись JSON на строку, "text" - для чтения глазами
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# атрибуты, которые есть у любой LogRecord; всё остальное пришло через extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with the fields passed via ``extra=``."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(
+            f"{key}={value}" for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES
+        )
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        return f"{line} {fields}" if fields else line
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> None:
+    """Routes the "app" loggers to stderr in the configured format, once."""
+    logger = logging.getLogger("app")
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+@dataclass
+class StageStats:
+    seconds: float = 0.0
+    rows: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    duplicates: int = 0
+    calls: int = 0
+
+    def merge(self, other: "StageStats") -> None:
+        for name, value in asdict(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+
+@dataclass
+class StageTimings:
+    """Per-stage totals of one request (or of one file within it)."""
+
+    stages: dict[str, StageStats] = field(default_factory=dict)
+
+    def __getitem__(self, stage: str) -> StageStats:
+        return self.stages.setdefault(stage, StageStats())
+
+    @contextmanager
+    def measure(self, stage: str):
+        """Adds the wall time of the block to the stage; yields its stats to fill in counts."""
+        stats = self[stage]
+        started = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.seconds += time.perf_counter() - started
+            stats.calls += 1
+
+    def merge(self, other: "StageTimings | None") -> None:
+        if other is not None:
+            for stage, stats in other.stages.items():
+                self[stage].merge(stats)
+
+    def to_dict(self) -> dict[str, dict]:
+        return {
+            stage: {**asdict(stats), "seconds": round(stats.seconds, 6)}
+            for stage, stats in sorted(self.stages.items(), key=lambda item: _stage_order(item[0]))
+        }
+
+
+def _stage_order(stage: str) -> int:
+    return STAGES.index(stage) if stage in STAGES else len(STAGES)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name, self.documentation, self.labelnames = name, documentation, labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name, self.documentation, self.labelnames = name, documentation, labelnames
+        self.buckets = tuple(sorted(buckets))
+        # по ключу меток: счётчики корзин (последняя - +Inf), сумма, количество
+        self._series: dict[tuple, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip((*self.buckets, float("inf")), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    labels = _labels((*self.labelnames, "le"), (*key, le))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_number(total[0])}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[Counter | Histogram] = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), **kwargs) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4."""
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Latency of HTTP requests.", ("method", "route", "status")
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "pipeline_stage_duration_seconds", "Time spent in a pipeline stage per request.", ("stage",)
+)
+STAGE_ROWS = REGISTRY.counter("pipeline_stage_rows_total", "Rows processed by a pipeline stage.", ("stage",))
+STAGE_BYTES_IN = REGISTRY.counter("pipeline_stage_bytes_in_total", "Bytes read by a pipeline stage.", ("stage",))
+STAGE_BYTES_OUT = REGISTRY.counter("pipeline_stage_bytes_out_total", "Bytes written by a pipeline stage.", ("stage",))
+DUPLICATES = REGISTRY.counter("pipeline_duplicate_rows_total", "Duplicate rows removed.")
+
+_log = logging.getLogger("app.telemetry")
+
+
+def publish(timings: StageTimings, message: str = "pipeline finished", **fields) -> None:
+    """Records the timings in the metrics and logs them as one structured record."""
+    for stage, stats in timings.stages.items():
+        STAGE_SECONDS.observe(stats.seconds, stage=stage)
+        STAGE_ROWS.inc(stats.rows, stage=stage)
+        STAGE_BYTES_IN.inc(stats.bytes_in, stage=stage)
+        STAGE_BYTES_OUT.inc(stats.bytes_out, stage=stage)
+        DUPLICATES.inc(stats.duplicates)
+    _log.info(message, extra={**fields, "stages": timings.to_dict()})
@@ -0,0 +1,373 @@
+"""Streaming processing of uploaded ZIP archives.
+
+Every CSV member is read straight from the input archive and its
+deduplicated rows are written straight into an entry of the output
+archive, so neither the extracted files nor whole DataFrames ever exist.
+Large archives are processed member-per-core in a process pool: workers
+write their members to scratch files already compressed (raw deflate for
+CSV, zstd inside Parquet, see ``app.output_format``) and the parent only
+copies each finished one into the archive while the others are still
+being processed.
+"""
+
+import logging
+import multiprocessing
+import os
+import posixpath
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import IO, Callable, Iterator, Sequence, TypeVar
+
+from app.dedup import MEMORY_BUDGET, DedupResult, Opener, dedup_csv
+from app.output_format import OutputFormat, RawDeflateSink
+from app.telemetry import StageTimings
+
+# 0 - по числу ядер
+ZIP_WORKERS = int(os.getenv("ZIP_WORKERS", "0")) or os.cpu_count() or 1
+# архивы меньше этого размера обрабатываются последовательно
+PARALLEL_MIN_BYTES = int(os.getenv("PARALLEL_MIN_MB", "16")) * 1024 * 1024
+_COPY_CHUNK = 1 << 20
+
+log = logging.getLogger(__name__)
+
+# progress(обработано, всего) после каждого файла архива
+Progress = Callable[[int, int], None]
+T = TypeVar("T")
+
+_executor: ProcessPoolExecutor | None = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def is_csv_member(info: zipfile.ZipInfo) -> bool:
+    return not info.is_dir() and info.filename.endswith(".csv")
+
+
+def processed_member_name(member_name: str, output: OutputFormat = OutputFormat()) -> str:
+    """processed_<name> next to the original member, as in extract mode."""
+    directory, file_name = posixpath.split(member_name)
+    return posixpath.join(directory, f"processed_{output.member_name(file_name)}")
+
+
+def _dedup_member(
+    zip_ref: zipfile.ZipFile,
+    info: zipfile.ZipInfo,
+    open_sink: Opener,
+    memory_budget: int,
+    subset: list[str] | None,
+    spill_dir: str,
+    output: OutputFormat,
+) -> DedupResult | None:
+    """Deduplicate one member into the sink opened by ``open_sink``."""
+    return dedup_csv(
+        partial(zip_ref.open, info),
+        open_sink,
+        memory_budget=memory_budget,
+        subset=subset,
+        spill_dir=spill_dir,
+        output=output,
+    )
+
+
+def dedup_member_to_file(
+    input_zip_path: str,
+    member_name: str,
+    output_path: str,
+    memory_budget: int,
+    subset: list[str] | None,
+    output: OutputFormat = OutputFormat(),
+) -> tuple[DedupResult | None, tuple[int, int] | None]:
+    """Process pool entry point: deduplicate one member into a scratch file.
+
+    CSV is deflated here too; the second item is then the (CRC-32,
+    uncompressed size) of the data for ``add_deflated``, otherwise None.
+    """
+    deflated = []
+
+    def open_sink() -> IO[bytes]:
+        if output.zip_compression != zipfile.ZIP_DEFLATED:
+            return open(output_path, "wb")
+        deflated.append(RawDeflateSink(output_path, output.compression_level))
+        return deflated[-1]
+
+    with zipfile.ZipFile(input_zip_path, "r") as zip_ref:
+        result = _dedup_member(
+            zip_ref,
+            zip_ref.getinfo(member_name),
+            open_sink,
+            memory_budget,
+            subset,
+            os.path.dirname(output_path),
+            output,
+        )
+    return result, (deflated[0].crc, deflated[0].size) if deflated else None
+
+
+def add_deflated(
+    zip_out: zipfile.ZipFile, arch_name: str, data_path: str, crc: int, file_size: int
+) -> zipfile.ZipInfo:
+    """Adds an entry whose raw deflate data is already in ``data_path``.
+
+    zipfile has no public call for storing compressed data as is, so the
+    entry is written the way ZipFile.writestr/mkdir write theirs.
+    """
+    zinfo = zipfile.ZipInfo(arch_name, date_time=time.localtime(time.time())[:6])
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo.external_attr = 0o600 << 16
+    zinfo.file_size = file_size
+    zinfo.compress_size = os.path.getsize(data_path)
+    zinfo.CRC = crc
+    zip64 = max(zinfo.file_size, zinfo.compress_size) > zipfile.ZIP64_LIMIT
+    with zip_out._lock:
+        zip_out._writecheck(zinfo)
+        zip_out._didModify = True
+        zip_out.fp.seek(zip_out.start_dir)
+        zinfo.header_offset = zip_out.fp.tell()
+        zip_out.fp.write(zinfo.FileHeader(zip64))
+        with open(data_path, "rb") as data:
+            shutil.copyfileobj(data, zip_out.fp, _COPY_CHUNK)
+        zip_out.start_dir = zip_out.fp.tell()
+        zip_out.filelist.append(zinfo)
+        zip_out.NameToInfo[zinfo.filename] = zinfo
+    return zinfo
+
+
+def _submit(workers: int, calls: list[tuple]) -> tuple[ProcessPoolExecutor, list[Future]]:
+    """Submits ``(fn, *args)`` calls to the process pool shared between requests.
+
+    The pool is looked up (or replaced) and the calls are submitted under
+    one lock, so a concurrent request can never shut the pool down between
+    the two. A pool replaced for another worker count is shut down without
+    cancelling: the requests already using it still get their results.
+    """
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # spawn: в воркерах нет унаследованных потоков uvicorn
+            _executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            _executor_workers = workers
+        return _executor, [_executor.submit(*call) for call in calls]
+
+
+def _drop_executor(executor: ProcessPoolExecutor) -> None:
+    """Forget a pool whose worker died so the next request starts a new one."""
+    global _executor
+    with _executor_lock:
+        # пул мог уже заменить другой запрос
+        if _executor is executor:
+            _executor = None
+    # у сломанного пула все задачи уже завершились с BrokenProcessPool
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def with_progress(items: Sequence[T], progress: Progress | None) -> Iterator[T]:
+    """Iterates the items, reporting progress after each one (also after ``continue``)."""
+    for done, item in enumerate(items, 1):
+        yield item
+        if progress is not None:
+            progress(done, len(items))
+
+
+def use_parallel(csv_members: list[zipfile.ZipInfo], workers: int) -> bool:
+    """Small archives are faster to process serially than to ship to workers."""
+    total_size = sum(info.file_size for info in csv_members)
+    return workers > 1 and len(csv_members) > 1 and total_size >= PARALLEL_MIN_BYTES
+
+
+def _report(
+    info: zipfile.ZipInfo,
+    arch_name: str,
+    result: DedupResult,
+    output_bytes: int,
+    timings: StageTimings | None,
+) -> None:
+    """Adds the member's stages to the request timings and logs the member."""
+    result.timings["parse"].bytes_in += info.file_size
+    result.timings["write"].bytes_out += output_bytes
+    if timings is not None:
+        timings.merge(result.timings)
+    log.info(
+        "Member processed",
+        extra={
+            "member": info.filename,
+            "arch_name": arch_name,
+            "rows_written": result.rows_written,
+            "duplicates": result.duplicates,
+            "chunk_rows": result.chunk_rows,
+            "spilled": result.spilled,
+        },
+    )
+
+
+def process_zip_streaming(
+    input_zip_path: str,
+    output_zip_path: str,
+    memory_budget: int = MEMORY_BUDGET,
+    workers: int = ZIP_WORKERS,
+    subset: list[str] | None = None,
+    timings: StageTimings | None = None,
+    progress: Progress | None = None,
+    output: OutputFormat = OutputFormat(),
+) -> dict:
+    """Deduplicate every CSV member of the archive without extracting it.
+
+    With several workers and a large enough archive the members are
+    processed concurrently in a process pool; the output entries and the
+    returned per-file duplicate counts keep the archive order either way.
+    ``subset`` limits duplicate detection to these columns in every member
+    that has all of them. Stage timings of all members are added to
+    ``timings``; decompression of a member counts as its "parse" stage.
+    ``progress`` is called with (members done, members total). ``output``
+    selects the format and compression level of the processed members.
+    """
+    with zipfile.ZipFile(input_zip_path, "r") as zip_ref:
+        log.debug("Files in ZIP archive", extra={"members": zip_ref.namelist()})
+        csv_members = [info for info in zip_ref.infolist() if is_csv_member(info)]
+
+        if use_parallel(csv_members, workers):
+            return _process_members_parallel(
+                input_zip_path, output_zip_path, csv_members, memory_budget, workers, subset, timings, progress,
+                output,
+            )
+
+        duplicate_counts = {}
+        spill_dir = os.path.dirname(os.path.abspath(output_zip_path))
+        with zipfile.ZipFile(
+            output_zip_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=output.compression_level
+        ) as zip_out:
+            for info in with_progress(csv_members, progress):
+                file_name = posixpath.basename(info.filename)
+                arch_name = processed_member_name(info.filename, output)
+                try:
+                    result = _dedup_member_into(
+                        zip_out, zip_ref, info, arch_name, memory_budget, subset, spill_dir, output
+                    )
+                except Exception:
+                    log.exception("Error processing file", extra={"file_name": file_name})
+                    continue
+                if result is None:
+                    log.warning("File is empty after processing, skipping", extra={"file_name": file_name})
+                    continue
+
+                duplicate_counts[file_name] = result.duplicates
+                _report(info, arch_name, result, zip_out.getinfo(arch_name).file_size, timings)
+
+    if not duplicate_counts:
+        log.error("No valid CSV files found for processing")
+        raise RuntimeError("No valid CSV files found for processing in the ZIP archive.")
+
+    return duplicate_counts
+
+
+def _dedup_member_into(
+    zip_out: zipfile.ZipFile,
+    zip_ref: zipfile.ZipFile,
+    info: zipfile.ZipInfo,
+    arch_name: str,
+    memory_budget: int,
+    subset: list[str] | None,
+    spill_dir: str,
+    output: OutputFormat,
+) -> DedupResult | None:
+    """Serial path: CSV is deflated straight into the archive entry.
+
+    pyarrow needs a sink with tell(), which archive entries lack, so
+    Parquet goes through a scratch file stored as is.
+    """
+    if output.zip_compression == zipfile.ZIP_DEFLATED:
+        return _dedup_member(
+            zip_ref, info, partial(zip_out.open, arch_name, "w", force_zip64=True),
+            memory_budget, subset, spill_dir, output,
+        )
+    descriptor, scratch_path = tempfile.mkstemp(suffix=output.extension, dir=spill_dir)
+    os.close(descriptor)
+    try:
+        result = _dedup_member(
+            zip_ref, info, partial(open, scratch_path, "wb"), memory_budget, subset, spill_dir, output
+        )
+        if result is not None:
+            zip_out.write(scratch_path, arch_name, compress_type=output.zip_compression)
+        return result
+    finally:
+        os.remove(scratch_path)
+
+
+def _process_members_parallel(
+    input_zip_path: str,
+    output_zip_path: str,
+    csv_members: list[zipfile.ZipInfo],
+    memory_budget: int,
+    workers: int,
+    subset: list[str] | None,
+    timings: StageTimings | None,
+    progress: Progress | None,
+    output: OutputFormat,
+) -> dict:
+    active_workers = min(workers, len(csv_members))
+    scratch_dir = tempfile.mkdtemp(
+        prefix="parallel_", dir=os.path.dirname(os.path.abspath(output_zip_path))
+    )
+    log.info("Processing members in parallel", extra={"members": len(csv_members), "workers": active_workers})
+    duplicate_counts = {}
+    try:
+        # бюджет памяти делится между одновременно работающими воркерами
+        executor, futures = _submit(workers, [
+            (
+                dedup_member_to_file,
+                input_zip_path,
+                info.filename,
+                os.path.join(scratch_dir, f"{index}{output.extension}"),
+                memory_budget // active_workers,
+                subset,
+                output,
+            )
+            for index, info in enumerate(csv_members)
+        ])
+        with zipfile.ZipFile(output_zip_path, "w") as zip_out:
+            for index, (info, future) in enumerate(with_progress(list(zip(csv_members, futures)), progress)):
+                file_name = posixpath.basename(info.filename)
+                arch_name = processed_member_name(info.filename, output)
+                try:
+                    result, deflated = future.result()
+                except BrokenProcessPool:
+                    _drop_executor(executor)
+                    raise
+                except Exception:
+                    log.exception("Error processing file", extra={"file_name": file_name})
+                    continue
+                if result is None:
+                    log.warning("File is empty after processing, skipping", extra={"file_name": file_name})
+                    continue
+
+                scratch_path = os.path.join(scratch_dir, f"{index}{output.extension}")
+                # parse/dedup/write (со сжатием) воркеров идут параллельно: их время - сумма
+                # по воркерам; здесь сжатые данные только копируются в архив
+                with result.timings.measure("zip") as packed:
+                    if deflated is not None:
+                        zinfo = add_deflated(zip_out, arch_name, scratch_path, *deflated)
+                    else:
+                        zip_out.write(scratch_path, arch_name, compress_type=output.zip_compression)
+                        zinfo = zip_out.getinfo(arch_name)
+                    packed.bytes_in += zinfo.file_size
+                    packed.bytes_out += zinfo.compress_size
+                _report(info, arch_name, result, zinfo.file_size, timings)
+                os.remove(scratch_path)
+                duplicate_counts[file_name] = result.duplicates
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    if not duplicate_counts:
+        log.error("No valid CSV files found for processing")
+        raise RuntimeError("No valid CSV files found for processing in the ZIP archive.")
+
+    return duplicate_counts
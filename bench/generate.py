@@ -0,0 +1,293 @@
+"""Синтетические выгрузки Tasks/History/Sprints для бенчмарков.
+
+Файлы повторяют формат хакатона: разделитель ';', служебная строка
+"Table 1" перед заголовком, те же столбцы и форматы значений (даты с
+микросекундами и изредка вида 20/7/24, состав спринта "{id,id,...}",
+переходы статусов "A -> B", смена спринта в истории). Рядом кладётся
+архив dataset.zip с тремя файлами и, по желанию, копии без служебной
+строки (plain/) - в таком виде их читает DataConnection.
+
+    python bench/generate.py ./bench/data/100k --history-rows 100000
+"""
+
+import argparse
+import json
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+TITLE_LINE = "Table 1"
+DATASET_FILES = ("Tasks.csv", "History.csv", "Sprints.csv")
+ARCHIVE_NAME = "dataset.zip"
+
+TASK_COLUMNS = ["entity_id", "area", "type", "status", "state", "priority", "ticket_number", "name",
+                "create_date", "created_by", "update_date", "updated_by", "parent_ticket_id", "assignee",
+                "owner", "due_date", "rank", "estimation", "spent", "workgroup", "resolution"]
+HISTORY_COLUMNS = ["entity_id", "history_property_name", "history_date", "history_version",
+                   "history_change_type", "history_change", "Столбец1", ""]
+SPRINT_COLUMNS = ["sprint_name", "sprint_status", "sprint_start_date", "sprint_end_date", "entity_ids"]
+
+AREAS = (["Система.Таск-трекер", "Система.ХранениеАртефактов", "Система.Вики", "Система. Движок",
+          "Управление релизами изменениями", "Система.Ошибки"], [0.31, 0.26, 0.22, 0.11, 0.08, 0.02])
+TYPES = (["История", "Задача", "Дефект", "Подзадача", "Эпик"], [0.35, 0.3, 0.25, 0.08, 0.02])
+PRIORITIES = (["Средний", "Высокий", "Критический", "Низкий"], [0.77, 0.13, 0.06, 0.04])
+WORKGROUPS = (["Новая функциональность", "Линейная деятельность", "Технический долг", "Архитектурная задача", ""],
+              [0.45, 0.17, 0.04, 0.01, 0.33])
+PEOPLE = ["А. К.", "Я. П.", "Н. С.", "А. А.", "Д. С.", "А. П.", "Д. М.", "Е. Б.", "В. М.", "Д. Б.",
+          "Н. Н.", "В. С.", "И. Т.", "О. Р.", "С. Л.", "М. Ф."]
+PREFIXES = ["PPTS", "PPIN", "PPWK", "PPRM"]
+TITLES = ["[FE] Бэклог. Кастомизация колонок", "[BE] Интеграция со Система.ГенераторДокументов",
+          "История изменений. Пустые строки", 'Фильтр по полю "Спринт"', "Экспорт отчёта; выгрузка в CSV",
+          "[Вики] Права доступа к разделу", "Ошибка при сохранении артефакта"]
+# путь задачи по статусам: i-й переход статуса задачи - STATUS_FLOW[i] -> STATUS_FLOW[i + 1]
+STATUS_FLOW = ["Создано", "Анализ", "Готово к разработке", "В работе", "Разработка", "Тестирование",
+               "Подтверждение", "Закрыто"]
+CLOSED_RESOLUTIONS = (["Готово", "Отменен инициатором", "Отклонено", "Дубликат"], [0.85, 0.07, 0.05, 0.03])
+OTHER_PROPERTIES = (["Исполнитель", "Оценка", "Описание", "Приоритет", "Комментарий", "Затраченное время",
+                     "Связанные задачи", "Метки"], [0.2, 0.15, 0.15, 0.1, 0.15, 0.15, 0.05, 0.05])
+
+SPRINT_DAYS = 14
+FIRST_SPRINT = pd.Timestamp("2024-01-03 19:00:00")
+FIRST_ENTITY_ID = 4_000_000
+HISTORY_PER_TASK = 10
+TASKS_PER_SPRINT = 400
+# на один раз собирается столько строк истории
+CHUNK_ROWS = 1_000_000
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def choice(rng, values_weights, size):
+    values, weights = values_weights
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=size, p=np.asarray(weights) / sum(weights))]
+
+
+def format_dates(times, rng, short_share=0.0):
+    """ISO с микросекундами; доля short_share - в виде 20/7/24 19:00, как в выгрузке истории"""
+    formatted = pd.DatetimeIndex(times).strftime(DATE_FORMAT).to_numpy(dtype=object)
+    short = rng.random(len(formatted)) < short_share
+    if short.any():
+        index = pd.DatetimeIndex(times[short])
+        formatted[short] = (
+            index.day.astype(str) + "/" + index.month.astype(str) + "/" + (index.year % 100).astype(str)
+            + " " + index.hour.astype(str) + ":" + index.strftime("%M")
+        ).to_numpy(dtype=object)
+    return formatted
+
+
+def sprint_windows(sprints_count):
+    starts = FIRST_SPRINT + pd.to_timedelta(np.arange(sprints_count) * SPRINT_DAYS, unit="D")
+    return starts.to_numpy(), (starts + pd.Timedelta(days=SPRINT_DAYS - 1)).to_numpy()
+
+
+def sprint_names(sprints_count):
+    # по 6 спринтов в квартал, как в выгрузке: "Спринт 2024.3.1.NPP Shared Sprint"
+    index = np.arange(sprints_count)
+    year, quarter, number = 2024 + index // 24, index // 6 % 4 + 1, index % 6 + 1
+    return [f"Спринт {y}.{q}.{n}.NPP Shared Sprint" for y, q, n in zip(year, quarter, number)]
+
+
+def generate_tasks(rng, tasks_count, sprint_of_task, sprint_start):
+    ids = FIRST_ENTITY_ID + np.arange(tasks_count, dtype=np.int64) * 3 + rng.integers(0, 3, tasks_count)
+    progress = rng.integers(0, len(STATUS_FLOW), tasks_count)
+    status = np.asarray(STATUS_FLOW, dtype=object)[progress]
+    backlogged = rng.random(tasks_count) < 0.05
+    status[backlogged] = "Отложен"
+    closed = status == STATUS_FLOW[-1]
+    resolution = np.full(tasks_count, "", dtype=object)
+    resolution[closed] = choice(rng, CLOSED_RESOLUTIONS, int(closed.sum()))
+
+    created = sprint_start[sprint_of_task] - pd.to_timedelta(rng.integers(0, 60 * 86400, tasks_count), unit="s").to_numpy()
+    updated = created + pd.to_timedelta(rng.integers(86400, 120 * 86400, tasks_count), unit="s").to_numpy()
+    estimation = rng.integers(1, 41, tasks_count).astype(float) * 3600
+    estimation[rng.random(tasks_count) < 0.15] = np.nan
+    spent = np.round(np.nan_to_num(estimation, nan=28800) * rng.lognormal(0, 0.4, tasks_count) / 3600) * 3600
+    spent[(progress < 3) | (rng.random(tasks_count) < 0.3)] = np.nan
+    parent = np.where(rng.random(tasks_count) < 0.4, rng.choice(ids, tasks_count), 0).astype(float)
+    parent[parent == 0] = np.nan
+    due = np.full(tasks_count, "", dtype=object)
+    with_due = rng.random(tasks_count) < 0.1
+    due[with_due] = format_dates(updated[with_due], rng)
+    assignee = choice(rng, (PEOPLE, np.ones(len(PEOPLE))), tasks_count)
+
+    return pd.DataFrame({
+        "entity_id": ids,
+        "area": choice(rng, AREAS, tasks_count),
+        "type": choice(rng, TYPES, tasks_count),
+        "status": status,
+        "state": "Normal",
+        "priority": choice(rng, PRIORITIES, tasks_count),
+        "ticket_number": [f"{p}-{n}" for p, n in zip(rng.choice(PREFIXES, tasks_count), rng.integers(1, 20000, tasks_count))],
+        "name": [f"{TITLES[t]} #{i}" for t, i in zip(rng.integers(0, len(TITLES), tasks_count), ids)],
+        "create_date": format_dates(created, rng),
+        "created_by": choice(rng, (PEOPLE, np.ones(len(PEOPLE))), tasks_count),
+        "update_date": format_dates(updated, rng),
+        "updated_by": np.where(rng.random(tasks_count) < 0.2, "", assignee),
+        "parent_ticket_id": pd.array(parent, dtype="Int64"),
+        "assignee": assignee,
+        "owner": assignee,
+        "due_date": due,
+        "rank": [f"0|q{r:05x}:" for r in rng.integers(0, 16**5, tasks_count)],
+        "estimation": pd.array(estimation, dtype="Int64"),
+        "spent": pd.array(spent, dtype="Int64"),
+        "workgroup": choice(rng, WORKGROUPS, tasks_count),
+        "resolution": resolution,
+    }), progress
+
+
+def generate_sprints(rng, tasks, sprint_of_task, names, starts, ends):
+    # часть задач переносится в следующий спринт и входит в оба
+    carried = (rng.random(len(tasks)) < 0.15) & (sprint_of_task < len(names) - 1)
+    member_sprint = np.concatenate([sprint_of_task, sprint_of_task[carried] + 1])
+    member_task = np.concatenate([tasks["entity_id"].to_numpy(), tasks["entity_id"].to_numpy()[carried]])
+    order = np.argsort(member_sprint, kind="stable")
+    bounds = np.searchsorted(member_sprint[order], np.arange(len(names) + 1))
+    ids = member_task[order].astype(str)
+    entity_ids = ["{" + ",".join(ids[bounds[k]:bounds[k + 1]]) + "}" for k in range(len(names))]
+    status = np.full(len(names), "Закрыт", dtype=object)
+    status[-1] = "Активный"
+    return pd.DataFrame({
+        "sprint_name": names,
+        "sprint_status": status,
+        "sprint_start_date": format_dates(starts, rng),
+        "sprint_end_date": format_dates(ends, rng),
+        "entity_ids": entity_ids,
+    }), carried
+
+
+def generate_history(rng, tasks, progress, sprint_of_task, carried, names, starts, rows):
+    """rows строк истории задач tasks: переходы статусов по STATUS_FLOW, смена спринта, прочие поля"""
+    tasks_count = len(tasks)
+    entity = np.sort(rng.integers(0, tasks_count, rows))
+    # от начала спринта задачи до конца следующего спринта
+    offset = rng.integers(-3 * 86400, 2 * SPRINT_DAYS * 86400, rows)
+    times = starts[sprint_of_task[entity]] + offset.astype("timedelta64[s]")
+    order = np.lexsort((times, entity))
+    entity, times = entity[order], times[order]
+
+    properties = choice(rng, OTHER_PROPERTIES, rows)
+    change = np.full(rows, "", dtype=object)
+    change_type = np.full(rows, "FIELD_CHANGED", dtype=object)
+    first = np.r_[True, entity[1:] != entity[:-1]]
+    starts_of_entity = np.flatnonzero(first)
+    position = np.arange(rows) - starts_of_entity[np.cumsum(first) - 1]
+
+    # первые записи задачи - переходы её статуса, по одной на шаг пути
+    is_status = position < progress[entity]
+    properties[is_status] = "Статус"
+    flow = np.asarray(STATUS_FLOW, dtype=object)
+    change[is_status] = flow[position[is_status]] + " -> " + flow[position[is_status] + 1]
+    change_type[first & ~is_status] = "CREATED"
+
+    # добавление в спринт в день создания и перенос в следующий
+    is_sprint = (position == progress[entity]) & (rng.random(rows) < 0.6)
+    properties[is_sprint] = "Спринт"
+    sprint_names_arr = np.asarray(names, dtype=object)
+    own = sprint_names_arr[sprint_of_task[entity[is_sprint]]]
+    moved = carried[entity[is_sprint]]
+    following = sprint_names_arr[np.minimum(sprint_of_task[entity[is_sprint]] + 1, len(names) - 1)]
+    change[is_sprint] = np.where(moved, own + " -> " + own + ", " + following, " -> " + own)
+    other = ~is_status & ~is_sprint & (rng.random(rows) < 0.7)
+    change[other] = rng.integers(1, 100, int(other.sum())).astype(str).astype(object)
+
+    return pd.DataFrame({
+        "entity_id": tasks["entity_id"].to_numpy()[entity],
+        "history_property_name": properties,
+        "history_date": format_dates(times, rng, short_share=0.01),
+        "history_version": position + 1,
+        "history_change_type": change_type,
+        "history_change": change,
+        "Столбец1": "",
+        "": "",
+    }).iloc[rng.permutation(rows)]
+
+
+def write_table(df, path, append=False):
+    with open(path, "a" if append else "w", encoding="utf-8", newline="") as f:
+        if not append:
+            f.write(TITLE_LINE + "\n")
+        df.to_csv(f, sep=";", index=False, header=not append, lineterminator="\n")
+
+
+def duplicate(rng, df, share):
+    """Добавляет share строк - точных копий уже существующих, для проверки очистки дубликатов"""
+    count = int(len(df) * share)
+    if not count:
+        return df
+    return pd.concat([df, df.iloc[rng.integers(0, len(df), count)]], ignore_index=True)
+
+
+def generate(out_dir, history_rows, tasks_count=None, sprints_count=None, seed=0,
+             duplicates=0.01, archive=True, plain=False):
+    """Пишет Tasks.csv, History.csv, Sprints.csv (и dataset.zip, plain/) в out_dir, возвращает их описание"""
+    rng = np.random.default_rng(seed)
+    tasks_count = tasks_count or max(history_rows // HISTORY_PER_TASK, 100)
+    sprints_count = sprints_count or max(tasks_count // TASKS_PER_SPRINT, 4)
+    os.makedirs(out_dir, exist_ok=True)
+
+    names = sprint_names(sprints_count)
+    starts, ends = sprint_windows(sprints_count)
+    sprint_of_task = np.sort(rng.integers(0, sprints_count, tasks_count))
+    tasks, progress = generate_tasks(rng, tasks_count, sprint_of_task, starts)
+    sprints, carried = generate_sprints(rng, tasks, sprint_of_task, names, starts, ends)
+    write_table(duplicate(rng, tasks, duplicates), os.path.join(out_dir, "Tasks.csv"))
+    write_table(sprints, os.path.join(out_dir, "Sprints.csv"))
+
+    # история пишется частями по непересекающимся диапазонам задач
+    chunks = max(1, -(-history_rows // CHUNK_ROWS))
+    task_bounds = np.linspace(0, tasks_count, chunks + 1).astype(int)
+    row_bounds = np.linspace(0, history_rows, chunks + 1).astype(int)
+    written = 0
+    for k in range(chunks):
+        part = slice(task_bounds[k], task_bounds[k + 1])
+        history = generate_history(
+            rng, tasks.iloc[part].reset_index(drop=True), progress[part], sprint_of_task[part],
+            carried[part], names, starts, row_bounds[k + 1] - row_bounds[k],
+        )
+        history = duplicate(rng, history, duplicates)
+        write_table(history, os.path.join(out_dir, "History.csv"), append=k > 0)
+        written += len(history)
+
+    paths = [os.path.join(out_dir, name) for name in DATASET_FILES]
+    if archive:
+        with zipfile.ZipFile(os.path.join(out_dir, ARCHIVE_NAME), "w", zipfile.ZIP_DEFLATED) as zf:
+            for path in paths:
+                zf.write(path, os.path.basename(path))
+    if plain:
+        os.makedirs(os.path.join(out_dir, "plain"), exist_ok=True)
+        for path in paths:
+            with open(path, encoding="utf-8") as src, \
+                    open(os.path.join(out_dir, "plain", os.path.basename(path)), "w", encoding="utf-8") as dst:
+                src.readline()
+                while block := src.read(1 << 20):
+                    dst.write(block)
+
+    meta = {
+        "history_rows": written,
+        "tasks_rows": tasks_count + int(tasks_count * duplicates),
+        "sprints_rows": sprints_count,
+        "seed": seed,
+        "duplicates": duplicates,
+        "bytes": {os.path.basename(path): os.path.getsize(path) for path in paths},
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Синтетический набор Tasks/History/Sprints в формате выгрузки")
+    parser.add_argument("out_dir")
+    parser.add_argument("--history-rows", type=int, default=100_000)
+    parser.add_argument("--tasks", type=int, default=None, help=f"по умолчанию history-rows / {HISTORY_PER_TASK}")
+    parser.add_argument("--sprints", type=int, default=None, help=f"по умолчанию tasks / {TASKS_PER_SPRINT}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duplicates", type=float, default=0.01, help="доля строк-дубликатов")
+    parser.add_argument("--no-zip", action="store_true")
+    parser.add_argument("--plain", action="store_true", help="копии без служебной строки для DataConnection")
+    args = parser.parse_args()
+    print(json.dumps(generate(
+        args.out_dir, args.history_rows, args.tasks, args.sprints, args.seed,
+        args.duplicates, archive=not args.no_zip, plain=args.plain,
+    ), ensure_ascii=False, indent=2))
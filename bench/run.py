@@ -0,0 +1,229 @@
+"""Время и пиковая память основных путей обработки на синтетических наборах.
+
+Для каждого масштаба (строк истории) набор создаётся bench/generate.py
+(или берётся готовый из --data-dir), затем замеряются:
+
+- process_csv_files_in_zip (api) в режимах extract и stream;
+- загрузка в Agile.db, page1.page1 / page1_batch, page_3_data.page_2 / page_3;
+- методы DataConnection;
+- расчёт метрик /sprint-data (load_dataset + compute_sprint_metrics).
+
+Время - по --repeat запускам без трассировки, память - ещё один запуск
+под tracemalloc (пик выделенного Python/numpy). Результаты пишутся в JSON:
+
+    python bench/run.py --scales 10000 100000 --repeat 3 --out bench/results/latest.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [os.path.join(ROOT_DIR, "src"), os.path.join(ROOT_DIR, "api")]
+
+import generate  # noqa: E402
+
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+
+
+def measure(name, fn, repeat, **info):
+    """{case, seconds: min/median/mean, runs, peak_bytes, ...}; вывод fn подавляется"""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            result = fn()
+            runs.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    entry = {
+        "case": name,
+        "seconds": {"min": min(runs), "median": statistics.median(runs), "mean": statistics.fmean(runs)},
+        "runs": runs,
+        "peak_bytes": peak,
+        **info,
+    }
+    print(f"  {name:<40} {entry['seconds']['median'] * 1000:>10.1f} ms {peak / 2**20:>9.1f} MiB", file=sys.stderr)
+    return entry, result
+
+
+def dataset(data_dir, history_rows, seed):
+    """Каталог набора нужного размера; создаётся, если его ещё нет"""
+    out_dir = os.path.join(data_dir, f"history_{history_rows}_seed_{seed}")
+    try:
+        with open(os.path.join(out_dir, "meta.json"), encoding="utf-8") as f:
+            return out_dir, json.load(f)
+    except (OSError, ValueError):
+        return out_dir, generate.generate(out_dir, history_rows, seed=seed, plain=True)
+
+
+def bench_zip(paths, work_dir, repeat):
+    # api читает DATA_DIR относительно рабочего каталога и хранилище из окружения
+    os.environ.setdefault("STORAGE_BACKEND", "local")
+    os.environ.setdefault("LOCAL_STORAGE_DIR", os.path.join(work_dir, "storage"))
+    os.chdir(work_dir)
+    from app.main import process_csv_files_in_zip
+
+    archive = os.path.join(paths, generate.ARCHIVE_NAME)
+    results = []
+    for mode in ("extract", "stream"):
+        output = os.path.join(work_dir, f"processed_{mode}.zip")
+        entry, duplicates = measure(
+            f"process_csv_files_in_zip[{mode}]",
+            lambda: process_csv_files_in_zip(archive, output, mode=mode),
+            repeat,
+            input_bytes=os.path.getsize(archive),
+        )
+        entry["output_bytes"] = os.path.getsize(output)
+        entry["duplicates"] = duplicates
+        results.append(entry)
+    return results
+
+
+def bench_store(paths, work_dir, repeat):
+    import agile_store
+    import page1
+    import page_3_data
+
+    db_path = os.path.join(work_dir, "Agile.db")
+    exports = [os.path.join(paths, name) for name in generate.DATASET_FILES]
+    results = []
+    entry, counts = measure("agile_store.ingest", lambda: agile_store.ingest(*exports, db_path), repeat)
+    results.append({**entry, "rows": counts})
+
+    sprints = agile_store.query("SELECT * FROM sprints ORDER BY sprint_id", db_path=db_path)
+    middle = sprints.iloc[len(sprints) // 2]
+    queries = list(zip(sprints["sprint_id"], sprints["sprint_start_date"], sprints["sprint_end_date"]))
+    task_ids = agile_store.query(
+        "SELECT entity_id FROM sprint_tasks WHERE sprint_id = ?", (int(middle["sprint_id"]),), db_path
+    )["entity_id"].tolist()
+
+    results.append(measure(
+        "page1.page1",
+        lambda: page1.page1(int(middle["sprint_id"]), middle["sprint_start_date"], middle["sprint_end_date"], db_path),
+        repeat,
+    )[0])
+    results.append(measure("page1.page1_batch", lambda: page1.page1_batch(queries, db_path), repeat, queries=len(queries))[0])
+    results.append(measure("page_3_data.page_2", lambda: page_3_data.page_2(task_ids, db_path), repeat, tasks=len(task_ids))[0])
+    results.append(measure("page_3_data.page_3", lambda: page_3_data.page_3(None, db_path), repeat)[0])
+    return results
+
+
+def bench_data_connection(paths, repeat):
+    from data_connection import DataConnection
+
+    files = [os.path.join(paths, "plain", name) for name in generate.DATASET_FILES]
+
+    def opened():
+        connection = DataConnection(files)
+        connection.open_files()
+        return connection
+
+    results = []
+    entry, connection = measure("DataConnection.open_files", opened, repeat)
+    results.append(entry)
+    sprint = len(connection.sprints) // 2
+    sprint_ids = list(range(len(connection.sprints)))
+    task_id = int(connection.sprint_tasks.tasks(sprint)[0])
+    results.append(measure("DataConnection.get_sprint_tasks", lambda: connection.get_sprint_tasks(sprint), repeat)[0])
+    results.append(measure("DataConnection.get_history_for_sprint", lambda: connection.get_history_for_sprint(sprint), repeat)[0])
+    results.append(measure(
+        "DataConnection.get_history_for_sprints", lambda: connection.get_history_for_sprints(sprint_ids), repeat,
+        sprints=len(sprint_ids),
+    )[0])
+    results.append(measure(
+        "DataConnection.get_history_for_sprint_task",
+        lambda: connection.get_history_for_sprint_task(sprint, task_id), repeat,
+    )[0])
+    return results
+
+
+def bench_sprint_metrics(paths, repeat):
+    from app.sprint_metrics import compute_sprint_metrics, load_dataset
+
+    entry, frames = measure("sprint_metrics.load_dataset", lambda: load_dataset(paths), repeat)
+    return [entry, measure("sprint_metrics.compute_sprint_metrics", lambda: compute_sprint_metrics(*frames), repeat)[0]]
+
+
+SUITES = {
+    "zip": lambda paths, work_dir, repeat: bench_zip(paths, work_dir, repeat),
+    "store": lambda paths, work_dir, repeat: bench_store(paths, work_dir, repeat),
+    "data_connection": lambda paths, work_dir, repeat: bench_data_connection(paths, repeat),
+    "sprint_metrics": lambda paths, work_dir, repeat: bench_sprint_metrics(paths, repeat),
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк обработки выгрузок на синтетических данных")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="строк истории")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--suites", nargs="+", choices=list(SUITES), default=list(SUITES))
+    parser.add_argument("--data-dir", default=os.path.join(BENCH_DIR, "data"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON с результатами, по умолчанию stdout")
+    args = parser.parse_args()
+
+    import numpy as np
+    import pandas as pd
+
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "repeat": args.repeat,
+        },
+        "scales": [],
+    }
+    cwd = os.getcwd()
+    for history_rows in args.scales:
+        paths, meta = dataset(os.path.abspath(args.data_dir), history_rows, args.seed)
+        print(f"{history_rows} history rows: {paths}", file=sys.stderr)
+        results = []
+        with tempfile.TemporaryDirectory(prefix="bench_") as work_dir:
+            for suite in args.suites:
+                results.extend(SUITES[suite](paths, work_dir, args.repeat))
+            os.chdir(cwd)
+        report["scales"].append({"history_rows": history_rows, "dataset": meta, "results": results})
+
+    output = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    if args.out is None:
+        print(output)
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Холодный старт API: время импорта app.main и первого запроса к каждому маршруту.
+
+Каждый замер - отдельный процесс Python, как у serverless-функции
+(api/vercel.json): импорт app.main, запуск приложения (startup), первый
+запрос и повторный запрос к тому же маршруту. Дополнительно отмечается,
+загружен ли pandas после импорта и после первого запроса.
+
+    python bench/startup.py --repeat 5 --out bench/results/startup.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+API_DIR = os.path.join(ROOT_DIR, "api")
+
+BUCKET_NAME = "sprint-data"
+STORAGE_FOLDER = "upload"
+
+# маршрут и запрос каждого случая; sprint_data - метрики уже посчитаны на диске
+CASES = {
+    "metrics": ("GET", "/metrics", {}),
+    "jobs_status": ("GET", "/jobs/missing", {}),
+    "sprint_data": ("GET", "/sprint-data", {}),
+    "sprint_data_cold": ("GET", "/sprint-data", {}),
+    "process_zip_file": ("POST", "/process-zip-file/", {"mode": "stream"}),
+    "process_zip_supabase": (
+        "POST", "/process-zip-supabase/", {"folder_path": STORAGE_FOLDER, "bucket_name": BUCKET_NAME}
+    ),
+}
+
+
+def child(case):
+    """Один холодный старт; печатает JSON с замерами"""
+    method, path, params = CASES[case]
+    sys.path.insert(0, API_DIR)
+
+    started = time.perf_counter()
+    import app.main
+
+    imported = time.perf_counter()
+    pandas_after_import = "pandas" in sys.modules
+
+    from fastapi.testclient import TestClient
+
+    def request(client):
+        files = None
+        if method == "POST" and path == "/process-zip-file/":
+            files = {"file": ("dataset.zip", open(os.environ["BENCH_ARCHIVE"], "rb"))}
+        began = time.perf_counter()
+        response = client.request(method, path, params=params, files=files)
+        return time.perf_counter() - began, response.status_code
+
+    client = TestClient(app.main.app)
+    began = time.perf_counter()
+    with client:
+        startup = time.perf_counter() - began
+        first, status = request(client)
+        warm, _ = request(client)
+    print(json.dumps({
+        "import_seconds": imported - started,
+        "startup_seconds": startup,
+        "first_request_seconds": first,
+        "warm_request_seconds": warm,
+        "status": status,
+        "pandas_after_import": pandas_after_import,
+        "pandas_after_request": "pandas" in sys.modules,
+    }))
+
+
+def run_child(case, cwd, env):
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", case],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{case} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summary(runs, key):
+    values = [run[key] for run in runs]
+    return {"min": min(values), "median": statistics.median(values), "mean": statistics.fmean(values)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Холодный старт API по маршрутам")
+    parser.add_argument("--child", choices=list(CASES), help=argparse.SUPPRESS)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--history-rows", type=int, default=10_000, help="строк истории в наборе")
+    parser.add_argument("--data-dir", default=os.path.join(BENCH_DIR, "data"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON с результатами, по умолчанию stdout")
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    sys.path.insert(0, BENCH_DIR)
+    import generate
+    from run import dataset, git_revision
+
+    paths, meta = dataset(os.path.abspath(args.data_dir), args.history_rows, args.seed)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="startup_") as work_dir:
+        storage_dir = os.path.join(work_dir, "storage")
+        source_dir = os.path.join(storage_dir, BUCKET_NAME, STORAGE_FOLDER)
+        os.makedirs(source_dir)
+        for name in generate.DATASET_FILES:
+            shutil.copyfile(os.path.join(paths, name), os.path.join(source_dir, name))
+        env = {
+            **os.environ,
+            "STORAGE_BACKEND": "local",
+            "LOCAL_STORAGE_DIR": storage_dir,
+            "SPRINT_DATASET_DIR": paths,
+            "BENCH_ARCHIVE": os.path.join(paths, generate.ARCHIVE_NAME),
+            "RESULT_CACHE_MAX_MB": "0",
+            "LOG_LEVEL": "WARNING",
+        }
+
+        for case in args.cases:
+            runs = []
+            for _ in range(args.repeat):
+                # у каждого запуска своя рабочая папка, то есть свой ./data
+                cwd = tempfile.mkdtemp(dir=work_dir)
+                if case == "sprint_data":
+                    run_child(case, cwd, env)  # метрики считаются и сохраняются на диск
+                runs.append(run_child(case, cwd, env))
+            entry = {
+                "case": case,
+                "route": f"{CASES[case][0]} {CASES[case][1]}",
+                "status": runs[-1]["status"],
+                **{key: summary(runs, key) for key in (
+                    "import_seconds", "startup_seconds", "first_request_seconds", "warm_request_seconds"
+                )},
+                "pandas_after_import": any(run["pandas_after_import"] for run in runs),
+                "pandas_after_request": any(run["pandas_after_request"] for run in runs),
+                "runs": runs,
+            }
+            print(
+                f"  {case:<22} import {entry['import_seconds']['median'] * 1000:>7.1f} ms"
+                f"  first {entry['first_request_seconds']['median'] * 1000:>8.1f} ms"
+                f"  warm {entry['warm_request_seconds']['median'] * 1000:>7.1f} ms"
+                f"  pandas: {entry['pandas_after_request']}",
+                file=sys.stderr,
+            )
+            results.append(entry)
+
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "repeat": args.repeat,
+            "dataset": meta,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    if args.out is None:
+        print(output)
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,508 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.frames import compact
+from app.membership import parse_entity_ids
+from app.sprint_metrics import SprintMetricsStore, compute_sprint_metrics, dataset_version, scope_changes
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Database", "Agile.db")
+METRICS_DIR = os.path.join(os.path.dirname(DB_PATH), "metrics")
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+TASK_COLUMNS = ["entity_id", "area", "type", "status", "state", "priority", "ticket_number", "name",
+                "create_date", "created_by", "update_date", "updated_by", "parent_ticket_id", "assignee",
+                "owner", "due_date", "rank", "estimation", "spent", "workgroup", "resolution"]
+HISTORY_COLUMNS = ["entity_id", "history_property_name", "history_date", "history_version",
+                   "history_change_type", "history_change"]
+SPRINT_COLUMNS = ["sprint_id", "sprint_name", "sprint_status", "sprint_start_date", "sprint_end_date"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    entity_id INTEGER PRIMARY KEY,
+    area TEXT, type TEXT, status TEXT, state TEXT, priority TEXT, ticket_number TEXT, name TEXT,
+    create_date TEXT, created_by TEXT, update_date TEXT, updated_by TEXT, parent_ticket_id INTEGER,
+    assignee TEXT, owner TEXT, due_date TEXT, rank TEXT, estimation REAL, spent REAL,
+    workgroup TEXT, resolution TEXT, row_hash INTEGER
+);
+CREATE TABLE IF NOT EXISTS history (
+    entity_id INTEGER NOT NULL,
+    history_property_name TEXT, history_date TEXT, history_version INTEGER,
+    history_change_type TEXT, history_change TEXT, row_hash INTEGER
+);
+CREATE TABLE IF NOT EXISTS sprints (
+    sprint_id INTEGER PRIMARY KEY, -- порядковый номер спринта в Sprints.csv
+    sprint_name TEXT, sprint_status TEXT, sprint_start_date TEXT, sprint_end_date TEXT,
+    row_hash INTEGER -- вместе с составом спринта
+);
+-- вместо строки {id,id,...} из Sprints.entity_ids
+CREATE TABLE IF NOT EXISTS sprint_tasks (
+    sprint_id INTEGER NOT NULL REFERENCES sprints(sprint_id),
+    entity_id INTEGER NOT NULL,
+    PRIMARY KEY (sprint_id, entity_id)
+) WITHOUT ROWID;
+-- отметка последней загрузки: максимальные update_date / history_date
+CREATE TABLE IF NOT EXISTS ingest_state (
+    table_name TEXT PRIMARY KEY,
+    watermark TEXT,
+    loaded_at TEXT
+);
+-- версия данных: номер загрузки, меняющей базу, и случайный id самой базы
+CREATE TABLE IF NOT EXISTS data_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    database_id TEXT NOT NULL,
+    generation INTEGER NOT NULL
+);
+"""
+# хэш содержимого строки для инкрементальной загрузки
+HASHED_TABLES = ['tasks', 'history', 'sprints']
+
+INDEXES = {
+    "history_entity_date": "history(entity_id, history_date)",
+    "history_date": "history(history_date)",
+    "sprint_tasks_entity": "sprint_tasks(entity_id)",
+}
+
+
+def connect(db_path=DB_PATH):
+    """Соединение для загрузки: здесь же создаётся и обновляется схема"""
+    connection = sqlite3.connect(db_path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    add_hash_columns(connection)
+    create_indexes(connection)
+    init_data_version(connection)
+    return connection
+
+
+def connect_readonly(db_path=DB_PATH):
+    """Соединение для запросов: только чтение, без DDL (схему готовят ingest и prepare_database)"""
+    return sqlite3.connect(f"{Path(db_path).absolute().as_uri()}?mode=ro", uri=True)
+
+
+def prepare_database(db_path=DB_PATH):
+    """Создаёт или обновляет схему существующей базы; вызывается один раз при старте"""
+    if os.path.exists(db_path):
+        connect(db_path).close()
+
+
+def init_data_version(connection):
+    """Базы, созданные до счётчика загрузок, получают версию с номером 0"""
+    if connection.execute("SELECT 1 FROM data_version").fetchone() is None:
+        with connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO data_version (id, database_id, generation) VALUES (1, ?, 0)",
+                (uuid.uuid4().hex,),
+            )
+
+
+def bump_data_version(connection):
+    """Новый номер загрузки; вызывается внутри транзакции, которая меняет данные"""
+    connection.execute("UPDATE data_version SET generation = generation + 1 WHERE id = 1")
+
+
+def add_hash_columns(connection):
+    """Базы, созданные до инкрементальной загрузки, получают столбец row_hash"""
+    for table in HASHED_TABLES:
+        columns = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+        if 'row_hash' not in columns:
+            connection.execute(f"ALTER TABLE {table} ADD COLUMN row_hash INTEGER")
+
+
+def create_indexes(connection):
+    for name, target in INDEXES.items():
+        connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def drop_indexes(connection):
+    for name in INDEXES:
+        connection.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def read_export(path):
+    """Выгрузка в формате хакатона: ';' и служебная строка перед заголовком"""
+    return pd.read_csv(path, skiprows=1, sep=';', encoding='utf-8')
+
+
+def format_dates(column):
+    parsed = pd.to_datetime(column, format='ISO8601', errors='coerce')
+    # в выгрузке истории встречаются даты вида 20/7/24
+    rest = parsed.isna() & column.notna()
+    if rest.any():
+        parsed[rest] = pd.to_datetime(column[rest], format='mixed', dayfirst=True, errors='coerce')
+    return parsed.dt.strftime(DATE_FORMAT)
+
+
+def to_rows(df):
+    """NaN -> NULL, numpy-типы -> python"""
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+
+def row_hashes(df, columns):
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy().view(np.int64)
+
+
+def prepare_tasks(tasks):
+    tasks = tasks.reindex(columns=TASK_COLUMNS)
+    tasks = tasks.dropna(subset=['entity_id']).drop_duplicates(subset='entity_id')
+    tasks['entity_id'] = tasks['entity_id'].astype('int64')
+    tasks['parent_ticket_id'] = tasks['parent_ticket_id'].astype('Int64')
+    for column in ['create_date', 'update_date', 'due_date']:
+        tasks[column] = format_dates(tasks[column])
+    tasks['row_hash'] = row_hashes(tasks, TASK_COLUMNS)
+    return tasks
+
+
+def prepare_history(history):
+    history = history.reindex(columns=HISTORY_COLUMNS)
+    history = history.dropna(subset=['entity_id'])
+    history['entity_id'] = history['entity_id'].astype('int64')
+    history['history_version'] = pd.to_numeric(history['history_version'], errors='coerce').astype('Int64')
+    history['history_change'] = history['history_change'].fillna('')
+    history['history_date'] = format_dates(history['history_date'])
+    history['row_hash'] = row_hashes(history, HISTORY_COLUMNS)
+    return history
+
+
+def prepare_sprints(sprints):
+    sprints = sprints.reset_index(drop=True)
+    sprint_rows = pd.DataFrame({
+        'sprint_id': sprints.index,
+        'sprint_name': sprints['sprint_name'],
+        'sprint_status': sprints['sprint_status'],
+        'sprint_start_date': format_dates(sprints['sprint_start_date']),
+        'sprint_end_date': format_dates(sprints['sprint_end_date']),
+    })
+    membership = parse_entity_ids(sprints['entity_ids'])
+    links = pd.DataFrame({
+        'sprint_id': membership.sprint_of_entry,
+        'entity_id': membership.task_ids,
+    }).drop_duplicates()
+    # состав спринта входит в хэш: изменение списка задач - изменение спринта
+    members = links.groupby('sprint_id')['entity_id'].apply(lambda ids: ','.join(map(str, sorted(ids))))
+    sprint_rows['row_hash'] = row_hashes(
+        sprint_rows.assign(members=sprint_rows['sprint_id'].map(members).fillna('')),
+        SPRINT_COLUMNS + ['members'],
+    )
+    return sprint_rows, links
+
+
+def insert(connection, table, columns, df):
+    placeholders = ', '.join('?' * len(columns))
+    connection.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", to_rows(df[columns])
+    )
+
+
+def ingest(tasks_path, history_path, sprints_path, db_path=DB_PATH):
+    """Полная перезаливка трёх выгрузок в базу одной транзакцией"""
+    tasks = prepare_tasks(read_export(tasks_path))
+    history = prepare_history(read_export(history_path))
+    sprints, links = prepare_sprints(read_export(sprints_path))
+
+    with closing(connect(db_path)) as connection:
+        with connection:
+            # индексы дешевле построить заново после массовой вставки
+            drop_indexes(connection)
+            for table in ['sprint_tasks', 'sprints', 'history', 'tasks', 'ingest_state']:
+                connection.execute(f"DELETE FROM {table}")
+            insert(connection, 'tasks', TASK_COLUMNS + ['row_hash'], tasks)
+            insert(connection, 'history', HISTORY_COLUMNS + ['row_hash'], history)
+            insert(connection, 'sprints', SPRINT_COLUMNS + ['row_hash'], sprints)
+            insert(connection, 'sprint_tasks', ['sprint_id', 'entity_id'], links)
+            create_indexes(connection)
+            save_watermarks(connection, tasks, history)
+            bump_data_version(connection)
+        connection.execute("ANALYZE")
+    return {'tasks': len(tasks), 'history': len(history), 'sprints': len(sprints), 'sprint_tasks': len(links)}
+
+
+def save_watermarks(connection, tasks, history):
+    loaded_at = pd.Timestamp.now().strftime(DATE_FORMAT)
+    for table, column in [('tasks', tasks['update_date']), ('history', history['history_date'])]:
+        connection.execute(
+            """
+            INSERT INTO ingest_state (table_name, watermark, loaded_at) VALUES (?, ?, ?)
+            ON CONFLICT(table_name) DO UPDATE SET
+                watermark = MAX(COALESCE(watermark, ''), COALESCE(excluded.watermark, '')),
+                loaded_at = excluded.loaded_at
+            """,
+            (table, column.max() if column.notna().any() else None, loaded_at),
+        )
+
+
+def stored_hashes(connection, table, key):
+    hashes = pd.read_sql_query(f"SELECT {key}, row_hash FROM {table}", connection).set_index(key)['row_hash']
+    # Int64: отсутствующий ключ - NA, а не float, теряющий младшие биты хэша
+    return hashes.astype('Int64')
+
+
+def changed(hashes, previous):
+    """Строки без сохранённого хэша или с другим хэшем"""
+    return (previous != hashes).fillna(True).to_numpy(dtype=bool)
+
+
+def ingest_incremental(tasks_path, history_path, sprints_path, db_path=DB_PATH):
+    """Дозагрузка новой выгрузки: изменённые задачи, новые строки истории, изменённые спринты.
+
+    update_date и history_date только растут, поэтому задачи старше отметки
+    tasks не сравниваются вовсе, а история дописывается только после отметки
+    history (строки ровно на отметке сверяются по хэшу). Возвращает счётчики
+    и номера спринтов, метрики которых нужно пересчитать.
+    """
+    tasks = prepare_tasks(read_export(tasks_path))
+    history = prepare_history(read_export(history_path))
+    sprints, links = prepare_sprints(read_export(sprints_path))
+
+    with closing(connect(db_path)) as connection:
+        with connection:
+            watermarks = dict(connection.execute("SELECT table_name, watermark FROM ingest_state"))
+
+            # задачи: новые и изменённые после отметки, по хэшу содержимого
+            known = stored_hashes(connection, 'tasks', 'entity_id')
+            candidates = tasks
+            if watermarks.get('tasks'):
+                candidates = tasks[
+                    ~tasks['entity_id'].isin(known.index)
+                    | tasks['update_date'].isna()
+                    | (tasks['update_date'] >= watermarks['tasks'])
+                ]
+            changed_tasks = candidates[changed(candidates['row_hash'], candidates['entity_id'].map(known))]
+            columns = TASK_COLUMNS + ['row_hash']
+            connection.executemany(
+                f"""
+                INSERT INTO tasks ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})
+                ON CONFLICT(entity_id) DO UPDATE SET
+                {', '.join(f'{column} = excluded.{column}' for column in columns[1:])}
+                """,
+                to_rows(changed_tasks[columns]),
+            )
+
+            # история: только строки после отметки и незагруженные строки на ней
+            history_mark = watermarks.get('history')
+            if history_mark:
+                boundary = pd.read_sql_query(
+                    "SELECT row_hash FROM history WHERE history_date = ? OR history_date IS NULL",
+                    connection, params=(history_mark,),
+                )['row_hash']
+                at_mark = history['history_date'].isna() | (history['history_date'] == history_mark)
+                new_history = history[(history['history_date'] > history_mark) | (at_mark & ~history['row_hash'].isin(boundary))]
+            else:
+                new_history = history
+            insert(connection, 'history', HISTORY_COLUMNS + ['row_hash'], new_history)
+
+            # спринты маленькие: при любом изменении заменяются целиком
+            stored = stored_hashes(connection, 'sprints', 'sprint_id')
+            changed_sprints = set(sprints.loc[changed(sprints['row_hash'], sprints['sprint_id'].map(stored)), 'sprint_id'])
+            replace_sprints = bool(changed_sprints) or len(stored) != len(sprints)
+            if replace_sprints:
+                connection.execute("DELETE FROM sprint_tasks")
+                connection.execute("DELETE FROM sprints")
+                insert(connection, 'sprints', SPRINT_COLUMNS + ['row_hash'], sprints)
+                insert(connection, 'sprint_tasks', ['sprint_id', 'entity_id'], links)
+            save_watermarks(connection, tasks, history)
+            # та же выгрузка повторно версию не меняет
+            if len(changed_tasks) or len(new_history) or replace_sprints:
+                bump_data_version(connection)
+
+    touched = set(changed_tasks['entity_id']) | set(new_history['entity_id'])
+    affected = changed_sprints | set(links.loc[links['entity_id'].isin(touched), 'sprint_id'])
+    # задача могла выйти из спринта, в который не входит по Sprints.entity_ids
+    mentioned = set(scope_changes(new_history)['sprint_name'])
+    affected |= set(sprints.loc[sprints['sprint_name'].isin(mentioned), 'sprint_id'])
+    return {
+        'tasks': len(changed_tasks),
+        'history': len(new_history),
+        'sprints': len(changed_sprints),
+        'affected_sprints': sorted(int(sprint_id) for sprint_id in affected),
+    }
+
+
+def database_version(db_path=DB_PATH):
+    """Версия данных для кэша метрик и ответов: id базы и номер последней загрузки.
+
+    Берётся из самой базы, а не из файлов: Agile.db-wal появляется и
+    меняется от любого открытого соединения, а данные при этом те же.
+    """
+    if not os.path.exists(db_path):
+        return dataset_version([db_path])
+    with closing(connect_readonly(db_path)) as connection:
+        database_id, generation = connection.execute(
+            "SELECT database_id, generation FROM data_version WHERE id = 1"
+        ).fetchone()
+    return hashlib.sha256(f"{database_id}:{generation}".encode()).hexdigest()
+
+
+class VersionCache:
+    """database_version в памяти процесса.
+
+    Перечитывается после invalidate() (загрузка через этот процесс) или когда
+    меняются размер/mtime/inode файлов базы (загрузка из другого процесса).
+    """
+
+    def __init__(self):
+        self._entries = {} # путь -> (подпись файлов, версия)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _signature(db_path):
+        signature = []
+        for path in (db_path, db_path + "-wal"):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                signature.append(None)
+                continue
+            # пустой -wal оставляет любое соединение только на чтение
+            signature.append((stat.st_size, stat.st_mtime_ns, stat.st_ino) if stat.st_size else None)
+        return tuple(signature)
+
+    def cached(self, db_path=DB_PATH):
+        """Версия без обращения к базе или None, если её нужно перечитать"""
+        entry = self._entries.get(db_path)
+        if entry is not None and entry[0] == self._signature(db_path):
+            return entry[1]
+        return None
+
+    def get(self, db_path=DB_PATH):
+        version = self.cached(db_path)
+        if version is None:
+            with self._lock:
+                signature = self._signature(db_path)
+                version = database_version(db_path)
+                self._entries[db_path] = (signature, version)
+        return version
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def load_sprint_frames(sprint_ids, db_path=DB_PATH):
+    """Данные для пересчёта метрик отдельных спринтов: их задачи, история этих задач
+    и все изменения поля «Спринт» (задача могла выйти из спринта)"""
+    sprint_ids = [int(sprint_id) for sprint_id in sprint_ids]
+    in_sprints = f"sprint_id IN ({', '.join('?' * len(sprint_ids))})"
+    members = f"entity_id IN (SELECT entity_id FROM sprint_tasks WHERE {in_sprints})"
+    with closing(connect_readonly(db_path)) as connection:
+        return (
+            compact(pd.read_sql_query(f"SELECT * FROM tasks WHERE {members}", connection, params=sprint_ids)),
+            compact(pd.read_sql_query(
+                f"SELECT * FROM history WHERE {members} OR history_property_name = 'Спринт'",
+                connection, params=sprint_ids,
+            )),
+            compact(pd.read_sql_query(
+                f"SELECT * FROM sprints WHERE {in_sprints} ORDER BY sprint_id", connection, params=sprint_ids
+            )),
+            pd.read_sql_query(
+                f"SELECT s.sprint_name, st.entity_id FROM sprint_tasks st JOIN sprints s USING (sprint_id) WHERE st.{in_sprints}",
+                connection, params=sprint_ids,
+            ),
+        )
+
+
+def refresh_metrics(sprint_ids, db_path=DB_PATH, metrics_dir=METRICS_DIR):
+    """Пересчитывает метрики только указанных спринтов, остальные берутся из прошлой версии"""
+    store = SprintMetricsStore(metrics_dir)
+    names = query("SELECT sprint_name FROM sprints ORDER BY sprint_id", db_path=db_path)['sprint_name'].tolist()
+    updated = compute_sprint_metrics(*load_sprint_frames(sprint_ids, db_path)) if sprint_ids else {}
+    version = database_version(db_path)
+    if store.update(version, updated, names) is None:
+        # прошлой версии нет - полный расчёт
+        store.get(version, lambda: load_frames(db_path))
+    return version
+
+
+def query(sql, params=(), db_path=DB_PATH):
+    with closing(connect_readonly(db_path)) as connection:
+        return pd.read_sql_query(sql, connection, params=params)
+
+
+def sprint_history(sprint_id, date_start, date_end, db_path=DB_PATH):
+    """Строки истории задач спринта за период вместе с полями задачи (по индексам)"""
+    return query(
+        """
+        SELECT h.*, t.status, t.estimation, t.spent, t.assignee
+        FROM sprint_tasks st
+        JOIN history h ON h.entity_id = st.entity_id AND h.history_date BETWEEN ? AND ?
+        JOIN tasks t ON t.entity_id = st.entity_id
+        WHERE st.sprint_id = ?
+        """,
+        (pd.Timestamp(date_start).strftime(DATE_FORMAT), pd.Timestamp(date_end).strftime(DATE_FORMAT), sprint_id),
+        db_path,
+    )
+
+
+def sprints_history(db_path=DB_PATH):
+    """История задач всех спринтов с полями задачи, упорядоченная по (спринт, дата)"""
+    return compact(query(
+        """
+        SELECT st.sprint_id, h.*, t.status, t.estimation, t.spent, t.assignee
+        FROM sprint_tasks st
+        JOIN history h ON h.entity_id = st.entity_id
+        JOIN tasks t ON t.entity_id = st.entity_id
+        WHERE h.history_date IS NOT NULL
+        ORDER BY st.sprint_id, h.history_date
+        """,
+        db_path=db_path,
+    ))
+
+
+def sprint_tasks(sprint_ids=None, db_path=DB_PATH):
+    """Задачи спринтов (всех, если sprint_ids не указан) с номером спринта"""
+    sql = "SELECT st.sprint_id, t.* FROM sprint_tasks st JOIN tasks t ON t.entity_id = st.entity_id"
+    if sprint_ids is None:
+        return compact(query(sql, db_path=db_path))
+    sprint_ids = [int(sprint_id) for sprint_id in sprint_ids]
+    return compact(query(f"{sql} WHERE st.sprint_id IN ({', '.join('?' * len(sprint_ids))})", sprint_ids, db_path))
+
+
+def tasks_by_ids(entity_ids, db_path=DB_PATH):
+    ids = sorted({int(entity_id) for entity_id in entity_ids})
+    with closing(connect_readonly(db_path)) as connection:
+        connection.execute("CREATE TEMP TABLE wanted (entity_id INTEGER PRIMARY KEY)")
+        connection.executemany("INSERT INTO wanted VALUES (?)", ((entity_id,) for entity_id in ids))
+        return compact(pd.read_sql_query(
+            "SELECT t.* FROM tasks t JOIN wanted w ON w.entity_id = t.entity_id", connection
+        ))
+
+
+def load_frames(db_path=DB_PATH):
+    """Таблицы базы для расчёта метрик: задачи, история, спринты и состав спринтов"""
+    with closing(connect_readonly(db_path)) as connection:
+        return (
+            compact(pd.read_sql_query("SELECT * FROM tasks", connection)),
+            compact(pd.read_sql_query("SELECT * FROM history", connection)),
+            compact(pd.read_sql_query("SELECT * FROM sprints ORDER BY sprint_id", connection)),
+            pd.read_sql_query(
+                "SELECT s.sprint_name, st.entity_id FROM sprint_tasks st JOIN sprints s USING (sprint_id)",
+                connection,
+            ),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Загрузка выгрузок Tasks/History/Sprints в Agile.db")
+    parser.add_argument("tasks")
+    parser.add_argument("history")
+    parser.add_argument("sprints")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--incremental", action="store_true",
+                        help="дозагрузить изменения и пересчитать метрики затронутых спринтов")
+    args = parser.parse_args()
+    if args.incremental:
+        result = ingest_incremental(args.tasks, args.history, args.sprints, args.db)
+        print(result)
+        refresh_metrics(result['affected_sprints'], args.db, os.path.join(os.path.dirname(args.db), "metrics"))
+    else:
+        print(ingest(args.tasks, args.history, args.sprints, args.db))
@@ -1,5 +1,16 @@
 import csv
 import os
+from array import array
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.membership import parse_entity_ids
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+NO_TIMESTAMP = np.iinfo(np.int64).min # так numpy хранит NaT
 
 class DateTime:
     def __init__(self) -> None:
@@ -15,7 +26,6 @@ class DateTime:
         t_datetime = datetime.split(' ')
         t_date = [t_datetime[0].split('/')[2], t_datetime[0].split('/')[1], t_datetime[0].split('/')[0]] if '/' in t_datetime[0] else t_datetime[0].split('-')
         t_time = t_datetime[1].split(':') if len(t_datetime)>1 else []
-        print(t_date)
         self.year = 0 if len(t_date)<1 else (int(t_date[0]) if(len(t_date[0])==4) else "20" + t_date[0])
         self.month = 0 if len(t_date)<2 else int(t_date[1])
         self.day = 0 if len(t_date)<3 else int(t_date[2])
@@ -23,7 +33,6 @@ class DateTime:
         self.minute = 0 if len(t_time)<2 else int(t_date[1])
         self.second = 0 if len(t_time)<3 else int(t_time[2].split('.')[0])
         self.m_second = 0 if len(t_time)<3 else int(t_time[2].split('.')[1])
-        print(self.get_date())
 
     def get_date(self, delimiter='/'):
         return f"{self.year}{delimiter}{self.month}{delimiter}{self.day}"
@@ -54,6 +63,13 @@ class DataConnection:
         self.tasks = []
         self.history = []
         self.sprints = []
+        # индексы строятся один раз в open_files
+        self.tasks_by_id = {} # entity_id -> строка задачи
+        self.history_by_id = {} # entity_id -> array('q') номеров строк истории
+        self.sprint_tasks = parse_entity_ids([]) # состав спринтов: CSR (offsets + id задач)
+        self.history_us = np.empty(0, dtype=np.int64) # history_date строк истории, мкс от эпохи
+        self.history_sorted_us = np.empty(0, dtype=np.int64) # те же метки по возрастанию
+        self.history_order = np.empty(0, dtype=np.intp) # номера строк в порядке history_sorted_us
 
 
     def open_files(self):
@@ -63,24 +79,100 @@ class DataConnection:
                 self.data[os.path.basename(self.files[file_id])] = [row for row in reader]
         self.tasks = [row for row in self.data["Tasks.csv"][1:]]
         self.history = [row for row in self.data["History.csv"][1:]]
-        self.sprints = [row for row in self.data["Sprints.csv"][1:]]        
+        self.sprints = [row for row in self.data["Sprints.csv"][1:]]
+        self.build_indexes()
+
+    def build_indexes(self):
+        self.tasks_by_id = {}
+        for task in self.tasks:
+            entity_id = parse_entity_id(task["entity_id"])
+            if entity_id is not None:
+                # как и раньше, при повторах берётся первая строка
+                self.tasks_by_id.setdefault(entity_id, task)
+
+        history_by_id = defaultdict(lambda: array('q'))
+        for row_number, item in enumerate(self.history):
+            entity_id = parse_entity_id(item["entity_id"])
+            if entity_id is not None:
+                history_by_id[entity_id].append(row_number)
+        self.history_by_id = dict(history_by_id)
+
+        # даты истории разбираются один раз, окно спринта - два бинарных поиска
+        self.history_us = parse_timestamps_us([item["history_date"] for item in self.history])
+        dated_rows = np.flatnonzero(self.history_us != NO_TIMESTAMP)
+        self.history_order = dated_rows[np.argsort(self.history_us[dated_rows], kind='stable')]
+        self.history_sorted_us = self.history_us[self.history_order]
+
+        self.sprint_tasks = parse_entity_ids(sprint["entity_ids"] for sprint in self.sprints)
 
     def get_by_id(self, obj_id, attr):
+        if attr == "tasks":
+            return self.tasks_by_id[obj_id]
+        if attr == "history":
+            return self.history[self.history_by_id[obj_id][0]]
         return list(filter(lambda item: int(item["entity_id"]) == obj_id, getattr(self, attr)))[0]
 
     def get_sprint_tasks(self, sprint_id):
-        task_list = [task_id for task_id in list(map(int, self.sprints[sprint_id]["entity_ids"][1:-1].split(',')))]
-        tasks = [self.get_by_id(task_id, "tasks") for task_id in task_list]
-        return tasks
+        task_ids = self.sprint_tasks.tasks(sprint_id).tolist()
+        return [self.tasks_by_id[task_id] for task_id in task_ids if task_id in self.tasks_by_id]
     
-    def get_history_for_sprint(self, sprint_id):
+    def sprint_window_us(self, sprint_id):
         sprint = self.sprints[sprint_id]
-        dates = [DateTime(sprint["sprint_start_date"]), DateTime(sprint["sprint_end_date"])]
-        history_clear_list = list(filter(lambda item: item["history_date"] is not None, getattr(self, 'history')))
-        #print(history_clear_list[0]["history_date"])
-        history_list = list(filter(lambda item: (dates[0].compare(DateTime(item["history_date"])) == -1 and dates[1].compare(DateTime(item["history_date"])) == 1), history_clear_list))
-        print(len(history_list))
-        return history_list
+        return parse_timestamp_us(sprint["sprint_start_date"]), parse_timestamp_us(sprint["sprint_end_date"])
+
+    def get_history_for_sprints(self, sprint_ids):
+        """История каждого спринта (строго между началом и концом) в порядке времени"""
+        windows = [self.sprint_window_us(sprint_id) for sprint_id in sprint_ids]
+        # у спринта без дат пустое окно (0, 0)
+        windows = np.array([window if None not in window else (0, 0) for window in windows], dtype=np.int64).reshape(-1, 2)
+        starts = np.searchsorted(self.history_sorted_us, windows[:, 0], side='right')
+        ends = np.searchsorted(self.history_sorted_us, windows[:, 1], side='left')
+        return [[self.history[row] for row in self.history_order[start:end]] for start, end in zip(starts, ends)]
+
+    def get_history_for_sprint(self, sprint_id):
+        return self.get_history_for_sprints([sprint_id])[0]
 
     def get_history_for_sprint_task(self, sprint_id, task_id):
-        pass
+        if not self.sprint_tasks.contains(sprint_id, task_id):
+            return []
+        start, end = self.sprint_window_us(sprint_id)
+        if start is None or end is None:
+            return []
+        rows = np.frombuffer(self.history_by_id.get(task_id, array('q')), dtype=np.int64)
+        times = self.history_us[rows]
+        return [self.history[row] for row in rows[(times > start) & (times < end)]]
+
+
+def parse_entity_id(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_timestamp_us(value):
+    """'2024-07-03 19:00:00.000000' или '3/7/24 19:00' (день/месяц/год) -> мкс от эпохи"""
+    value = (value or '').strip()
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        date_part, _, time_part = value.partition(' ')
+        try:
+            day, month, year = map(int, date_part.split('/'))
+            hour, minute, second = (time_part.split(':') + ['0', '0', '0'])[:3] if time_part else ('0', '0', '0')
+            moment = datetime(year + 2000 if year < 100 else year, month, day, int(hour), int(minute)) + timedelta(seconds=float(second))
+        except ValueError:
+            return None
+    return (moment - EPOCH) // ONE_MICROSECOND
+
+
+def parse_timestamps_us(values):
+    """Разбор столбца дат в int64; пропуски и мусор -> NO_TIMESTAMP"""
+    try:
+        # ISO-даты numpy разбирает целым массивом
+        return np.array([value or None for value in values], dtype='datetime64[us]').astype(np.int64)
+    except ValueError:
+        parsed = (parse_timestamp_us(value) for value in values)
+        return np.fromiter((NO_TIMESTAMP if value is None else value for value in parsed), dtype=np.int64, count=len(values))
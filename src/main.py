@@ -1,49 +1,82 @@
-from fastapi import FastAPI, Request, UploadFile
+from contextlib import asynccontextmanager
+from functools import partial
+
+from fastapi import FastAPI, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+import agile_store
 import page_3_data as p3d
-app = FastAPI()
+import upload
+from app.http_cache import ResponseCache
+from app.sprint_metrics import SprintMetricsStore
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # схема готовится один раз при старте, запросы открывают базу только на чтение
+    await run_in_threadpool(agile_store.prepare_database, agile_store.DB_PATH)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+sprint_metrics = SprintMetricsStore(agile_store.METRICS_DIR)
+# версия Agile.db в памяти, сбрасывается после загрузки
+db_version = agile_store.VersionCache()
+# готовые JSON-ответы по (версия Agile.db, тело запроса); ETag для 304
+response_cache = ResponseCache()
+
+
+async def current_version():
+    version = db_version.cached(agile_store.DB_PATH)
+    if version is None:
+        version = await run_in_threadpool(db_version.get, agile_store.DB_PATH)
+    return version
+
 
 # Определение маршрутов
 @app.get("/root/page1")
 async def root(request: Request):
     data = await request.json()
-    return {"sprint": "Спринт 2024.3.6.NPP Shared Sprint",
-            "total_etimate": 146,
-            "real_estimate": 100,
-            "tasks_count": 58,
-            "done_tasks_count": 39,
-            "removed_tasks_count": 10,
-            "backloged_tasks_count": 9,
-            "total_backlog": 39,
-            "total_removed": 26,
-            "change_by_days": {
-                "day1": [47, 0],
-                "day2": [8, 3],
-                "day3": [12, 1],
-                "day4": [3, 5],
-                "day5": [2, 4],
-                "day6": [0, 0],
-                "day7": [0, 0]
-            }}
+    version = await current_version()
+
+    async def compute():
+        metrics = sprint_metrics.cached(version)
+        if metrics is None:
+            metrics = await run_in_threadpool(
+                sprint_metrics.get, version, partial(agile_store.load_frames, agile_store.DB_PATH)
+            )
+        sprint = data.get("sprint")
+        sprint_name = sprint if sprint is not None else next(reversed(metrics), None)
+        if sprint_name not in metrics:
+            raise HTTPException(status_code=404, detail=f"Sprint not found: {sprint}")
+        return metrics[sprint_name]
+
+    return await response_cache.respond(request, "/root/page1", version, data, compute)
 
 @app.post("/root/page3")
 async def main_page(request: Request):
     data = await request.json()
-    return p3d.page_3(data["file"], data["sprint_id"])
+    version = await current_version()
+
+    async def compute():
+        if "sprint_id" in data:
+            # список задач одного спринта
+            return await run_in_threadpool(p3d.page_2, data["sprint_id"], agile_store.DB_PATH)
+        # загрузка всей команды по спринтам (всем, если "sprints" не передан)
+        return await run_in_threadpool(p3d.page_3, data.get("sprints"), agile_store.DB_PATH)
+
+    return await response_cache.respond(request, "/root/page3", version, data, compute)
 
 @app.post("/upload")
-async def uploadfile(files: list[UploadFile]):
-    msg = {}
-    try: 
-        i = 1;
-        for file in files:
-            file_path = f".\\..\\TestData\\{file.filename}"
-            with open(file_path, "wb") as f:
-                f.write(file.file.read())
-            msg[f"file{i}"] = file.filename
-            i+=1
-        return msg
-    except Exception as e:
-        return {"message": e.args}
+async def uploadfile(request: Request):
+    # потоковый разбор тела с проверкой заголовка и лимитов, затем дозагрузка в Agile.db
+    msg = await upload.receive(request)
+    try:
+        msg["ingested"] = await run_in_threadpool(upload.ingest_uploads, agile_store.DB_PATH, agile_store.METRICS_DIR)
+    finally:
+        db_version.invalidate()
+    return msg
 
 
 if __name__ == "__main__":
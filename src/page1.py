@@ -1,60 +1,79 @@
-def page1(data, history_table, sprint_table, number, date_start, date_end):
-
-    data = pd.read_csv(data, skiprows=1, sep=';', encoding='utf-8')
-    history_table = pd.read_csv(history_table, skiprows=1, sep=';', encoding='utf-8')
-    sprint_table = pd.read_csv(sprint_table, skiprows=1, sep=';', encoding='utf-8')
-
-    status_categories = {
-        "К выполнению": ['Создано', 'Готово к разработке', 'Анализ', 'В ожидании', 'Отложен'],
-        "В работе": ['В работе', 'Тестирование', 'Разработка', 'Подтверждение', 'Подтверждение исправления', 'СТ', 'Исправление'],
-        "Сделано": ['Закрыто', 'Выполнено', 'СТ Завершено', 'Отклонен исполнителем', 'Локализация']
-    }
-
-    history_table['history_change'] = history_table['history_change'].fillna('')
-    history_table = history_table.dropna(subset=['entity_id']).reset_index(drop = True)
-    data.loc[:,'rank'] = data['rank'].replace('0|qzzywj:zzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzm','0|qzzywj:')
-    data.drop_duplicates(subset='entity_id')
-    history_table = history_table.drop(columns=['Столбец1','Unnamed: 7'])
-    data['create_date'] = pd.to_datetime(data['create_date'])
-    data['update_date'] = pd.to_datetime(data['update_date'])
-    history_table['history_date'] = pd.to_datetime(history_table['history_date'], errors='coerce')
-
-    sprint_table['sprint_start_date'] = pd.to_datetime(sprint_table['sprint_start_date'], errors='coerce')
-    sprint_table['sprint_end_date'] = pd.to_datetime(sprint_table['sprint_end_date'], errors='coerce')
-    sprint_table['entity_ids'] = sprint_table['entity_ids'].apply(lambda x: eval(x) if isinstance(x, str) else [])
-    sprint_data = sprint_table.explode('entity_ids').rename(columns={'entity_ids': 'entity_id'})
-    sprint_data['entity_id'] = pd.to_numeric(sprint_data['entity_id'], errors='coerce')
-
-    data['create_date'] = pd.to_datetime(data['create_date'], errors='coerce')
-
-    status_distribution = data['status'].value_counts(normalize=True) * 100
-
-    history_table['time_in_status'] = history_table.groupby('entity_id')['history_date'].diff()
-    history_table = history_table.merge(data, on='entity_id', how='inner')
-
-    group = history_table.groupby(['entity_id','status'])['time_in_status'].sum().to_frame()
-    group = group.reset_index()
-
-    def take_info_with_id(i,time_start,time_end):
-        entity_id = i
-        entity_id = take_sprint_id(entity_id)
-        entity_sprint_info = sprint_table[sprint_table['entity_ids'].isin(entity_id)]
-        interval_history = history_table[(history_table['history_date'] >= time_start) & (history_table['history_date'] <= time_end)]
-        interval_history = interval_history[interval_history['entity_id'].isin(entity_id)]
-        interval_history = take_data_interval(interval_history)
-        entity_info = group[group['entity_id'].isin(entity_id)]
-        return  interval_history
-
-    def take_data_interval(interval):
-        group1 = interval.groupby(['estimation'])['spent'].sum().reset_index()
-        total_estimation = group1['estimation'].sum()
-        total_spent = group1['spent'].sum()
-        backlog_df = interval[interval['status'] == 'Отложен'] #Бэклог задачи
-
-        return {'total_estimation': total_estimation,'total_spent':total_spent, 'backlog': len(backlog_df), 'count_normal_task':len(interval)-len(backlog_df)}
-
-    def take_sprint_id(i):
-        sprints_arr = list(sprint_table['entity_ids'][i])
-        return sprints_arr
-
-    return take_info_with_id(number,date_start,date_end)
\ No newline at end of file
+import numpy as np
+import pandas as pd
+
+import agile_store
+
+status_categories = {
+    "К выполнению": ['Создано', 'Готово к разработке', 'Анализ', 'В ожидании', 'Отложен'],
+    "В работе": ['В работе', 'Тестирование', 'Разработка', 'Подтверждение', 'Подтверждение исправления', 'СТ', 'Исправление'],
+    "Сделано": ['Закрыто', 'Выполнено', 'СТ Завершено', 'Отклонен исполнителем', 'Локализация']
+}
+
+
+def page1(number, date_start, date_end, db_path=agile_store.DB_PATH):
+    # история задач спринта за период - индексный запрос к Agile.db вместо разбора CSV
+    interval_history = agile_store.sprint_history(number, date_start, date_end, db_path)
+    return take_data_interval(interval_history)
+
+
+def take_data_interval(interval):
+    group1 = interval.groupby(['estimation'])['spent'].sum().reset_index()
+    total_estimation = group1['estimation'].sum()
+    total_spent = group1['spent'].sum()
+    backlog_df = interval[interval['status'] == 'Отложен'] #Бэклог задачи
+
+    return {'total_estimation': total_estimation,'total_spent':total_spent, 'backlog': len(backlog_df), 'count_normal_task':len(interval)-len(backlog_df)}
+
+
+class SprintAnalytics:
+    """История задач всех спринтов, подготовленная один раз для любого числа запросов page1.
+
+    Строки отсортированы по (спринт, дата), поэтому период спринта - это
+    срез, найденный бинарным поиском, а все запросы считаются одним groupby.
+    """
+
+    def __init__(self, history):
+        history = history.assign(history_date=pd.to_datetime(history['history_date'], format='ISO8601'))
+        self.history = history.sort_values(['sprint_id', 'history_date'], kind='stable').reset_index(drop=True)
+        self.sprint_ids = self.history['sprint_id'].to_numpy()
+        self.dates = self.history['history_date'].to_numpy()
+
+    @classmethod
+    def from_store(cls, db_path=agile_store.DB_PATH):
+        return cls(agile_store.sprints_history(db_path))
+
+    def rows(self, number, date_start, date_end):
+        """Границы строк спринта за период [date_start, date_end]"""
+        first, last = np.searchsorted(self.sprint_ids, number, 'left'), np.searchsorted(self.sprint_ids, number, 'right')
+        dates = self.dates[first:last]
+        return (first + np.searchsorted(dates, np.datetime64(pd.Timestamp(date_start)), 'left'),
+                first + np.searchsorted(dates, np.datetime64(pd.Timestamp(date_end)), 'right'))
+
+    def query(self, queries):
+        """Метрики take_data_interval для списка (номер спринта, начало, конец)"""
+        bounds = [self.rows(*q) for q in queries]
+        lengths = np.array([end - start for start, end in bounds], dtype=np.int64)
+        positions = np.concatenate([np.arange(start, end) for start, end in bounds] or [np.empty(0, np.int64)])
+        selected = self.history.iloc[positions][['estimation', 'spent', 'status']].assign(
+            query=np.repeat(np.arange(len(queries)), lengths)
+        )
+
+        # как в take_data_interval: оценка - сумма различных значений estimation,
+        # затраты - сумма spent по строкам с известной оценкой
+        estimated = selected.dropna(subset=['estimation'])
+        total_estimation = estimated.drop_duplicates(['query', 'estimation']).groupby('query')['estimation'].sum()
+        total_spent = estimated.groupby('query')['spent'].sum()
+        backlog = (selected['status'] == 'Отложен').groupby(selected['query']).sum()
+
+        result = []
+        for index, length in enumerate(lengths):
+            backlog_count = int(backlog.get(index, 0))
+            result.append({'total_estimation': float(total_estimation.get(index, 0)),
+                           'total_spent': float(total_spent.get(index, 0)),
+                           'backlog': backlog_count,
+                           'count_normal_task': int(length) - backlog_count})
+        return result
+
+
+def page1_batch(queries, db_path=agile_store.DB_PATH):
+    return SprintAnalytics.from_store(db_path).query(queries)
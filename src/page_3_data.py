@@ -1,11 +1,29 @@
-def page_2(name_file, id_sprint):
-    sprint_table = pd.read_csv(name_file, sep=';',skiprows=1)
-    data = pd.read_csv(name_file, skiprows=1, sep = ';')
+import numpy as np
 
-    df_sprint = data[data['entity_id'].isin(id_sprint)].reset_index(drop=True)
+import agile_store
 
-    task_chel_pt = df_sprint.pivot_table(index=['assignee'], values=['estimation','spent'], aggfunc='sum')
-    task_chel_pt = task_chel_pt[task_chel_pt['estimation']>0]
+# границы отклонения затрат от оценки, % -> категория
+DEVIATION_BINS = [0, 10, 20, 60]
+DEVIATION_CATEGORIES = [0, 10, 20, 60]
+DEVIATION_OVER = 100
+
+
+def page_2(id_sprint, db_path=agile_store.DB_PATH):
+    # только задачи спринта, выбранные по первичному ключу из Agile.db
+    df_sprint = agile_store.tasks_by_ids(id_sprint, db_path)
+    return to_records(workload(df_sprint.assign(sprint_id=0)))
+
+
+def page_3(sprint_ids=None, db_path=agile_store.DB_PATH):
+    """Загрузка всех исполнителей по каждому спринту: {номер спринта: [...]}"""
+    report = workload(agile_store.sprint_tasks(sprint_ids, db_path))
+    return {int(sprint_id): to_records(rows) for sprint_id, rows in report.groupby('sprint_id', sort=True)}
+
+
+def workload(tasks):
+    """Оценка и затраты (часы) по (спринт, исполнитель) одним groupby"""
+    task_chel_pt = tasks.groupby(['sprint_id', 'assignee'], observed=True)[['estimation', 'spent']].sum()
+    task_chel_pt = task_chel_pt[task_chel_pt['estimation'] > 0]
 
     task_chel_pt['estimation'] = (task_chel_pt['estimation']/3600).round().astype('Int64')
     task_chel_pt['spent'] = (task_chel_pt['spent']/3600).round().astype('Int64')
@@ -14,35 +32,28 @@ def page_2(name_file, id_sprint):
 
     task_chel_pt['procent'] = (((task_chel_pt['spent'] - task_chel_pt['estimation']) / task_chel_pt['estimation']) * 100).round(0)
 
-    def categorize(row):
-        if row['estimation'] == row['stat']:
-            return -1
-        difference = row['spent'] - row['estimation']
-        percentage_diff = (difference / row['estimation']) * 100
-        if abs(percentage_diff) == 0:
-            return 0
-        elif abs(percentage_diff) <= 10:
-            return 10 if percentage_diff > 0 else -10
-        elif abs(percentage_diff) <= 20:
-            return 20 if percentage_diff > 0 else -20
-        elif abs(percentage_diff) <= 60:
-            return 60 if percentage_diff > 0 else -60
-        else:
-            return 100 if percentage_diff > 0 else -100
-        
-    task_chel_pt["Category"] = task_chel_pt.apply(categorize, axis=1)
-
-    task = task_chel_pt.to_numpy()
-    empl = task_chel_pt.index
-    rez = []
-    for i in range(len(task)):
-        newEl = {
-            'assignee':empl[i],
-            'estimation':	task[i][0],
-            'spent':task[i][1],
-            'stat':	task[i][2],
-            'procent':task[i][3],
-            'category':task[i][4]
-        }
-        rez.append(newEl)
-    return rez
\ No newline at end of file
+    task_chel_pt['category'] = categorize(task_chel_pt['estimation'], task_chel_pt['spent'])
+    return task_chel_pt.reset_index()
+
+
+def categorize(estimation, spent):
+    """Категория отклонения затрат от оценки со знаком; -1 - к задачам не приступали"""
+    estimation = estimation.to_numpy(dtype=float)
+    spent = spent.to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentage_diff = (spent - estimation) / estimation * 100
+    magnitude = np.abs(percentage_diff)
+    # (0, 10] -> 10, (10, 20] -> 20, (20, 60] -> 60, больше -> 100
+    bucket = np.searchsorted(DEVIATION_BINS, magnitude, side='left')
+    category = np.append(DEVIATION_CATEGORIES, DEVIATION_OVER)[bucket]
+    category = np.where(percentage_diff > 0, category, -category)
+    # как в построчной версии: оценка == оценка - затраты (NaN в оценке не даёт -1)
+    with np.errstate(invalid='ignore'):
+        not_started = estimation == estimation - spent
+    return np.where(not_started, -1, category)
+
+
+def to_records(report):
+    columns = ['assignee', 'estimation', 'spent', 'stat', 'procent', 'category']
+    report = report[columns].replace([np.inf, -np.inf], np.nan)
+    return report.astype(object).where(report.notna(), None).to_dict('records')
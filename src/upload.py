@@ -0,0 +1,228 @@
+"""Потоковая загрузка выгрузок Tasks/History/Sprints.
+
+Тело multipart разбирается по мере чтения из сокета и каждый файл пишется
+на диск блоками, поэтому память не зависит от размера выгрузки, а
+слишком большая загрузка отклоняется, не будучи прочитанной целиком;
+sha256 и размер считаются по ходу копирования, а заголовок CSV
+проверяется по началу файла - чужой файл отбрасывается сразу. Принятые файлы сохраняются в UPLOAD_DIR в формате выгрузки
+(служебная строка, затем заголовок) и, когда есть все три таблицы,
+дозагружаются в Agile.db.
+"""
+
+import hashlib
+import os
+import uuid
+
+import anyio
+from fastapi import HTTPException
+
+import agile_store
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(os.path.dirname(agile_store.DB_PATH), "uploads"))
+CHUNK_SIZE = 1024 * 1024
+MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_MB", "4096")) * 1024 * 1024
+MAX_TOTAL_BYTES = int(os.getenv("UPLOAD_MAX_TOTAL_MB", "8192")) * 1024 * 1024
+# заголовки частей и границы multipart сверх самих файлов
+MAX_BODY_BYTES = MAX_TOTAL_BYTES + 64 * 1024
+
+TITLE_LINE = b"Table 1\n"
+# таблица определяется по заголовку, а не по имени файла
+EXPORT_COLUMNS = {
+    "Tasks.csv": agile_store.TASK_COLUMNS,
+    "History.csv": agile_store.HISTORY_COLUMNS,
+    "Sprints.csv": ["sprint_name", "sprint_status", "sprint_start_date", "sprint_end_date", "entity_ids"],
+}
+
+
+def detect_table(first_chunk, filename):
+    """Имя таблицы по заголовку и нужна ли служебная строка перед ним"""
+    lines = first_chunk.removeprefix(b"\xef\xbb\xbf").split(b"\n", 2)
+    # служебной строки может не быть (как в TestData)
+    for position, line in enumerate(lines[:2]):
+        if len(lines) <= position + 1:
+            break  # строка не закончилась в первом блоке
+        columns = {column.strip() for column in line.decode("utf-8", "replace").strip().split(";")}
+        for table, required in EXPORT_COLUMNS.items():
+            if set(required) <= columns:
+                return table, position == 0
+    raise HTTPException(status_code=400, detail=f"{filename}: not a Tasks/History/Sprints export (unexpected CSV header)")
+
+
+class UploadPart:
+    """Один файл тела запроса; пишется в UPLOAD_DIR/.<uuid>.part по мере поступления"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.path = os.path.join(UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.table = None
+        # начало файла до определения таблицы
+        self._head = b""
+        self._target = None
+
+    async def write(self, data, total_left):
+        self.size += len(data)
+        if self.size > MAX_FILE_BYTES:
+            raise HTTPException(status_code=413, detail=f"{self.filename}: file is larger than {MAX_FILE_BYTES} bytes")
+        if self.size > total_left:
+            raise HTTPException(status_code=413, detail=f"Upload is larger than {MAX_TOTAL_BYTES} bytes")
+        self.digest.update(data)
+        if self._target is not None:
+            await self._target.write(data)
+            return
+        self._head += data
+        # ждём служебную строку и заголовок целиком, но не дольше одного блока
+        if self._head.count(b"\n") >= 2 or len(self._head) >= CHUNK_SIZE:
+            await self._open()
+
+    async def _open(self):
+        self.table, without_title = detect_table(self._head, self.filename)
+        self._target = await anyio.open_file(self.path, "wb")
+        if without_title:
+            await self._target.write(TITLE_LINE)
+        await self._target.write(self._head)
+        self._head = b""
+
+    async def finish(self):
+        if self._target is None:
+            if not self._head:
+                raise HTTPException(status_code=400, detail=f"{self.filename}: empty file")
+            await self._open()
+        await self._target.aclose()
+
+    async def discard(self):
+        if self._target is not None:
+            await self._target.aclose()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def entry(self):
+        return {"filename": self.filename, "table": self.table, "bytes": self.size, "sha256": self.digest.hexdigest()}
+
+
+class MultipartEvents:
+    """Колбэки парсера multipart; события копятся и разбираются после каждого блока тела"""
+
+    def __init__(self):
+        self.events = []
+        self.finished = False
+        self._header_field = b""
+        self._header_value = b""
+        self._headers = {}
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field_data,
+            "on_header_value": self._header_value_data,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": lambda: self.events.append(("end", None)),
+            "on_end": self._end,
+        }
+
+    def take(self):
+        events, self.events = self.events, []
+        return events
+
+    def _part_begin(self):
+        self._headers = {}
+
+    def _header_field_data(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _header_value_data(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        # поля формы без файла пропускаются
+        filename = options.get(b"filename")
+        self.events.append(("file", filename.decode("utf-8", "replace") if filename is not None else None))
+
+    def _part_data(self, data, start, end):
+        self.events.append(("data", bytes(data[start:end])))
+
+    def _end(self):
+        self.finished = True
+
+
+async def receive(request):
+    """Разбирает multipart-тело по мере чтения, сохраняет выгрузки и возвращает их описание
+
+    Тело не буферизуется целиком: лимиты проверяются по Content-Length до
+    чтения и по каждому пришедшему блоку, таблица - по началу файла.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data upload")
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload is larger than {MAX_TOTAL_BYTES} bytes")
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    events = MultipartEvents()
+    parser = MultipartParser(options[b"boundary"], events.callbacks())
+    saved = {}
+    part = None
+    total = 0
+    received = 0
+    try:
+        async for chunk in request.stream():
+            # без Content-Length (chunked) лимит проверяется по прочитанному
+            received += len(chunk)
+            if received > MAX_BODY_BYTES:
+                raise HTTPException(status_code=413, detail=f"Upload is larger than {MAX_TOTAL_BYTES} bytes")
+            try:
+                parser.write(chunk)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}")
+            for kind, value in events.take():
+                if kind == "file":
+                    part = UploadPart(value) if value is not None else None
+                elif part is None:
+                    continue
+                elif kind == "data":
+                    await part.write(value, MAX_TOTAL_BYTES - total)
+                else:
+                    await part.finish()
+                    if part.table in saved:
+                        raise HTTPException(status_code=400, detail=f"{part.filename}: second {part.table} in one upload")
+                    saved[part.table] = part
+                    total += part.size
+                    part = None
+        if not events.finished:
+            raise HTTPException(status_code=400, detail="Malformed multipart body: unexpected end")
+        if not saved:
+            raise HTTPException(status_code=400, detail="No files in upload")
+    except BaseException:
+        for unfinished in [*saved.values(), part]:
+            if unfinished is not None:
+                await unfinished.discard()
+        raise
+
+    # файлы подменяются только после того, как приняты все
+    for table, accepted in saved.items():
+        os.replace(accepted.path, os.path.join(UPLOAD_DIR, table))
+    return {f"file{i}": accepted.entry() for i, accepted in enumerate(saved.values(), 1)}
+
+
+def ingest_uploads(db_path=agile_store.DB_PATH, metrics_dir=agile_store.METRICS_DIR):
+    """Дозагрузка последних выгрузок в базу и пересчёт затронутых спринтов; None, если таблиц не хватает"""
+    paths = [os.path.join(UPLOAD_DIR, table) for table in EXPORT_COLUMNS]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    result = agile_store.ingest_incremental(*paths, db_path)
+    agile_store.refresh_metrics(result['affected_sprints'], db_path, metrics_dir)
+    return result
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT_DIR, "src"), os.path.join(ROOT_DIR, "api"), os.path.join(ROOT_DIR, "bench")]
+
+import generate  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def dataset(tmp_path_factory):
+    """Небольшой синтетический набор: Tasks/History/Sprints.csv в формате выгрузки и dataset.zip"""
+    out_dir = str(tmp_path_factory.mktemp("dataset"))
+    generate.generate(out_dir, 3000, seed=7, duplicates=0.05)
+    return out_dir
+
+
+@pytest.fixture(scope="session")
+def exports(dataset):
+    return [os.path.join(dataset, name) for name in generate.DATASET_FILES]
+
+
+@pytest.fixture(scope="session")
+def api_main(tmp_path_factory):
+    """app.main API; ./data модуля создаётся во временной папке, а не в репозитории"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("api"))
+    try:
+        import app.main
+    finally:
+        os.chdir(cwd)
+    return app.main
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+import pytest
+
+import agile_store
+import generate
+
+
+def table(db_path, name, order):
+    return agile_store.query(f"SELECT * FROM {name} ORDER BY {order}", db_path=db_path).drop(columns="row_hash", errors="ignore")
+
+
+def updated_exports(exports, out_dir):
+    """Следующая выгрузка: часть задач изменилась, история дописана после отметки"""
+    tasks_path, history_path, sprints_path = exports
+    tasks = pd.read_csv(tasks_path, sep=";", skiprows=1)
+    history = pd.read_csv(history_path, sep=";", skiprows=1, keep_default_na=False, dtype=str)
+    changed = tasks["entity_id"].isin(tasks["entity_id"].drop_duplicates().iloc[:20])
+    tasks.loc[changed, "status"] = "Закрыто"
+    tasks.loc[changed, "update_date"] = "2030-01-01 10:00:00.000000"
+    appended = history.iloc[:15].copy()
+    appended["history_date"] = "2030-01-02 10:00:00.000000"
+    appended["history_change"] = "В работе -> Закрыто"
+
+    paths = [os.path.join(out_dir, name) for name in generate.DATASET_FILES]
+    generate.write_table(tasks, paths[0])
+    generate.write_table(pd.concat([history, appended]), paths[1])
+    with open(sprints_path, encoding="utf-8") as src, open(paths[2], "w", encoding="utf-8") as dst:
+        dst.write(src.read())
+    return paths
+
+
+def test_incremental_ingest_matches_full_ingest(exports, tmp_path):
+    updated = updated_exports(exports, str(tmp_path))
+    full = str(tmp_path / "full.db")
+    incremental = str(tmp_path / "incremental.db")
+    agile_store.ingest(*updated, full)
+    agile_store.ingest(*exports, incremental)
+    result = agile_store.ingest_incremental(*updated, incremental)
+
+    assert result["tasks"] == 20
+    assert result["history"] == 15
+    assert result["affected_sprints"]
+    for name, order in [("tasks", "entity_id"), ("sprints", "sprint_id"), ("sprint_tasks", "sprint_id, entity_id")]:
+        pd.testing.assert_frame_equal(table(full, name, order), table(incremental, name, order))
+    order = "entity_id, history_date, history_property_name, history_change, history_version"
+    pd.testing.assert_frame_equal(table(full, "history", order), table(incremental, "history", order))
+
+
+def test_version_ignores_open_connections(exports, tmp_path):
+    db_path = str(tmp_path / "Agile.db")
+    agile_store.ingest(*exports, db_path)
+    version = agile_store.database_version(db_path)
+
+    # открытое соединение в режиме WAL создаёт и меняет Agile.db-wal
+    with closing(sqlite3.connect(db_path)) as reader:
+        reader.execute("PRAGMA journal_mode=WAL")
+        reader.execute("SELECT COUNT(*) FROM tasks").fetchone()
+        assert os.path.exists(db_path + "-wal")
+        assert agile_store.database_version(db_path) == version
+        agile_store.load_frames(db_path)
+        assert agile_store.database_version(db_path) == version
+    assert agile_store.database_version(db_path) == version
+
+
+def test_version_changes_with_ingested_data(exports, tmp_path):
+    db_path = str(tmp_path / "Agile.db")
+    agile_store.ingest(*exports, db_path)
+    first = agile_store.database_version(db_path)
+
+    # та же выгрузка ещё раз - данные те же
+    agile_store.ingest_incremental(*exports, db_path)
+    assert agile_store.database_version(db_path) == first
+
+    agile_store.ingest_incremental(*updated_exports(exports, str(tmp_path)), db_path)
+    second = agile_store.database_version(db_path)
+    assert second != first
+
+    # полная перезаливка тоже новая версия, даже с прежними данными
+    agile_store.ingest(*exports, db_path)
+    assert agile_store.database_version(db_path) not in (first, second)
+
+
+def test_queries_open_the_database_read_only(exports, tmp_path, monkeypatch):
+    db_path = str(tmp_path / "Agile.db")
+    agile_store.ingest(*exports, db_path)
+    version = agile_store.database_version(db_path)
+
+    # запросы не должны ни создавать схему, ни писать в базу
+    def no_setup(db_path):
+        raise AssertionError("schema setup on a query path")
+
+    monkeypatch.setattr(agile_store, "connect", no_setup)
+    assert agile_store.database_version(db_path) == version
+    tasks, history, sprints, membership = agile_store.load_frames(db_path)
+    assert len(agile_store.tasks_by_ids(tasks["entity_id"].iloc[:5], db_path)) == 5
+    assert len(agile_store.load_sprint_frames([0], db_path)[2]) == 1
+    with closing(agile_store.connect_readonly(db_path)) as connection:
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            connection.execute("CREATE TABLE scratch (x)")
+
+
+def test_prepare_database_upgrades_old_schema(tmp_path):
+    db_path = str(tmp_path / "Agile.db")
+    # база до row_hash и счётчика загрузок
+    with closing(sqlite3.connect(db_path)) as connection:
+        connection.execute("CREATE TABLE tasks (entity_id INTEGER PRIMARY KEY, name TEXT)")
+    agile_store.prepare_database(db_path)
+    agile_store.prepare_database(db_path)
+
+    columns = agile_store.query("PRAGMA table_info(tasks)", db_path=db_path)["name"].tolist()
+    assert "row_hash" in columns
+    assert agile_store.database_version(db_path) == agile_store.database_version(db_path)
+    agile_store.prepare_database(str(tmp_path / "missing.db"))
+    assert not os.path.exists(tmp_path / "missing.db")
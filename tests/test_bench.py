@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+from conftest import ROOT_DIR
+
+BENCH_DIR = os.path.join(ROOT_DIR, "bench")
+
+
+def run_script(name, *args, cwd):
+    completed = subprocess.run(
+        [sys.executable, os.path.join(BENCH_DIR, name), *args],
+        cwd=cwd, capture_output=True, text=True, timeout=600,
+    )
+    assert completed.returncode == 0, completed.stderr
+    return completed
+
+
+@pytest.fixture(scope="module")
+def bench_data(tmp_path_factory):
+    """Набор bench/generate.py в каталоге, где его ищет bench/run.py"""
+    data_dir = tmp_path_factory.mktemp("bench") / "data"
+    out_dir = data_dir / "history_1000_seed_0"
+    completed = run_script("generate.py", str(out_dir), "--history-rows", "1000", "--plain", cwd=str(data_dir.parent))
+    return data_dir, out_dir, json.loads(completed.stdout)
+
+
+def test_generate_smoke(bench_data):
+    _, out_dir, meta = bench_data
+    names = ["Tasks.csv", "History.csv", "Sprints.csv"]
+    assert meta["history_rows"] >= 1000
+    assert json.loads((out_dir / "meta.json").read_text(encoding="utf-8")) == meta
+    assert sorted(meta["bytes"]) == sorted(names)
+    for name in names:
+        with open(out_dir / name, encoding="utf-8") as f:
+            assert ";" in f.readlines()[1]
+        # в plain/ та же таблица без служебной строки
+        assert (out_dir / "plain" / name).read_text(encoding="utf-8") == (
+            "".join((out_dir / name).read_text(encoding="utf-8").splitlines(keepends=True)[1:])
+        )
+    with zipfile.ZipFile(out_dir / "dataset.zip") as zf:
+        assert sorted(zf.namelist()) == sorted(names)
+
+
+def test_run_smoke(bench_data, tmp_path):
+    data_dir, _, meta = bench_data
+    out = tmp_path / "results.json"
+    run_script(
+        "run.py", "--scales", "1000", "--repeat", "1", "--data-dir", str(data_dir), "--out", str(out),
+        cwd=str(tmp_path),
+    )
+    report = json.loads(out.read_text(encoding="utf-8"))
+    assert report["meta"]["repeat"] == 1
+    [scale] = report["scales"]
+    assert scale["history_rows"] == 1000
+    # набор взят готовый, а не создан заново
+    assert scale["dataset"] == meta
+    cases = {entry["case"] for entry in scale["results"]}
+    for prefix in ("process_csv_files_in_zip", "agile_store.ingest", "DataConnection.", "sprint_metrics."):
+        assert any(case.startswith(prefix) for case in cases), prefix
+    for entry in scale["results"]:
+        assert len(entry["runs"]) == 1
+        assert entry["seconds"]["min"] >= 0 and entry["peak_bytes"] > 0
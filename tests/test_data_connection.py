@@ -0,0 +1,164 @@
+import csv
+import os
+
+import pandas as pd
+import pytest
+
+from app.frames import to_datetime
+from data_connection import DataConnection
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TestData")
+
+
+def read_rows(path):
+    """Строки выгрузки как в DataConnection (csv.DictReader, ';') и та же таблица в pandas"""
+    with open(path, encoding="utf-8") as f:
+        skiprows = 0 if f.readline().startswith(("entity_id", "sprint_name")) else 1
+    with open(path, encoding="utf-8", newline="") as f:
+        for _ in range(skiprows):
+            f.readline()
+        rows = list(csv.DictReader(f, delimiter=";"))
+    frame = pd.read_csv(path, sep=";", skiprows=skiprows, dtype=str, keep_default_na=False)
+    assert len(frame) == len(rows)
+    return rows, frame
+
+
+def indexed(tasks_path, sprints_path, history_path=None):
+    connection = DataConnection([])
+    frames = {}
+    for attr, path in [("tasks", tasks_path), ("sprints", sprints_path), ("history", history_path)]:
+        if path is None:
+            frames[attr] = pd.DataFrame({"entity_id": pd.Series(dtype=str), "history_date": pd.Series(dtype=str)})
+            continue
+        rows, frames[attr] = read_rows(path)
+        setattr(connection, attr, rows)
+    connection.build_indexes()
+    return connection, frames
+
+
+@pytest.fixture(scope="module", params=["TestData", "generated"])
+def indexed_data(request, dataset):
+    if request.param == "TestData":
+        # в TestData нет History.csv
+        return indexed(os.path.join(TEST_DATA, "Tasks.csv"), os.path.join(TEST_DATA, "Sprints.csv"))
+    return indexed(*(os.path.join(dataset, name) for name in ["Tasks.csv", "Sprints.csv", "History.csv"]))
+
+
+def entity_ids(frame):
+    return pd.to_numeric(frame["entity_id"], errors="coerce")
+
+
+def test_tasks_by_id_matches_pandas(indexed_data):
+    connection, frames = indexed_data
+    ids = entity_ids(frames["tasks"])
+    first = ids[ids.notna()].drop_duplicates(keep="first")
+    assert set(connection.tasks_by_id) == set(first.astype("int64"))
+    for position, entity_id in first.astype("int64").items():
+        assert connection.tasks_by_id[entity_id] is connection.tasks[position]
+        assert connection.get_by_id(entity_id, "tasks")["name"] == frames["tasks"].at[position, "name"]
+
+
+def test_history_by_id_matches_pandas(indexed_data):
+    connection, frames = indexed_data
+    ids = entity_ids(frames["history"])
+    expected = {int(entity_id): rows.index.tolist() for entity_id, rows in ids[ids.notna()].groupby(ids)}
+    assert {entity_id: rows.tolist() for entity_id, rows in connection.history_by_id.items()} == expected
+    for entity_id, rows in list(expected.items())[:50]:
+        assert connection.get_by_id(entity_id, "history") is connection.history[rows[0]]
+
+
+def test_sprint_membership_matches_pandas(indexed_data):
+    connection, frames = indexed_data
+    cells = frames["sprints"]["entity_ids"].str.strip("{}").str.split(",")
+    expected = [[int(value) for value in cell if value.strip()] for cell in cells]
+    membership = connection.sprint_tasks
+    assert len(membership) == len(expected)
+    assert [membership.tasks(sprint).tolist() for sprint in range(len(membership))] == expected
+    assert membership.offsets[-1] == sum(map(len, expected))
+
+    ids = entity_ids(frames["tasks"])
+    first_row = ids[ids.notna()].drop_duplicates(keep="first")
+    first_row = pd.Series(first_row.index, index=first_row.astype("int64"))
+    for sprint, task_ids in enumerate(expected):
+        # задачи спринта в порядке entity_ids, при повторах id - первая строка
+        wanted = first_row.reindex(task_ids).dropna().astype("int64")
+        assert connection.get_sprint_tasks(sprint) == [connection.tasks[position] for position in wanted]
+        assert connection.sprint_tasks.contains(sprint, task_ids).all()
+
+
+def old_history_for_sprint(connection, sprint_id):
+    """Прежний фильтр одного спринта: все строки истории строго между началом и концом.
+
+    DateTime.compare сравнивает поля по алфавиту (день раньше года), поэтому
+    даты здесь разбираются pandas; порядок - по времени, как у индекса.
+    """
+    sprint = connection.sprints[sprint_id]
+    start, end = to_datetime(pd.Series([sprint["sprint_start_date"], sprint["sprint_end_date"]], dtype=object))
+    dates = to_datetime(pd.Series([item["history_date"] or None for item in connection.history], dtype=object))
+    inside = dates[(dates > start) & (dates < end)].sort_values(kind="stable")
+    return [connection.history[row] for row in inside.index]
+
+
+def history_row(entity_id, date):
+    return {"entity_id": str(entity_id), "history_date": date, "history_property_name": "Статус"}
+
+
+@pytest.fixture
+def windowed():
+    connection = DataConnection([])
+    connection.sprints = [
+        {"sprint_start_date": "2024-07-03 19:00:00.000000", "sprint_end_date": "2024-07-16 19:00:00.000000", "entity_ids": "{1,2}"},
+        # без истории в окне
+        {"sprint_start_date": "2030-01-01 00:00:00.000000", "sprint_end_date": "2030-01-14 00:00:00.000000", "entity_ids": "{}"},
+        # без дат
+        {"sprint_start_date": "", "sprint_end_date": "", "entity_ids": "{3}"},
+        # окно короче секунды
+        {"sprint_start_date": "2024-07-10 12:00:00.000000", "sprint_end_date": "2024-07-10 12:00:00.500000", "entity_ids": "{1}"},
+    ]
+    connection.history = [
+        history_row(1, "2024-07-03 19:00:00.000000"),  # ровно начало - не входит
+        history_row(1, "2024-07-03 19:00:00.000001"),
+        history_row(2, "16/7/24 19:00"),  # ровно конец в коротком формате - не входит
+        history_row(2, "16/7/24 18:59"),
+        history_row(3, "2024-07-10 12:00:00.250000"),
+        history_row(3, "5/7/24 10:00"),
+        history_row(1, ""),  # без даты - ни в один спринт
+        history_row(2, "2024-07-16 19:00:00.000001"),
+        history_row(2, "2024-07-04 08:00:00.000000"),
+    ]
+    connection.tasks = []
+    connection.build_indexes()
+    return connection
+
+
+def test_history_window_bounds_are_exclusive(windowed):
+    windows = windowed.get_history_for_sprints(range(len(windowed.sprints)))
+    assert [[row["history_date"] for row in rows] for rows in windows] == [
+        ["2024-07-03 19:00:00.000001", "2024-07-04 08:00:00.000000", "5/7/24 10:00",
+         "2024-07-10 12:00:00.250000", "16/7/24 18:59"],
+        [],
+        [],
+        ["2024-07-10 12:00:00.250000"],
+    ]
+    for sprint_id in range(len(windowed.sprints)):
+        assert windowed.get_history_for_sprint(sprint_id) == windows[sprint_id]
+        assert windows[sprint_id] == old_history_for_sprint(windowed, sprint_id)
+
+
+def test_history_for_sprints_matches_old_filter(dataset):
+    connection, _ = indexed(*(os.path.join(dataset, name) for name in ["Tasks.csv", "Sprints.csv", "History.csv"]))
+    sprint_ids = list(range(len(connection.sprints)))
+    windows = connection.get_history_for_sprints(sprint_ids + [0])
+    assert windows[-1] == windows[0]
+    assert any(windows)
+    for sprint_id in sprint_ids:
+        assert windows[sprint_id] == old_history_for_sprint(connection, sprint_id), sprint_id
+
+
+def test_history_for_sprint_task(windowed):
+    # задача 3 в истории есть, но в первый спринт не входит
+    assert windowed.get_history_for_sprint_task(0, 3) == []
+    assert [row["history_date"] for row in windowed.get_history_for_sprint_task(0, 2)] == [
+        "16/7/24 18:59", "2024-07-04 08:00:00.000000",
+    ]
+    assert windowed.get_history_for_sprint_task(2, 3) == []
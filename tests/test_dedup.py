@@ -0,0 +1,118 @@
+import asyncio
+import os
+import shutil
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import generate
+from app.dedup import CSV_READ_OPTIONS, dedup_csv, row_digests
+from app.folder_sync import process_storage_folder
+from app.storage import LocalStorage
+from app.telemetry import StageTimings
+
+
+def test_stage_rows_are_counted_once(exports, tmp_path):
+    history = exports[1]
+    rows = len(pd.read_csv(history, **CSV_READ_OPTIONS))
+    result = dedup_csv(partial(open, history, "rb"), partial(open, tmp_path / "out.csv", "wb"))
+
+    assert result.timings["parse"].rows == rows
+    assert result.timings["dedup"].rows == rows
+    assert result.timings["write"].rows == result.rows_written
+
+
+def test_mixed_column_rows_are_counted_once(tmp_path):
+    # в первом блоке колонка числовая, дальше текстовая: второй, строгий проход по файлу
+    source = tmp_path / "mixed.csv"
+    values = [str(i % 50) for i in range(5000)] + [f"x{i % 50}" for i in range(5000)]
+    source.write_text("Table 1\nvalue;n\n" + "".join(f"{value};{i % 7}\n" for i, value in enumerate(values)))
+    result = dedup_csv(partial(open, source, "rb"), partial(open, tmp_path / "out.csv", "wb"), memory_budget=1 << 16)
+
+    assert result.chunk_rows < len(values)
+    assert result.timings["parse"].rows == len(values)
+    assert result.timings["dedup"].rows == len(values)
+
+
+def test_folder_sync_merges_file_timings(dataset, tmp_path):
+    storage_dir = tmp_path / "storage"
+    (storage_dir / "bucket" / "upload").mkdir(parents=True)
+    for name in generate.DATASET_FILES:
+        shutil.copyfile(os.path.join(dataset, name), storage_dir / "bucket" / "upload" / name)
+
+    def process_file(path, timings):
+        processed_path = path.replace(".csv", "_processed.csv")
+        result = dedup_csv(partial(open, path, "rb"), partial(open, processed_path, "wb"))
+        timings.merge(result.timings)
+        return processed_path
+
+    timings = StageTimings()
+    urls = asyncio.run(process_storage_folder(
+        LocalStorage(str(storage_dir)), "bucket", "upload", process_file, str(tmp_path), timings=timings
+    ))
+
+    rows = sum(len(pd.read_csv(os.path.join(dataset, name), **CSV_READ_OPTIONS)) for name in generate.DATASET_FILES)
+    assert len(urls) == len(generate.DATASET_FILES)
+    assert timings["parse"].rows == rows
+    assert timings["save"].calls == timings["upload"].calls == len(generate.DATASET_FILES)
+
+
+@pytest.mark.parametrize("memory_budget", [256 << 20, 1 << 14], ids=["in-memory", "spilled"])
+@pytest.mark.parametrize("subset", [None, ["entity_id", "history_property_name"]], ids=["rows", "subset"])
+def test_dedup_matches_drop_duplicates(exports, tmp_path, memory_budget, subset):
+    history = exports[1]
+    expected = pd.read_csv(history, **CSV_READ_OPTIONS)
+    unique = expected.drop_duplicates(subset=subset)
+    output = tmp_path / "out.csv"
+    result = dedup_csv(
+        partial(open, history, "rb"), partial(open, output, "wb"),
+        memory_budget=memory_budget, subset=subset, spill_dir=str(tmp_path),
+    )
+
+    assert result.spilled == (memory_budget < 1 << 20)
+    assert result.duplicates == len(expected) - len(unique) > 0
+    assert output.read_text(encoding="utf-8") == unique.to_csv(index=False, sep=",")
+
+
+def test_numeric_digest_halves_are_independent():
+    df = pd.DataFrame({"entity_id": np.arange(1000), "spent": np.arange(1000) / 4, "done": np.arange(1000) % 2 == 0})
+    for columns in (["entity_id"], ["spent"], ["done"], ["entity_id", "spent"]):
+        hi, lo, _ = row_digests(df, columns)
+        assert not (hi == lo).any(), columns
+
+
+def test_numeric_subset_matches_drop_duplicates(exports, tmp_path):
+    history = exports[1]
+    expected = pd.read_csv(history, **CSV_READ_OPTIONS).drop_duplicates(subset=["entity_id", "history_version"])
+    output = tmp_path / "out.csv"
+    result = dedup_csv(
+        partial(open, history, "rb"), partial(open, output, "wb"),
+        memory_budget=1 << 14, subset=["entity_id", "history_version"], spill_dir=str(tmp_path),
+    )
+
+    assert result.spilled
+    assert output.read_text(encoding="utf-8") == expected.to_csv(index=False, sep=",")
+
+
+def test_object_digests_keep_types_apart():
+    values = [1, "1", 1.0, "x", None, True, 2**60, "x", -0.0, 0, "True", 2.5]
+    df = pd.DataFrame({"value": pd.Series(values, dtype=object), "n": 1})
+    hi, lo, _ = row_digests(df, ["value", "n"])
+    first = sorted({(h, l): i for i, (h, l) in reversed(list(enumerate(zip(hi, lo))))}.values())
+    assert first == df.drop_duplicates().index.tolist()
+
+
+def test_column_changing_type_between_chunks(tmp_path):
+    # в первых блоках колонка целочисленная, дальше текстовая, и "1" встречается в обеих частях
+    source = tmp_path / "mixed.csv"
+    values = [str(i % 300) for i in range(6000)] + [f"{'x' if i % 2 else ''}{i % 300}" for i in range(6000)]
+    source.write_text("Table 1\nvalue;n\n" + "".join(f"{value};{i % 3}\n" for i, value in enumerate(values)))
+    expected = pd.read_csv(source, **CSV_READ_OPTIONS).drop_duplicates()
+    output = tmp_path / "out.csv"
+    result = dedup_csv(partial(open, source, "rb"), partial(open, output, "wb"), memory_budget=1 << 16)
+
+    assert result.chunk_rows < 6000
+    assert result.duplicates == len(values) - len(expected)
+    assert output.read_text(encoding="utf-8") == expected.to_csv(index=False, sep=",")
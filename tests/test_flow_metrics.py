@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.flow_metrics import (
+    PERCENTILES, STATUS_CATEGORIES, STATUS_PROPERTY, distribution, lead_cycle_times, status_timeline, time_in_status,
+)
+from app.frames import to_datetime
+from app.sprint_metrics import read_table
+
+CATEGORY = {name: category for category, names in STATUS_CATEGORIES.items() for name in names}
+
+
+@pytest.fixture(scope="module")
+def history(dataset):
+    # строки в случайном порядке: движок сам сортирует по (задача, дата)
+    return read_table(os.path.join(dataset, "History.csv")).sample(frac=1, random_state=3).reset_index(drop=True)
+
+
+def naive_changes(history):
+    """Переходы статусов каждой задачи по отдельности: (задача, первая запись, [(время, из, в)])"""
+    rows = history.assign(
+        history_date=to_datetime(history["history_date"]),
+        entity_id=pd.to_numeric(history["entity_id"], errors="coerce"),
+    ).dropna(subset=["entity_id", "history_date"])
+    result = {}
+    for entity_id, group in rows.groupby("entity_id"):
+        group = group.sort_values("history_date", kind="stable")
+        changes = []
+        for row in group.itertuples():
+            if row.history_property_name != STATUS_PROPERTY or pd.isna(row.history_change):
+                continue
+            old, _, new = row.history_change.partition(" -> ")
+            changes.append((row.history_date, old.strip(), new.strip()))
+        result[int(entity_id)] = (group["history_date"].iloc[0], changes)
+    return result
+
+
+def naive_time_in_status(history, as_of=None):
+    seconds = {}
+    for entity_id, (first, changes) in naive_changes(history).items():
+        start = first
+        for time, old, new in changes:
+            seconds[entity_id, old] = seconds.get((entity_id, old), 0) + (time - start).total_seconds()
+            start = time
+        if as_of is not None and changes:
+            # открытый интервал текущего статуса
+            seconds[entity_id, changes[-1][2]] = seconds.get((entity_id, changes[-1][2]), 0) + (as_of - start).total_seconds()
+    return seconds
+
+
+@pytest.mark.parametrize("as_of", [None, pd.Timestamp("2031-01-01")], ids=["closed", "as_of"])
+def test_time_in_status_matches_groupby(history, as_of):
+    result = time_in_status(status_timeline(history), as_of)
+    expected = naive_time_in_status(history, as_of)
+
+    assert not result.duplicated(["entity_id", "status"]).any()
+    actual = {(int(row.entity_id), row.status): row.seconds for row in result.itertuples()}
+    assert actual.keys() == expected.keys()
+    for key, seconds in expected.items():
+        assert actual[key] == pytest.approx(seconds), key
+    assert result["category"].equals(result["status"].map(CATEGORY).rename("category"))
+
+
+def test_as_of_cut_off_adds_only_open_intervals(history):
+    timeline = status_timeline(history)
+    closed = time_in_status(timeline).set_index(["entity_id", "status"])["seconds"]
+    later = pd.Timestamp(timeline.times.max()) + pd.Timedelta(days=10)
+    open_until = time_in_status(timeline, later).set_index(["entity_id", "status"])["seconds"]
+
+    extra = open_until.sub(closed, fill_value=0)
+    # у каждой задачи со сменами статуса добавляется ровно один открытый интервал, не короче 10 дней
+    per_entity = extra[extra > 0].groupby(level="entity_id").size()
+    assert (per_entity == 1).all()
+    assert len(per_entity) == len(np.unique(timeline.entity))
+    assert (extra[extra > 0] >= 10 * 86400).all()
+
+
+def test_lead_cycle_times_match_groupby(history):
+    result = lead_cycle_times(status_timeline(history)).set_index("entity_id")
+    for entity_id, (first, changes) in naive_changes(history).items():
+        done = next((time for time, _, new in changes if CATEGORY.get(new) == "Сделано"), None)
+        started = next((time for time, _, new in changes if CATEGORY.get(new) == "В работе"), None)
+        lead = (done - first).total_seconds() if done is not None else np.nan
+        cycle = (done - started).total_seconds() if done is not None and started is not None and started <= done else np.nan
+        assert result.loc[entity_id, "lead_seconds"] == pytest.approx(lead, nan_ok=True), entity_id
+        assert result.loc[entity_id, "cycle_seconds"] == pytest.approx(cycle, nan_ok=True), entity_id
+
+
+def test_distribution():
+    seconds = pd.Series([3600, 7200, np.nan, 36000])
+    result = distribution(seconds)
+    assert result["count"] == 3
+    assert result["mean"] == round((1 + 2 + 10) / 3, 1)
+    assert [result[f"p{q}"] for q in PERCENTILES] == [round(float(p), 1) for p in np.percentile([1, 2, 10], PERCENTILES)]
+    assert distribution(pd.Series([np.nan]))["mean"] is None
+
+
+def test_sprint_metrics_time_in_status(dataset):
+    from app.sprint_metrics import compute_sprint_metrics, load_dataset
+
+    tasks, history, sprints, membership = load_dataset(dataset)
+    metrics = compute_sprint_metrics(tasks, history, sprints, membership)
+    as_of = to_datetime(history["history_date"]).max()
+    seconds = naive_time_in_status(history, as_of)
+
+    for sprint_name, entry in metrics.items():
+        members = set(membership.loc[membership["sprint_name"] == sprint_name, "entity_id"].astype(int))
+        expected = dict.fromkeys(STATUS_CATEGORIES, 0.0)
+        for (entity_id, status), value in seconds.items():
+            if entity_id in members and status in CATEGORY:
+                expected[CATEGORY[status]] += value
+        assert entry["time_in_status"] == {category: round(value / 3600) for category, value in expected.items()}
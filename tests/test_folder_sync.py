@@ -0,0 +1,85 @@
+import asyncio
+import os
+import shutil
+import time
+
+import pytest
+
+import generate
+from app.folder_sync import process_storage_folder
+from app.storage import LocalStorage
+
+
+class FailingStorage(LocalStorage):
+    """Загрузка History.csv падает, остальные загрузки долгие"""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.uploaded = []
+
+    async def upload(self, bucket_name, local_path, remote_path):
+        if "History" in local_path:
+            raise RuntimeError("upload failed")
+        await asyncio.sleep(0.3)
+        self.uploaded.append(remote_path)
+        return await super().upload(bucket_name, local_path, remote_path)
+
+
+@pytest.fixture
+def storage_dir(dataset, tmp_path):
+    folder = tmp_path / "storage" / "bucket" / "upload"
+    folder.mkdir(parents=True)
+    for name in generate.DATASET_FILES:
+        shutil.copyfile(os.path.join(dataset, name), folder / name)
+    return tmp_path / "storage"
+
+
+def copy_file(path, timings):
+    processed_path = path.replace(".csv", "_processed.csv")
+    shutil.copyfile(path, processed_path)
+    return processed_path
+
+
+def test_failure_cancels_other_files(storage_dir, tmp_path):
+    storage = FailingStorage(str(storage_dir))
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        unretrieved = []
+        loop.set_exception_handler(lambda loop, context: unretrieved.append(context))
+        started = time.perf_counter()
+        with pytest.raises(RuntimeError, match="upload failed"):
+            await process_storage_folder(storage, "bucket", "upload", copy_file, str(work_dir))
+        seconds = time.perf_counter() - started
+        # цикл событий продолжает работать: отменённые загрузки не должны доработать
+        await asyncio.sleep(0.6)
+        return seconds, unretrieved
+
+    seconds, unretrieved = asyncio.run(run())
+    assert seconds < 0.3
+    assert storage.uploaded == []
+    assert unretrieved == []
+    assert os.listdir(work_dir) == []
+
+
+def test_temp_dir_outlives_running_threads(storage_dir, tmp_path):
+    storage = FailingStorage(str(storage_dir))
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    finished = []
+
+    def slow_copy(path, timings):
+        # History.csv падает сразу, остальные файлы ещё обрабатываются в потоках
+        if "History" not in path:
+            time.sleep(0.5)
+        processed_path = copy_file(path, timings)
+        finished.append(os.path.exists(processed_path))
+        return processed_path
+
+    with pytest.raises(RuntimeError, match="upload failed"):
+        asyncio.run(process_storage_folder(storage, "bucket", "upload", slow_copy, str(work_dir)))
+    # файлы, отменённые ещё на скачивании, до обработки не доходят
+    assert finished and all(finished)
+    assert os.listdir(work_dir) == []
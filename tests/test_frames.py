@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.frames import CATEGORY_COLUMNS, DATE_COLUMNS, KEY_COLUMNS, MEASURE_COLUMNS, compact, memory_report, to_datetime
+from app.sprint_metrics import DATASET_FILES, read_table
+
+
+@pytest.fixture(scope="module")
+def raw(dataset):
+    return {name: read_table(os.path.join(dataset, name)) for name in DATASET_FILES}
+
+
+@pytest.mark.parametrize("name", DATASET_FILES)
+def test_compact_preserves_values(raw, name):
+    source = raw[name].drop(columns=[c for c in raw[name].columns if c.startswith("Unnamed:") or c == "Столбец1"])
+    typed = compact(source, keep_rank=True)
+    assert list(typed.columns) == list(source.columns)
+    for column in source.columns:
+        before, after = source[column], typed[column]
+        if column in KEY_COLUMNS or column in MEASURE_COLUMNS:
+            expected = pd.to_numeric(before, errors="coerce").to_numpy(dtype=float)
+            np.testing.assert_array_equal(after.to_numpy(dtype=float, na_value=np.nan), expected, err_msg=column)
+        elif column in DATE_COLUMNS:
+            pd.testing.assert_series_equal(after, to_datetime(before), check_names=False)
+        else:
+            assert column in CATEGORY_COLUMNS + ["rank"] or after.dtype == before.dtype, column
+            assert after.astype(object).where(after.notna(), None).tolist() == (
+                before.astype(object).where(before.notna(), None).tolist()
+            ), column
+
+
+def test_memory_report(raw):
+    typed = {name: compact(df) for name, df in raw.items()}
+    before, after = memory_report(raw), memory_report(typed)
+    for name, df in typed.items():
+        assert after[name]["rows"] == len(df) == before[name]["rows"]
+        assert set(after[name]["columns"]) == {"Index", *df.columns}
+        assert after[name]["bytes"] == sum(after[name]["columns"].values())
+        assert after[name]["bytes"] < before[name]["bytes"], name
+
+
+def test_only_keys_are_downcast():
+    typed = compact(pd.DataFrame({
+        "entity_id": [1, 2, 3],
+        "parent_ticket_id": [1.0, None, 70000.0],
+        "estimation": [20000, 30000, None],
+        "spent": [20000, 30000, 32000],
+    }))
+    assert typed["entity_id"].dtype == np.int8
+    assert typed["parent_ticket_id"].dtype == "Int32"
+    assert typed["estimation"].dtype == typed["spent"].dtype == np.float64
+    # в int16 эти суммы и произведения переполнились бы
+    assert (typed["estimation"] + typed["spent"]).tolist()[:2] == [40000, 60000]
+    assert (typed["spent"] * 3600).tolist() == [72_000_000, 108_000_000, 115_200_000]
@@ -0,0 +1,86 @@
+import os
+import shutil
+import sqlite3
+from contextlib import closing
+
+import pytest
+from fastapi.testclient import TestClient
+
+import generate
+from app.http_cache import CachedBody, ResponseCache
+from app.metrics_store import SprintMetricsStore
+
+
+@pytest.fixture
+def sprint_client(api_main, dataset, tmp_path, monkeypatch):
+    dataset_dir = tmp_path / "dataset"
+    dataset_dir.mkdir()
+    for name in generate.DATASET_FILES:
+        shutil.copyfile(os.path.join(dataset, name), dataset_dir / name)
+    monkeypatch.setattr(api_main, "SPRINT_DATASET_DIR", str(dataset_dir))
+    monkeypatch.setattr(api_main, "sprint_metrics", SprintMetricsStore(str(tmp_path / "metrics")))
+    monkeypatch.setattr(api_main, "response_cache", ResponseCache())
+    return TestClient(api_main.app), dataset_dir
+
+
+def test_sprint_data_etag_ignores_touch(sprint_client):
+    client, dataset_dir = sprint_client
+    first = client.get("/sprint-data")
+    assert first.status_code == 200
+
+    for name in generate.DATASET_FILES:
+        stat = os.stat(dataset_dir / name)
+        os.utime(dataset_dir / name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    again = client.get("/sprint-data", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+
+def test_sprint_data_etag_follows_content(sprint_client):
+    client, dataset_dir = sprint_client
+    first = client.get("/sprint-data")
+
+    with open(dataset_dir / "History.csv", "a", encoding="utf-8") as f:
+        f.write("\n")
+    again = client.get("/sprint-data", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 200
+    assert again.headers["ETag"] != first.headers["ETag"]
+
+
+def test_page1_etag_survives_open_connections(exports, tmp_path, monkeypatch):
+    import agile_store
+    import main
+
+    db_path = str(tmp_path / "Agile.db")
+    agile_store.ingest(*exports, db_path)
+    monkeypatch.setattr(agile_store, "DB_PATH", db_path)
+    monkeypatch.setattr(main, "sprint_metrics", SprintMetricsStore(str(tmp_path / "metrics")))
+    monkeypatch.setattr(main, "response_cache", ResponseCache())
+    client = TestClient(main.app)
+
+    etag = client.request("GET", "/root/page1", json={}).headers["ETag"]
+    with closing(sqlite3.connect(db_path)) as reader:
+        reader.execute("SELECT COUNT(*) FROM tasks").fetchone()
+        again = client.request("GET", "/root/page1", json={}, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+
+def test_new_version_drops_stale_bodies():
+    cache = ResponseCache(max_bytes=1 << 20)
+    for version in ("v1", "v2"):
+        for sprint in ("a", "b"):
+            cache.put(cache.etag("/sprint-data", version, sprint), CachedBody(b"x" * 100, None, "/sprint-data", version))
+    cache.put(cache.etag("/other", "v1", None), CachedBody(b"y" * 100, None, "/other", "v1"))
+
+    assert len(cache) == 3
+    assert cache.nbytes == 300
+    assert cache.get(cache.etag("/sprint-data", "v1", "a")) is None
+
+
+def test_oversize_body_is_not_cached():
+    cache = ResponseCache(max_bytes=50)
+    cache.put("small", CachedBody(b"x" * 40, None))
+    cache.put("large", CachedBody(b"x" * 100, None))
+    assert cache.get("large") is None
+    assert cache.get("small") is not None
+    assert cache.nbytes == 40
@@ -0,0 +1,159 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from fastapi.testclient import TestClient
+
+from app.jobs import OUTPUT_FILE, JobQueue
+
+
+def wait_for(queue, job_id, statuses, timeout=10):
+    deadline = time.time() + timeout
+    while (job := queue.get(job_id)).status not in statuses:
+        assert time.time() < deadline, job
+        time.sleep(0.02)
+    return job
+
+
+def submit(queue):
+    job = queue.create("dataset.zip", {})
+    queue.enqueue(job.job_id)
+    return job.job_id
+
+
+def test_live_owner_keeps_its_jobs(tmp_path):
+    release = threading.Event()
+    runs = []
+
+    def handler(job, output_path, report):
+        runs.append(job.job_id)
+        release.wait(10)
+        return {}
+
+    first = JobQueue(str(tmp_path / "jobs.db"), str(tmp_path / "jobs"), handler, workers=1, lease=0.3)
+    second = JobQueue(str(tmp_path / "jobs.db"), str(tmp_path / "jobs"), handler, workers=1, lease=0.3)
+    try:
+        running = submit(first)
+        wait_for(first, running, {"running"})
+        queued = submit(first)
+        uploading = first.create("dataset.zip", {}).job_id
+        # дольше срока аренды: первый процесс жив и продлевает её
+        time.sleep(1)
+        second.recover()
+        assert [first.get(job_id).status for job_id in (running, queued, uploading)] == [
+            "running", "queued", "uploading"
+        ]
+        assert {first.get(job_id).owner for job_id in (running, queued, uploading)} == {first.owner}
+        release.set()
+        wait_for(first, queued, {"done"})
+        assert runs == [running, queued]
+    finally:
+        release.set()
+        first.shutdown()
+        second.shutdown()
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    release = threading.Event()
+
+    def stuck(job, output_path, report):
+        release.wait(10)
+        return {}
+
+    dead = JobQueue(str(tmp_path / "jobs.db"), str(tmp_path / "jobs"), stuck, workers=1, lease=0.3)
+    running = submit(dead)
+    wait_for(dead, running, {"running"})
+    queued = submit(dead)
+    uploading = dead.create("dataset.zip", {}).job_id
+    # процесс умер: аренда больше не продлевается
+    dead.shutdown()
+
+    survivor = JobQueue(str(tmp_path / "jobs.db"), str(tmp_path / "jobs"), lambda job, output_path, report: {"ok": True}, lease=0.3)
+    try:
+        for job_id in (running, queued):
+            job = wait_for(survivor, job_id, {"done"})
+            assert job.result == {"ok": True}
+            assert job.owner == survivor.owner
+        job = wait_for(survivor, uploading, {"failed"})
+        assert job.error == "Upload interrupted"
+        # зависший прежний владелец доработал: результат нового не перезаписывается
+        release.set()
+        time.sleep(0.2)
+        assert survivor.get(running).result == {"ok": True}
+    finally:
+        release.set()
+        survivor.shutdown()
+
+
+def test_taken_over_run_does_not_replace_the_output(tmp_path):
+    release = threading.Event()
+    stale_done = threading.Event()
+
+    def stuck(job, output_path, report):
+        release.wait(10)
+        # прежний владелец дописывает свой результат уже после перехвата
+        with open(output_path, "wb") as f:
+            f.write(b"stale")
+        stale_done.set()
+        return {"owner": "dead"}
+
+    def fresh(job, output_path, report):
+        with open(output_path, "wb") as f:
+            f.write(b"fresh")
+        return {"owner": "survivor"}
+
+    dead = JobQueue(str(tmp_path / "jobs.db"), str(tmp_path / "jobs"), stuck, workers=1, lease=0.3)
+    job_id = submit(dead)
+    wait_for(dead, job_id, {"running"})
+    # аренда не продлевается, но поток задачи ещё работает
+    dead._stopped.set()
+
+    survivor = JobQueue(str(tmp_path / "jobs.db"), str(tmp_path / "jobs"), fresh, lease=0.3)
+    try:
+        assert wait_for(survivor, job_id, {"done"}).result == {"owner": "survivor"}
+        release.set()
+        assert stale_done.wait(10)
+        time.sleep(0.2)
+        with open(survivor.output_path(job_id), "rb") as f:
+            assert f.read() == b"fresh"
+        assert survivor.get(job_id).result == {"owner": "survivor"}
+        # файлы попыток не остаются
+        assert sorted(os.listdir(survivor.job_dir(job_id))) == [OUTPUT_FILE]
+    finally:
+        release.set()
+        dead.shutdown()
+        survivor.shutdown()
+
+
+def test_table_without_leases_is_migrated(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    with closing(sqlite3.connect(db_path)) as connection, connection:
+        connection.execute(
+            "CREATE TABLE jobs (job_id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT, params TEXT NOT NULL, "
+            "progress REAL NOT NULL DEFAULT 0, created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+            "result TEXT, error TEXT)"
+        )
+        connection.execute(
+            "INSERT INTO jobs (job_id, status, params, created_at) VALUES ('old', 'running', '{}', ?)", (time.time(),)
+        )
+
+    queue = JobQueue(db_path, str(tmp_path / "jobs"), lambda job, output_path, report: {}, lease=30)
+    try:
+        # у задачи прошлой версии нет владельца: её процесс уже не работает
+        queue.recover()
+        assert wait_for(queue, "old", {"done"}).owner == queue.owner
+    finally:
+        queue.shutdown()
+
+
+def test_api_starts_job_queue_on_startup(api_main, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("JOB_DB_PATH", str(tmp_path / "jobs.db"))
+    assert api_main.job_queue is None
+    with TestClient(api_main.app) as client:
+        assert api_main.job_queue is not None
+        assert api_main.job_queue.db_path == str(tmp_path / "jobs.db")
+        assert client.get("/jobs/missing").status_code == 404
+    assert api_main.job_queue is None
@@ -0,0 +1,62 @@
+import ast
+
+import numpy as np
+import pytest
+
+from app.membership import parse_entity_ids
+
+
+def as_lists(membership):
+    return [membership.tasks(sprint).tolist() for sprint in range(len(membership))]
+
+
+def test_keeps_order_and_empty_sprints():
+    membership = parse_entity_ids(["{3,1,2}", "{}", None, float("nan"), "", "   ", "{5}"])
+    assert as_lists(membership) == [[3, 1, 2], [], [], [], [], [], [5]]
+    assert membership.sprint_of_entry.tolist() == [0, 0, 0, 6]
+
+
+def test_no_cells():
+    membership = parse_entity_ids([])
+    assert len(membership) == 0
+    assert membership.task_ids.dtype == np.int64 and membership.task_ids.size == 0
+
+
+@pytest.mark.parametrize("cell, ids", [
+    ("{ }", []),
+    ("{1, 2 ,3}", [1, 2, 3]),
+    ("  {7}\t", [7]),
+    ("{\n4,\n5\n}", [4, 5]),
+    # так пишет хвостовую запятую выгрузка
+    ("{1,}", [1]),
+    ("{4294967296123}", [4294967296123]),
+])
+def test_whitespace_and_trailing_comma(cell, ids):
+    assert as_lists(parse_entity_ids([cell])) == [ids]
+
+
+@pytest.mark.parametrize("cell", [
+    "{1,,2}", "{,}", "{,1}", "{-1}", "{1.5}", "{1;2}", "{a}", "1,2", "{1,2", "1,2}", "{1}{2}", "[1,2]",
+    "{__import__('os').system('true')}",
+])
+def test_rejects_malformed_cells(cell):
+    with pytest.raises(ValueError, match="row 1"):
+        parse_entity_ids(["{1}", cell])
+
+
+def test_matches_literal_eval(dataset):
+    # прежний разбор: literal_eval каждой ячейки
+    from app.sprint_metrics import read_table
+
+    cells = read_table(f"{dataset}/Sprints.csv")["entity_ids"]
+    membership = parse_entity_ids(cells)
+    expected = [list(ast.literal_eval(cell.replace("{", "[").replace("}", "]"))) for cell in cells]
+    assert as_lists(membership) == expected
+
+
+def test_contains():
+    membership = parse_entity_ids(["{1,2}", "{2,3}", "{}"])
+    assert membership.contains(0, 1) is True
+    assert membership.contains(0, 3) is False
+    assert membership.contains(2, 1) is False
+    assert membership.contains(1, np.array([1, 2, 3, 99])).tolist() == [False, True, True, False]
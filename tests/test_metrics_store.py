@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from app import metrics_store
+
+
+@pytest.fixture
+def dataset_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics_store, "_file_digests", {})
+    for name in metrics_store.DATASET_FILES:
+        (tmp_path / name).write_text(f"{name}\n1;2\n", encoding="utf-8")
+    return tmp_path
+
+
+def paths(folder):
+    return [str(folder / name) for name in metrics_store.DATASET_FILES]
+
+
+def count_hashing(monkeypatch):
+    calls = []
+    sha256 = hashlib.sha256
+
+    def counted(*args):
+        calls.append(args)
+        return sha256(*args)
+
+    monkeypatch.setattr(metrics_store.hashlib, "sha256", counted)
+    return calls
+
+
+def test_digests_survive_a_restart(dataset_dir, monkeypatch):
+    version = metrics_store.dataset_version(paths(dataset_dir))
+    stored = json.loads((dataset_dir / metrics_store.DIGESTS_FILE).read_text(encoding="utf-8"))
+    assert sorted(stored) == sorted(metrics_store.DATASET_FILES)
+
+    # новый процесс: памяти нет, файлы не читаются заново
+    monkeypatch.setattr(metrics_store, "_file_digests", {})
+    calls = count_hashing(monkeypatch)
+    assert metrics_store.dataset_version(paths(dataset_dir)) == version
+    # один sha256 на итоговую версию, ни одного на файлы
+    assert len(calls) == 1
+
+
+def test_changed_file_is_hashed_again(dataset_dir, monkeypatch):
+    version = metrics_store.dataset_version(paths(dataset_dir))
+    monkeypatch.setattr(metrics_store, "_file_digests", {})
+    with open(dataset_dir / "History.csv", "a", encoding="utf-8") as f:
+        f.write("3;4\n")
+    assert metrics_store.dataset_version(paths(dataset_dir)) != version
+
+    # тот же размер и содержимое, другой mtime: хэш пересчитан, версия прежняя
+    content = (dataset_dir / "Tasks.csv").read_bytes()
+    before = metrics_store.dataset_version(paths(dataset_dir))
+    monkeypatch.setattr(metrics_store, "_file_digests", {})
+    os.utime(dataset_dir / "Tasks.csv", ns=(1, 1))
+    (dataset_dir / "Tasks.csv").write_bytes(content)
+    calls = count_hashing(monkeypatch)
+    assert metrics_store.dataset_version(paths(dataset_dir)) == before
+    assert len(calls) == 2
+
+
+def test_read_only_folder_keeps_digests_in_memory(dataset_dir, monkeypatch):
+    def read_only(*args, **kwargs):
+        raise PermissionError("read-only")
+
+    monkeypatch.setattr(metrics_store.os, "replace", read_only)
+    version = metrics_store.dataset_version(paths(dataset_dir))
+    assert not (dataset_dir / metrics_store.DIGESTS_FILE).exists()
+    assert sorted(os.listdir(dataset_dir)) == sorted(metrics_store.DATASET_FILES)
+    calls = count_hashing(monkeypatch)
+    assert metrics_store.dataset_version(paths(dataset_dir)) == version
+    assert len(calls) == 1
@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+import agile_store
+from page1 import page1, page1_batch
+
+
+@pytest.fixture(scope="module")
+def db_path(exports, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("page1") / "Agile.db")
+    agile_store.ingest(*exports, path)
+    return path
+
+
+def test_page1_batch_matches_page1(db_path):
+    sprints = agile_store.query("SELECT sprint_id, sprint_start_date, sprint_end_date FROM sprints", db_path=db_path)
+    queries = []
+    for sprint_id, start, end in sprints.itertuples(index=False):
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        queries += [
+            (sprint_id, start, end),
+            # половина спринта, начало с точностью до секунды
+            (sprint_id, start + (end - start) / 2, end),
+            # период без истории
+            (sprint_id, end + pd.Timedelta(days=365), end + pd.Timedelta(days=400)),
+        ]
+    queries.append((sprints["sprint_id"].max() + 1, pd.Timestamp("2000-01-01"), pd.Timestamp("2100-01-01")))
+
+    batch = page1_batch(queries, db_path)
+    assert len(batch) == len(queries)
+    for query, metrics in zip(queries, batch):
+        expected = page1(*query, db_path=db_path)
+        assert metrics == {key: pytest.approx(float(value)) for key, value in expected.items()}, query
+    assert any(metrics["count_normal_task"] for metrics in batch)
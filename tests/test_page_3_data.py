@@ -0,0 +1,129 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import agile_store
+import page_3_data
+from page_3_data import categorize, page_2, page_3
+
+
+def old_categorize(row):
+    """Прежний построчный вариант (DataFrame.apply по строкам)"""
+    if row['estimation'] == row['stat']:
+        return -1
+    difference = row['spent'] - row['estimation']
+    percentage_diff = (difference / row['estimation']) * 100
+    if abs(percentage_diff) == 0:
+        return 0
+    elif abs(percentage_diff) <= 10:
+        return 10 if percentage_diff > 0 else -10
+    elif abs(percentage_diff) <= 20:
+        return 20 if percentage_diff > 0 else -20
+    elif abs(percentage_diff) <= 60:
+        return 60 if percentage_diff > 0 else -60
+    else:
+        return 100 if percentage_diff > 0 else -100
+
+
+def old_categories(estimation, spent):
+    frame = pd.DataFrame({'estimation': estimation, 'spent': spent}, dtype=float)
+    frame['stat'] = frame['estimation'] - frame['spent']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return frame.apply(old_categorize, axis=1).tolist()
+
+
+EDGES = [
+    # нет затрат, нет оценки, обе нулевые
+    (10, 0), (0, 5), (0, 0),
+    # ровно по оценке
+    (7, 7),
+    # границы корзин: 10, 20, 60 % и чуть больше, в обе стороны
+    (10, 11), (10, 9), (10, 12), (10, 8), (10, 16), (10, 4), (100, 111), (100, 89), (100, 121), (100, 79),
+    (100, 161), (100, 39), (100, 100.0001), (1, 1000), (1000, 1),
+    # пропуски
+    (np.nan, 5), (5, np.nan), (np.nan, np.nan), (np.nan, 0), (0, np.nan),
+]
+
+
+@pytest.mark.parametrize('estimation, spent', EDGES)
+def test_categorize_matches_row_wise_apply(estimation, spent):
+    result = categorize(pd.Series([estimation], dtype=float), pd.Series([spent], dtype=float))
+    assert result.tolist() == old_categories([estimation], [spent])
+
+
+def test_categorize_matches_row_wise_apply_on_a_grid():
+    estimation, spent = (values.ravel() for values in np.meshgrid(np.arange(0, 60), np.arange(0, 130)))
+    assert categorize(pd.Series(estimation), pd.Series(spent)).tolist() == old_categories(estimation, spent)
+
+
+def test_categorize_takes_nullable_integers():
+    estimation = pd.Series([10, 10, pd.NA, 0], dtype='Int64')
+    spent = pd.Series([12, 0, 3, 4], dtype='Int64')
+    assert categorize(estimation, spent).tolist() == [20, -1, -100, 100]
+
+
+def old_page_2(tasks):
+    """Прежний отчёт одного спринта: pivot_table по исполнителю и построчный categorize"""
+    table = tasks.pivot_table(index=['assignee'], values=['estimation', 'spent'], aggfunc='sum', observed=True)
+    table = table[table['estimation'] > 0]
+    table['estimation'] = (table['estimation'] / 3600).round().astype('Int64')
+    table['spent'] = (table['spent'] / 3600).round().astype('Int64')
+    table['stat'] = table['estimation'] - table['spent']
+    table['procent'] = (((table['spent'] - table['estimation']) / table['estimation']) * 100).round(0)
+    table['category'] = old_categories(table['estimation'], table['spent'])
+
+    def plain(value):
+        value = float(value)
+        return None if math.isnan(value) or math.isinf(value) else value
+
+    return [
+        {
+            'assignee': assignee, 'estimation': row['estimation'], 'spent': row['spent'], 'stat': row['stat'],
+            'procent': plain(row['procent']), 'category': row['category'],
+        }
+        for assignee, row in table.iterrows()
+    ]
+
+
+@pytest.fixture(scope='module')
+def db_path(exports, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('page3') / 'Agile.db')
+    agile_store.ingest(*exports, path)
+    return path
+
+
+@pytest.fixture(scope='module')
+def members(db_path):
+    links = agile_store.query('SELECT sprint_id, entity_id FROM sprint_tasks', db_path=db_path)
+    return {int(sprint_id): ids.tolist() for sprint_id, ids in links.groupby('sprint_id')['entity_id']}
+
+
+def test_page_2_matches_old_report(db_path, members):
+    checked = 0
+    for sprint_id, task_ids in members.items():
+        expected = old_page_2(agile_store.query(
+            f"SELECT * FROM tasks WHERE entity_id IN ({', '.join('?' * len(task_ids))})", task_ids, db_path
+        ))
+        assert page_2(task_ids, db_path) == expected, sprint_id
+        checked += len(expected)
+    assert checked
+
+
+def test_page_3_matches_page_2_per_sprint(db_path, members):
+    report = page_3(db_path=db_path)
+    assert set(report) <= set(members)
+    for sprint_id, task_ids in members.items():
+        assert report.get(sprint_id, []) == page_2(task_ids, db_path), sprint_id
+
+    some = sorted(members)[:2]
+    assert page_3(some, db_path) == {sprint_id: report[sprint_id] for sprint_id in some if sprint_id in report}
+    assert page_3([], db_path) == {}
+
+
+def test_page_2_of_unknown_tasks_is_empty(db_path):
+    assert page_2([10 ** 12], db_path) == []
+    assert page_3_data.to_records(page_3_data.workload(
+        pd.DataFrame({'sprint_id': [], 'assignee': [], 'estimation': [], 'spent': []})
+    )) == []
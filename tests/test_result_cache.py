@@ -0,0 +1,81 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.result_cache import ResultCache
+
+
+def result(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_fresh_entry_survives_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=150, ttl_seconds=3600)
+    old = cache.put("a" * 64, result(tmp_path, "old.zip", 100), {})
+    fresh = cache.put("b" * 64, result(tmp_path, "fresh.zip", 100), {"Tasks.csv": 1})
+
+    assert os.path.exists(fresh.path)
+    assert not os.path.exists(old.path)
+    assert cache.get("b" * 64).duplicates == {"Tasks.csv": 1}
+
+
+def test_oversize_result_is_not_cached(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=150, ttl_seconds=3600)
+    kept = cache.put("a" * 64, result(tmp_path, "kept.zip", 100), {})
+    path = result(tmp_path, "large.zip", 200)
+
+    assert cache.put("b" * 64, path, {}) is None
+    assert os.path.exists(path)
+    assert os.path.exists(kept.path)
+    assert cache.get("b" * 64) is None
+
+
+def test_failed_put_leaves_no_staging(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=150, ttl_seconds=3600)
+    path = result(tmp_path, "result.zip", 100)
+
+    def failing_dump(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr("app.result_cache.json.dump", failing_dump)
+    with pytest.raises(OSError):
+        cache.put("a" * 64, path, {})
+    assert os.listdir(cache.root) == []
+
+
+@pytest.fixture
+def api_client(api_main, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(api_main.DATA_DIR)
+    monkeypatch.setattr(api_main, "result_cache", ResultCache(str(tmp_path / "cache"), 1 << 30, 3600))
+    with TestClient(api_main.app) as client:
+        yield client
+
+
+def upload(client, dataset, mode):
+    with open(os.path.join(dataset, "dataset.zip"), "rb") as f:
+        return client.post(
+            "/process-zip-file/", params={"mode": mode}, files={"file": ("dataset.zip", f, "application/zip")}
+        )
+
+
+def test_modes_share_cache_entry(api_client, dataset):
+    extracted = upload(api_client, dataset, "extract")
+    streamed = upload(api_client, dataset, "stream")
+    assert (extracted.status_code, streamed.status_code) == (200, 200)
+    assert (extracted.headers["X-Cache"], streamed.headers["X-Cache"]) == ("MISS", "HIT")
+    assert streamed.content == extracted.content
+
+
+def test_failed_put_removes_output(api_main, api_client, dataset, monkeypatch):
+    def failing_put(key, result_path, duplicates):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(api_main.result_cache, "put", failing_put)
+    with pytest.raises(OSError):
+        upload(api_client, dataset, "stream")
+    # ни загруженного, ни обработанного архива в DATA_DIR
+    assert [name for name in os.listdir(api_main.DATA_DIR) if name.endswith(".zip")] == []
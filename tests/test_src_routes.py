@@ -0,0 +1,61 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import pytest
+from fastapi.testclient import TestClient
+
+import agile_store
+import main
+from app.http_cache import ResponseCache
+from app.metrics_store import SprintMetricsStore
+
+
+@pytest.fixture
+def client(exports, tmp_path, monkeypatch):
+    db_path = str(tmp_path / "Agile.db")
+    agile_store.ingest(*exports, db_path)
+    monkeypatch.setattr(agile_store, "DB_PATH", db_path)
+    monkeypatch.setattr(main, "sprint_metrics", SprintMetricsStore(str(tmp_path / "metrics")))
+    monkeypatch.setattr(main, "response_cache", ResponseCache())
+    monkeypatch.setattr(main, "db_version", agile_store.VersionCache())
+    return TestClient(main.app)
+
+
+def test_page1_metrics_survive_open_connections(client, tmp_path, monkeypatch):
+    loads = []
+    load_frames = agile_store.load_frames
+    monkeypatch.setattr(agile_store, "load_frames", lambda db_path: loads.append(db_path) or load_frames(db_path))
+
+    first = client.request("GET", "/root/page1", json={})
+    assert first.status_code == 200
+    materialized = sorted(os.listdir(tmp_path / "metrics"))
+
+    with closing(sqlite3.connect(agile_store.DB_PATH)) as reader:
+        reader.execute("PRAGMA journal_mode=WAL")
+        reader.execute("SELECT COUNT(*) FROM history").fetchone()
+        again = client.request("GET", "/root/page1", json={})
+
+    assert again.json() == first.json()
+    assert len(loads) == 1
+    assert sorted(os.listdir(tmp_path / "metrics")) == materialized
+
+
+def test_version_is_read_once_and_refreshed_after_ingest(client, exports, monkeypatch):
+    reads = []
+    database_version = agile_store.database_version
+    monkeypatch.setattr(agile_store, "database_version", lambda db_path: reads.append(db_path) or database_version(db_path))
+
+    etags = {client.request("GET", "/root/page1", json={}).headers["ETag"] for _ in range(3)}
+    assert len(etags) == 1
+    assert len(reads) == 1
+
+    # загрузка из другого процесса меняет файлы базы
+    agile_store.ingest(*exports, agile_store.DB_PATH)
+    after = client.request("GET", "/root/page1", json={}).headers["ETag"]
+    assert after not in etags
+    assert len(reads) == 2
+
+    # загрузка через /upload сбрасывает кэш явно
+    main.db_version.invalidate()
+    assert main.db_version.cached(agile_store.DB_PATH) is None
@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT_DIR
+
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "supabase"]
+
+IMPORT_APP = f"""
+import json, sys
+import app.main
+print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))
+"""
+
+
+@pytest.mark.parametrize("backend", ["supabase", "local"])
+def test_import_leaves_heavy_modules_unloaded(tmp_path, backend):
+    # отдельный процесс: в процессе pytest pandas уже загружен другими тестами
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT_DIR, "api"), STORAGE_BACKEND=backend)
+    completed = subprocess.run(
+        [sys.executable, "-c", IMPORT_APP], cwd=str(tmp_path), env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert completed.returncode == 0, completed.stderr
+    assert json.loads(completed.stdout.splitlines()[-1]) == []
@@ -0,0 +1,90 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+import agile_store
+import main
+import upload
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(agile_store, "DB_PATH", str(tmp_path / "Agile.db"))
+    monkeypatch.setattr(agile_store, "METRICS_DIR", str(tmp_path / "metrics"))
+
+    # тело не должно разбираться (и спулиться на диск) средствами Starlette
+    async def no_form(self, *args, **kwargs):
+        raise AssertionError("multipart body spooled by Starlette")
+
+    monkeypatch.setattr(Request, "form", no_form)
+    return TestClient(main.app)
+
+
+def export_files(exports):
+    return [("files", (os.path.basename(path), open(path, "rb"), "text/csv")) for path in exports]
+
+
+def test_upload_saves_and_ingests(client, exports):
+    response = client.post("/upload", files=export_files(exports))
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert sorted(entry["table"] for key, entry in body.items() if key.startswith("file")) == sorted(
+        upload.EXPORT_COLUMNS
+    )
+    for key in ("file1", "file2", "file3"):
+        with open(os.path.join(upload.UPLOAD_DIR, body[key]["table"]), "rb") as saved, open(
+            next(path for path in exports if path.endswith(body[key]["filename"])), "rb"
+        ) as source:
+            assert saved.read() == source.read()
+    assert body["ingested"] is not None
+    assert sorted(os.listdir(upload.UPLOAD_DIR)) == sorted(upload.EXPORT_COLUMNS)
+
+
+def test_oversize_content_length_is_rejected(client, exports, monkeypatch):
+    monkeypatch.setattr(upload, "MAX_BODY_BYTES", 1024)
+    response = client.post("/upload", files=export_files(exports))
+    assert response.status_code == 413
+    assert not os.path.exists(upload.UPLOAD_DIR)
+
+
+def test_oversize_file_is_rejected_while_streaming(client, exports, monkeypatch):
+    monkeypatch.setattr(upload, "MAX_FILE_BYTES", 4096)
+    response = client.post("/upload", files=export_files(exports))
+    assert response.status_code == 413
+    assert os.listdir(upload.UPLOAD_DIR) == []
+
+
+def test_chunked_body_is_limited(client, exports, monkeypatch):
+    monkeypatch.setattr(upload, "MAX_BODY_BYTES", 1024)
+    boundary = "b0undary"
+    with open(exports[0], "rb") as f:
+        data = f.read()
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="Tasks.csv"\r\n\r\n'.encode()
+        + data
+        + f"\r\n--{boundary}--\r\n".encode()
+    )
+    response = client.post(
+        "/upload",
+        content=(body[i:i + 512] for i in range(0, len(body), 512)),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    assert response.status_code == 413
+    assert os.listdir(upload.UPLOAD_DIR) == []
+
+
+def test_foreign_header_is_rejected(client, exports):
+    files = export_files(exports)
+    files.append(("files", ("notes.csv", b"Table 1\na;b;c\n1;2;3\n", "text/csv")))
+    response = client.post("/upload", files=files)
+    assert response.status_code == 400
+    assert "notes.csv" in response.json()["detail"]
+    assert os.listdir(upload.UPLOAD_DIR) == []
+
+
+def test_not_multipart_is_rejected(client):
+    response = client.post("/upload", json={})
+    assert response.status_code == 400
@@ -0,0 +1,121 @@
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import generate
+from app import zip_pipeline
+from app.output_format import OutputFormat, archive_sizes
+
+
+@pytest.fixture(scope="module")
+def nested_archive(dataset, tmp_path_factory):
+    """Выгрузка дважды, в разных папках: одинаковые имена файлов в одном архиве"""
+    path = str(tmp_path_factory.mktemp("nested") / "nested.zip")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for folder in ("a", "b"):
+            for name in generate.DATASET_FILES:
+                with open(os.path.join(dataset, name), "rb") as f:
+                    data = f.read()
+                # b/* длиннее a/* на пустые строки, которые pandas пропускает
+                zf.writestr(f"{folder}/{name}", data + b"\n" * 100 if folder == "b" else data)
+    return path
+
+
+def members(path):
+    with zipfile.ZipFile(path) as zf:
+        return {info.filename: (zf.read(info), info.compress_type) for info in zf.infolist()}
+
+
+@pytest.mark.parametrize("output", [OutputFormat("csv"), OutputFormat("parquet")], ids=["csv", "parquet"])
+def test_parallel_matches_serial(nested_archive, tmp_path, monkeypatch, output):
+    serial_path, parallel_path = str(tmp_path / "serial.zip"), str(tmp_path / "parallel.zip")
+    serial = zip_pipeline.process_zip_streaming(nested_archive, serial_path, workers=1, output=output)
+    monkeypatch.setattr(zip_pipeline, "PARALLEL_MIN_BYTES", 0)
+    parallel = zip_pipeline.process_zip_streaming(nested_archive, parallel_path, workers=2, output=output)
+
+    assert parallel == serial
+    serial_members, parallel_members = members(serial_path), members(parallel_path)
+    assert list(parallel_members) == list(serial_members)
+    for name, (data, compress_type) in serial_members.items():
+        assert compress_type == output.zip_compression
+        if output.name == "csv":
+            assert parallel_members[name] == (data, compress_type)
+        else:
+            pd.testing.assert_frame_equal(
+                pd.read_parquet(io.BytesIO(parallel_members[name][0])), pd.read_parquet(io.BytesIO(data))
+            )
+
+
+def test_archive_sizes_by_full_path(nested_archive, tmp_path):
+    output_path = str(tmp_path / "out.zip")
+    zip_pipeline.process_zip_streaming(nested_archive, output_path, workers=1)
+    sizes = archive_sizes(nested_archive, output_path)
+
+    with zipfile.ZipFile(nested_archive) as source:
+        for folder in ("a", "b"):
+            assert sizes["members"][f"{folder}/processed_Tasks.csv"]["raw_bytes"] == (
+                source.getinfo(f"{folder}/Tasks.csv").file_size
+            )
+    assert sizes["raw_bytes"] == sum(info.file_size for info in zipfile.ZipFile(nested_archive).infolist())
+
+
+def test_replacing_the_pool_keeps_submitted_work(monkeypatch):
+    monkeypatch.setattr(zip_pipeline, "_executor", None)
+    first, futures = zip_pipeline._submit(2, [(pow, 2, 10)] * 4)
+    # другой запрос с другим числом воркеров заменяет пул
+    second, more = zip_pipeline._submit(3, [(pow, 3, 2)])
+    assert second is not first
+    assert [future.result(timeout=120) for future in futures] == [1024] * 4
+    assert more[0].result(timeout=120) == 9
+
+    # старый пул уже заменён: текущий не сбрасывается
+    zip_pipeline._drop_executor(first)
+    assert zip_pipeline._executor is second
+    zip_pipeline._drop_executor(second)
+    assert zip_pipeline._executor is None
+
+
+def test_concurrent_requests_with_different_workers(nested_archive, tmp_path, monkeypatch):
+    expected_path = str(tmp_path / "serial.zip")
+    expected = zip_pipeline.process_zip_streaming(nested_archive, expected_path, workers=1)
+    monkeypatch.setattr(zip_pipeline, "PARALLEL_MIN_BYTES", 0)
+
+    def run(index):
+        path = str(tmp_path / f"parallel_{index}.zip")
+        return zip_pipeline.process_zip_streaming(nested_archive, path, workers=2 + index % 2), path
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(run, range(4)))
+    for counts, path in results:
+        assert counts == expected
+        assert members(path) == members(expected_path)
+
+
+@pytest.mark.parametrize("level", [1, 9])
+def test_parallel_csv_is_deflated_in_workers(nested_archive, tmp_path, monkeypatch, level):
+    output = OutputFormat("csv", level)
+    serial_path, parallel_path = str(tmp_path / "serial.zip"), str(tmp_path / "parallel.zip")
+    zip_pipeline.process_zip_streaming(nested_archive, serial_path, workers=1, output=output)
+
+    # в родительском процессе архив ничего не сжимает
+    def no_compressor(*args, **kwargs):
+        raise AssertionError("deflate in the parent process")
+
+    monkeypatch.setattr(zipfile, "_get_compressor", no_compressor)
+    monkeypatch.setattr(zip_pipeline, "PARALLEL_MIN_BYTES", 0)
+    zip_pipeline.process_zip_streaming(nested_archive, parallel_path, workers=2, output=output)
+    monkeypatch.undo()
+
+    with zipfile.ZipFile(serial_path) as serial, zipfile.ZipFile(parallel_path) as parallel:
+        assert parallel.testzip() is None
+        assert parallel.namelist() == serial.namelist()
+        for info in parallel.infolist():
+            expected = serial.getinfo(info.filename)
+            assert (info.compress_type, info.CRC, info.file_size, info.compress_size) == (
+                zipfile.ZIP_DEFLATED, expected.CRC, expected.file_size, expected.compress_size,
+            )
+            assert parallel.read(info) == serial.read(expected)